@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark: time that highlighting blocks the event loop, when rendering a
+screen of a file that is expensive to lex.
+
+Before, all the lexing happened in the event loop, while rendering. Now it
+continues in a background thread when it takes longer than
+`SYNC_HIGHLIGHTING_TIME`, and the screen shows plain text until the tokens
+are there.
+
+Usage::
+
+    python benchmarks/bench_background_highlighting.py
+"""
+from __future__ import unicode_literals, print_function
+
+import asyncio
+import time
+
+from prompt_toolkit.document import Document
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.lexer import DocumentLexer
+import pyvim.lexer
+
+SCREEN_HEIGHT = 50
+
+PYTHON_SOURCE = '''\
+class Example%i(object):
+    """ Docstring. """
+    def method(self, value=%i):
+        return [x * 2 for x in range(value) if x %% 3]  # Comment.
+
+'''
+
+JAVASCRIPT_SOURCE = 'function f%i(a,b){return a.map(function(x){return x*b+"%i"})};'
+
+
+def render(location, text, first_row):
+    """
+    Render one screen, and wait for the background highlighting. Returns
+    the time spent in the event loop, and the total time.
+    """
+    editor = Editor(output=DummyOutput(), input=DummyInput())
+    editor_buffer = EditorBuffer(editor, text=text)
+    editor_buffer.location = location
+    lexer = DocumentLexer(editor_buffer)
+    highlighter = lexer._get_lexer()
+    rows = range(first_row, min(first_row + SCREEN_HEIGHT, Document(text).line_count))
+
+    async def main():
+        in_loop = 0
+        start = time.time()
+
+        while True:
+            render_start = time.time()
+            get_line = lexer.lex_document(Document(text))
+            for row in rows:
+                get_line(row)
+            in_loop += time.time() - render_start
+
+            if not highlighter.is_highlighting:
+                return in_loop, time.time() - start
+
+            # (Background jobs are queued until the event loop runs.)
+            editor._start_pending_background_jobs()
+            while highlighter.is_highlighting:
+                await asyncio.sleep(0.001)
+
+    return asyncio.run(main())
+
+
+def main():
+    python = ''.join(PYTHON_SOURCE % (i, i) for i in range(20000))
+    javascript = ''.join(JAVASCRIPT_SOURCE % (i, i) for i in range(50000))
+
+    cases = [
+        ('100k lines of Python, screen in the middle', 'example.py', python, 50000),
+        ('%.1f MB of minified JavaScript' % (len(javascript) / 1e6), 'example.js', javascript, 0),
+    ]
+
+    for title, location, text, first_row in cases:
+        print(title)
+
+        pyvim.lexer.SYNC_HIGHLIGHTING_TIME = float('inf')
+        in_loop, _ = render(location, text, first_row)
+        print('    in the event loop:    %8.2f ms blocked' % (in_loop * 1000))
+
+        pyvim.lexer.SYNC_HIGHLIGHTING_TIME = 0.005
+        in_loop, total = render(location, text, first_row)
+        print('    in the background:    %8.2f ms blocked, highlighted after %.2f ms' % (
+            in_loop * 1000, total * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Benchmark: opening a big binary file.
+
+Compares the hex view (memory map, only the visible rows are formatted)
+with decoding the whole file as text, which is what happened before.
+
+Usage::
+
+    python benchmarks/bench_binary_open.py [megabytes]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyvim.hex_view import HexControl
+from pyvim.io import FileIO
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    directory = tempfile.mkdtemp()
+    location = os.path.join(directory, 'data.bin')
+
+    try:
+        with open(location, 'wb') as f:
+            chunk = bytes(bytearray(range(256))) * 4096
+            for _ in range(megabytes):
+                f.write(chunk)
+
+        io = FileIO()
+
+        start = time.time()
+        control = HexControl(io.open_binary(location))
+        content = control.create_content(80, 50)
+        for row in range(50):
+            content.get_line(row)
+        hex_view = time.time() - start
+
+        start = time.time()
+        io.read(location)
+        decode = time.time() - start
+
+        print('%i MB binary file' % megabytes)
+        print('hex view, first screen: %8.1f ms' % (hex_view * 1000))
+        print('decode as text:         %8.1f ms' % (decode * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Benchmark: open many files at once, like `pyvim src/**/*.py`. Reports the
+wall time and the peak RSS, for reading the files one at a time (like
+before), and for reading them on the I/O thread pool with a couple of worker
+counts. For the thread pool, the time until the first window has its
+content is reported as well.
+
+A latency (in milliseconds) can be added to every read, to simulate a slow
+network file system.
+
+Usage::
+
+    python benchmarks/bench_bulk_open.py [file_count] [latency_ms]
+"""
+from __future__ import unicode_literals, print_function
+
+import asyncio
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.io import FileIO
+
+
+class SlowFileIO(FileIO):
+    def __init__(self, latency):
+        super(SlowFileIO, self).__init__()
+        self.latency = latency
+
+    def read(self, location):
+        time.sleep(self.latency)
+        return super(SlowFileIO, self).read(location)
+
+
+SOURCE = '''
+import os
+
+
+def function_%(i)i(a, b):
+    """ Docstring. """
+    result = []
+    for i in range(a):
+        result.append(os.path.join(str(i), str(b)))
+    return result
+''' * 20
+
+
+def create_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, 'module%i.py' % i)
+        with open(path, 'w') as f:
+            f.write(SOURCE % {'i': i})
+        paths.append(path)
+    return paths
+
+
+def open_sequentially(editor, paths):
+    " Like before: read every file in the foreground. "
+    for path in paths:
+        eb = EditorBuffer(editor, path)
+        editor.window_arrangement._add_editor_buffer(eb)
+
+
+def open_in_background(editor, paths, start):
+    " Returns the time until the first window is filled in. "
+    editor.load_initial_files(paths)
+    editor_buffers = editor.window_arrangement.editor_buffers
+    first = editor.window_arrangement.active_editor_buffer
+    first_window_time = [None]
+
+    async def run():
+        editor._start_pending_background_jobs()
+        while any(eb.is_loading for eb in editor_buffers):
+            if first_window_time[0] is None and not first.is_loading:
+                first_window_time[0] = time.time() - start
+            await asyncio.sleep(0.001)
+
+    asyncio.run(run())
+    return first_window_time[0] or time.time() - start
+
+
+def run_one(mode, directory, workers, latency):
+    " Run in a subprocess, so that the peak RSS is measured separately. "
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory))
+
+    editor = Editor(output=DummyOutput(), input=DummyInput())
+    editor.io_workers = workers
+    editor.io_backends[-1] = SlowFileIO(latency)
+
+    start = time.time()
+    if mode == 'sequential':
+        open_sequentially(editor, paths)
+        first_window = float('nan')
+    else:
+        first_window = open_in_background(editor, paths, start)
+    elapsed = time.time() - start
+
+    # Kilobytes on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+
+    print('%.3f %.3f %i' % (elapsed, first_window, rss))
+
+
+def main():
+    if sys.argv[1:2] == ['--run']:
+        run_one(sys.argv[2], sys.argv[3], int(sys.argv[4]), float(sys.argv[5]))
+        return
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0
+    directory = tempfile.mkdtemp()
+
+    try:
+        create_files(directory, count)
+        print('Opening %i files, %.1f ms latency per read' % (count, latency * 1000))
+        print('%-24s %10s %18s %14s' % ('', 'wall (s)', 'first window (s)', 'peak RSS (MB)'))
+
+        for mode, workers in [('sequential', 1), ('background', 1),
+                              ('background', 4), ('background', 8)]:
+            output = subprocess.check_output(
+                [sys.executable, __file__, '--run', mode, directory, str(workers), str(latency)])
+            elapsed, first_window, rss = output.split()
+            print('%-24s %10.3f %18.3f %14.1f' % (
+                '%s (%i workers)' % (mode, workers) if mode != 'sequential' else mode,
+                float(elapsed), float(first_window), int(rss) / 1024.))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Benchmark: saving and reading compressed files. Compares the streaming
+backends (one stream, and compressed in parallel blocks) with the old
+implementation, that encoded (and decompressed) the whole text at once.
+
+Peak memory is the peak of the Python allocations during the call
+(`tracemalloc`), on top of the text itself.
+
+Usage::
+
+    python benchmarks/bench_compressed_io.py [size_in_mb] [compression_level]
+"""
+from __future__ import unicode_literals, print_function
+
+from concurrent.futures import ThreadPoolExecutor
+
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pyvim.io.backends import GZipFileIO, BZ2FileIO, XZFileIO
+
+
+def legacy_gzip_write(location, text, level):
+    with gzip.open(location, 'wb', level) as f:
+        f.write(text.encode('utf-8'))
+
+
+def legacy_gzip_read(location):
+    with gzip.open(location, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def measure(func):
+    " Return (seconds, peak MB). "
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed, peak / 1024. / 1024
+
+
+def main():
+    size = int(float(sys.argv[1] if len(sys.argv) > 1 else 50) * 1024 * 1024)
+    level = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+
+    line = 'Lorem ipsum dolor s\xeft amet, consectetur adipiscing elit. %i\n'
+    text = ''.join(line % i for i in range(size // len(line)))
+
+    directory = tempfile.mkdtemp()
+    executor = ThreadPoolExecutor(8)
+
+    def cases():
+        location = os.path.join(directory, 'file.txt.gz')
+        yield ('gzip legacy write', lambda: legacy_gzip_write(location, text, level))
+        yield ('gzip legacy read', lambda: legacy_gzip_read(location))
+
+        for io_class, extension in [(GZipFileIO, 'gz'), (BZ2FileIO, 'bz2'), (XZFileIO, 'xz')]:
+            location = os.path.join(directory, 'file.txt.' + extension)
+            stream = io_class(compression_level=level)
+            parallel = io_class(compression_level=level, executor=lambda: executor)
+
+            yield ('%s stream write' % extension,
+                   lambda: stream.write_chunks(location, [text], 'utf-8'))
+            yield ('%s stream read' % extension, lambda: stream.read(location))
+            yield ('%s parallel write' % extension,
+                   lambda: parallel.write_chunks(location, [text], 'utf-8'))
+            yield ('%s parallel read' % extension, lambda: stream.read(location))
+
+    try:
+        print('%.1f MB of text, compression level %i' % (size / 1024. / 1024, level))
+        print('%-22s %10s %14s' % ('', 'time (s)', 'peak mem (MB)'))
+
+        for name, func in cases():
+            elapsed, peak = measure(func)
+            print('%-22s %10.3f %14.1f' % (name, elapsed, peak))
+    finally:
+        executor.shutdown()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark: reading a directory listing with many entries. Compares the old
+implementation (`os.listdir` plus `os.path.isdir` for every entry) with
+`DirectoryIO`, without the cache, from the cache, and with details.
+
+Usage::
+
+    python benchmarks/bench_directory_listing.py [entries]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyvim.io.backends import DirectoryIO
+
+
+def legacy_read(directory):
+    " `DirectoryIO.read` as it was before. "
+    content = sorted(os.listdir(directory))
+    directories = []
+    files = []
+
+    for f in content:
+        if os.path.isdir(os.path.join(directory, f)):
+            directories.append(f)
+        else:
+            files.append(f)
+
+    result = []
+    for d in directories:
+        result.append('%s/\n' % d)
+    for f in files:
+        result.append('%s\n' % f)
+    return ''.join(result)
+
+
+def measure(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    directory = tempfile.mkdtemp()
+
+    try:
+        for i in range(count):
+            if i % 100 == 0:
+                os.mkdir(os.path.join(directory, 'dir_%i' % i))
+            else:
+                open(os.path.join(directory, 'file_%i.txt' % i), 'w').close()
+
+        cached = DirectoryIO()
+        cached.read(directory)
+
+        cases = [
+            ('legacy', lambda: legacy_read(directory)),
+            ('scandir', lambda: DirectoryIO().read(directory)),
+            ('scandir, cached', lambda: cached.read(directory)),
+            ('scandir, details', lambda: DirectoryIO(show_details=True).read(directory)),
+        ]
+
+        print('%i entries' % count)
+        for name, func in cases:
+            print('%-20s %8.3f s' % (name, measure(func)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Benchmark: tokenizer throughput of the fast lexers, compared to the Pygments
+lexers for the same file types. Both are measured the way the editor
+highlights with them: `FastLexer.lex`, and for a Pygments `RegexLexer` the
+`_lex` function of `pyvim.lexer`. (For the other Pygments lexers, like
+`JsonLexer` and `YamlLexer`, `get_tokens_unprocessed` is measured.)
+
+Pygments has no lexer for log files. For those, the rules of `LogFastLexer`
+are used in a Pygments `RegexLexer`, which shows the difference between the
+two tokenizers for the same rules.
+
+Usage::
+
+    python benchmarks/bench_fast_lexers.py [megabytes]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+
+from pygments.lexer import RegexLexer, bygroups
+from pygments.lexers import JsonLexer, PythonLexer, YamlLexer
+
+from pyvim.fast_lexers import (
+    FastLexer, JsonFastLexer, LogFastLexer, PythonFastLexer, YamlFastLexer)
+from pyvim.lexer import _lex
+
+JSON = '''\
+{"id": %i, "name": "item %i", "price": 12.5, "tags": ["a", "b"], "active": true, "parent": null},
+'''
+
+YAML = '''\
+- id: %i
+  name: "item %i"  # Comment.
+  price: 12.5
+  tags: [a, b]
+  anchor: &item%i
+    active: true
+'''
+
+LOG = '''\
+2024-05-01 12:00:00,%03i INFO [main] Request %i handled in 12.5 ms
+2024-05-01 12:00:01,%03i ERROR [worker-1] Failed to connect to "db": ConnectionError
+'''
+
+PYTHON = '''\
+class Example%i(object):
+    """ Docstring. """
+    def method(self, value=%i):
+        return [x * 2 for x in range(value) if x %% 3]  # Comment.
+
+'''
+
+
+def _pygments_rules(rules):
+    " Convert the rules of a fast lexer into `RegexLexer` rules. "
+    return [(rule[0], bygroups(*rule[1]) if type(rule[1]) is tuple else rule[1]) + tuple(rule[2:])
+            for rule in rules]
+
+
+class PygmentsLogLexer(RegexLexer):
+    " The rules of `LogFastLexer`, for a Pygments `RegexLexer`. "
+    name = 'Log file (Pygments)'
+    tokens = dict((str(name), _pygments_rules(rules))
+                  for name, rules in LogFastLexer.tokens.items())
+
+
+def generate(template, size):
+    " Repeat the template, until the text has this size. "
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        part = template % ((i, ) * template.count('%i') + (i % 1000, ) * template.count('%03i'))
+        parts.append(part)
+        length += len(part)
+        i += 1
+    return ''.join(parts)
+
+
+def tokenize(lexer, text):
+    if isinstance(lexer, FastLexer):
+        return lexer.lex(text)
+    elif type(lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed:
+        return _lex(lexer, text, 0, ('root', ))
+    else:
+        return lexer.get_tokens_unprocessed(text)
+
+
+def throughput(lexer_cls, text, repeat=3):
+    " Best tokenizer throughput in MB/s. "
+    lexer = lexer_cls()
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for _ in tokenize(lexer, text):
+            pass
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(text) / best / 1e6
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1e6) if len(sys.argv) > 1 else 1000000
+
+    print('%.1f MB per file type, MB/s tokenized' % (size / 1e6))
+    print('%-8s %10s %10s %8s' % ('', 'Pygments', 'fast', 'speedup'))
+
+    for name, template, pygments_lexer, fast_lexer in [
+            ('JSON', JSON, JsonLexer, JsonFastLexer),
+            ('YAML', YAML, YamlLexer, YamlFastLexer),
+            ('log', LOG, PygmentsLogLexer, LogFastLexer),
+            ('Python', PYTHON, PythonLexer, PythonFastLexer)]:
+        text = generate(template, size)
+        slow = throughput(pygments_lexer, text)
+        fast = throughput(fast_lexer, text)
+        print('%-8s %10.2f %10.2f %7.1fx' % (name, slow, fast, fast / slow))
+
+
+if __name__ == '__main__':
+    main()
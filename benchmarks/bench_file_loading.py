@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark: time to load a file through `FileIO.read`, compared to the old
+implementation that reopened and decoded the file once per encoding.
+
+Usage::
+
+    python benchmarks/bench_file_loading.py [size_in_mb]
+"""
+from __future__ import unicode_literals, print_function
+
+import codecs
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyvim.io.backends import ENCODINGS, FileIO
+
+
+def legacy_read(location):
+    " `FileIO.read` as it was before. "
+    for e in ENCODINGS:
+        try:
+            with codecs.open(location, 'r', e) as f:
+                return f.read(), e
+        except UnicodeDecodeError:
+            pass
+
+
+def create_file(directory, name, size, encoding, tail=''):
+    line = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit %i.\n'
+    path = os.path.join(directory, name)
+
+    with codecs.open(path, 'w', encoding) as f:
+        written = 0
+        i = 0
+        while written < size:
+            data = line % i
+            f.write(data)
+            written += len(data)
+            i += 1
+        f.write(tail)
+    return path
+
+
+def measure(func, location, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func(location)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    size = int(float(sys.argv[1] if len(sys.argv) > 1 else 50) * 1024 * 1024)
+    directory = tempfile.mkdtemp()
+
+    try:
+        files = [
+            ('utf-8', create_file(directory, 'utf8.txt', size, 'utf-8')),
+            # A latin-1 file with only one non-ASCII character, at the end.
+            # This is the worst case for trying UTF-8 first.
+            ('latin-1', create_file(directory, 'latin1.txt', size, 'latin-1', tail='caf\xe9\n')),
+            ('utf-16', create_file(directory, 'utf16.txt', size, 'utf-16')),
+        ]
+
+        print('%-10s %12s %12s' % ('file', 'legacy (s)', 'FileIO (s)'))
+
+        for name, path in files:
+            if name == 'utf-16':
+                legacy = float('nan')  # Not supported before.
+            else:
+                legacy = measure(legacy_read, path)
+            new = measure(FileIO().read, path)
+            print('%-10s %12.3f %12.3f' % (name, legacy, new))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Benchmark: save throughput of `FileIO.write_chunks` for big files, compared
+to the old implementation that encoded the whole text at once and truncated
+the destination file before writing.
+
+Usage::
+
+    python benchmarks/bench_file_saving.py [size_in_mb]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyvim.io.backends import FileIO
+
+
+def legacy_write(location, text, encoding):
+    " `FileIO.write` as it was before. "
+    with open(location, 'wb') as f:
+        f.write((text + '\n').encode(encoding))
+
+
+def measure(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    size = int(float(sys.argv[1] if len(sys.argv) > 1 else 50) * 1024 * 1024)
+    line = 'Lorem ipsum dolor s\xeft amet, consectetur adipiscing elit.\n'
+    text = line * (size // len(line))
+
+    directory = tempfile.mkdtemp()
+    location = os.path.join(directory, 'file.txt')
+
+    cases = [
+        ('legacy', lambda: legacy_write(location, text, 'utf-8')),
+        ('string, nofsync', lambda: FileIO(fsync=False).write_chunks(location, [text, '\n'], 'utf-8')),
+        ('string, fsync', lambda: FileIO(fsync=True).write_chunks(location, [text, '\n'], 'utf-8')),
+    ]
+
+    try:
+        print('Saving %.1f MB' % (size / 1024. / 1024))
+        print('%-18s %10s %10s' % ('', 'time (s)', 'MB/s'))
+
+        for name, func in cases:
+            elapsed = measure(func)
+            print('%-18s %10.3f %10.1f' % (name, elapsed, size / 1024. / 1024 / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
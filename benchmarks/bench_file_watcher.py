@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Benchmark: cost of watching many open buffers for external changes.
+
+The check itself (one stat per file) runs in the watcher thread. Only the
+handling of the files that changed runs in the event loop. This measures
+both, for a number of open buffers.
+
+Usage::
+
+    python benchmarks/bench_file_watcher.py [buffers]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+from pyvim.editor_buffer import EditorBuffer
+
+
+def measure(func, repeat=20):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    directory = tempfile.mkdtemp()
+
+    try:
+        editor = Editor(config_directory=os.path.join(directory, '.pyvim'),
+                        output=DummyOutput(), input=DummyInput())
+
+        for i in range(count):
+            path = os.path.join(directory, 'file_%i.txt' % i)
+            with open(path, 'w') as f:
+                f.write('line\n')
+            editor.window_arrangement._add_editor_buffer(EditorBuffer(editor, path))
+
+        watcher = editor.file_watcher
+        check_time, changes = measure(watcher.check)
+        assert changes == []
+
+        # Change one file.
+        with open(os.path.join(directory, 'file_0.txt'), 'w') as f:
+            f.write('changed\n')
+        changes = watcher.check()
+        handle_time, _ = measure(lambda: editor._files_changed(changes), repeat=1)
+
+        print('%i open buffers' % count)
+        print('check, in the watcher thread:       %8.3f ms' % (check_time * 1000))
+        print('event loop, one changed file:       %8.3f ms' % (handle_time * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
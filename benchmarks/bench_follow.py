@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Benchmark: picking up a line that was appended to a big log file.
+
+Compares reading only the appended bytes (':follow') with reading and
+decoding the whole file again (':e!').
+
+Usage::
+
+    python benchmarks/bench_follow.py [megabytes]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyvim.io import FileIO
+
+
+def measure(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    directory = tempfile.mkdtemp()
+    location = os.path.join(directory, 'service.log')
+    line = b'2024-01-01 12:00:00 INFO request handled in 12 ms\n'
+
+    try:
+        with open(location, 'wb') as f:
+            f.write(line * (megabytes * 1024 * 1024 // len(line)))
+
+        io = FileIO()
+        tail = io.follow(location, 'utf-8', os.path.getsize(location))
+
+        def append_and_tail():
+            with open(location, 'ab') as f:
+                f.write(line)
+            tail.read()
+
+        def append_and_reread():
+            with open(location, 'ab') as f:
+                f.write(line)
+            io.read(location)
+
+        print('%i MB log file' % megabytes)
+        print('follow (appended bytes only): %8.3f ms' % (measure(append_and_tail) * 1000))
+        print('reload (whole file):          %8.3f ms' % (measure(append_and_reread) * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
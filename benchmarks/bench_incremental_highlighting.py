@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Benchmark: highlighting one screen after every key stroke, when typing in
+the middle of a big Python file.
+
+Before, the Pygments lexer ran again from a sync point for every new
+`Document`. Now the lexer state is kept per line, and only the lines of
+which the state changed are highlighted again.
+
+Usage::
+
+    python benchmarks/bench_incremental_highlighting.py [lines]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+
+from prompt_toolkit.document import Document
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.lexers import PygmentsLexer
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.lexer import DocumentLexer
+
+SCREEN_HEIGHT = 50
+KEY_STROKES = 5
+
+SOURCE = '''\
+class Example%i(object):
+    """ Docstring. """
+    def method(self, value=%i):
+        return [x * 2 for x in range(value) if x %% 3]  # Comment.
+
+'''
+
+
+def type_in_the_middle(create_lexer, lines):
+    """
+    Type a few characters in the middle of the screen, and highlight the
+    screen after every key stroke. Returns the time and the amount of lexed
+    lines per key stroke.
+    """
+    editor = Editor(output=DummyOutput(), input=DummyInput())
+    text = ''.join(SOURCE % (i, i) for i in range(lines // 5))
+    editor_buffer = EditorBuffer(editor, text=text)
+    editor_buffer.location = 'example.py'
+
+    buffer = editor_buffer.buffer
+    first_row = Document(text).line_count // 2
+    buffer.cursor_position = editor_buffer.line_index.line_start(first_row + SCREEN_HEIGHT // 2 + 3)
+
+    lexer = create_lexer(editor_buffer)
+
+    def render():
+        get_line = lexer.lex_document(buffer.document)
+        for row in range(first_row, first_row + SCREEN_HEIGHT):
+            get_line(row)
+
+    render()
+
+    # (Lines lexed by the incremental highlighter.)
+    highlighter = lexer._get_lexer() if isinstance(lexer, DocumentLexer) else None
+    count = highlighter.lexed_line_count if highlighter else 0
+
+    start = time.time()
+    for _ in range(KEY_STROKES):
+        buffer.insert_text('y')
+        render()
+    elapsed = (time.time() - start) / KEY_STROKES
+
+    if highlighter:
+        return elapsed, float(highlighter.lexed_line_count - count) / KEY_STROKES
+    return elapsed, None
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print('%i lines, typing in the middle of the file' % lines)
+
+    elapsed, _ = type_in_the_middle(
+        lambda editor_buffer: PygmentsLexer.from_filename('example.py', sync_from_start=False), lines)
+    print('syntax sync per document: %8.2f ms per key stroke' % (elapsed * 1000))
+
+    elapsed, lexed = type_in_the_middle(DocumentLexer, lines)
+    print('incremental:              %8.2f ms per key stroke' % (elapsed * 1000))
+    print('lines lexed:              %8.2f per key stroke' % lexed)
+
+
+if __name__ == '__main__':
+    main()
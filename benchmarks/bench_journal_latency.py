@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Benchmark: key stroke latency with and without the swap file journal.
+
+Types characters into a buffer (with a big file loaded), and measures the
+time of every `insert_text` call, with ':set noswapfile' and ':set swapfile'.
+Also reports how long the writer thread needs to catch up afterwards.
+
+Usage::
+
+    python benchmarks/bench_journal_latency.py [key_strokes] [file_size_mb]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+from pyvim.editor_buffer import EditorBuffer
+
+
+def type_text(editor_buffer, count):
+    " Returns the latency of every key stroke. "
+    buffer = editor_buffer.buffer
+    buffer.cursor_position = len(buffer.text) // 2
+    timings = []
+
+    for i in range(count):
+        start = time.time()
+        if i % 10 == 9:
+            buffer.delete_before_cursor()
+        else:
+            buffer.insert_text('x')
+        timings.append(time.time() - start)
+
+    return sorted(timings)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    size = int(float(sys.argv[2] if len(sys.argv) > 2 else 1) * 1024 * 1024)
+
+    directory = tempfile.mkdtemp()
+    try:
+        location = os.path.join(directory, 'file.txt')
+        with open(location, 'w') as f:
+            f.write('Lorem ipsum dolor sit amet.\n' * (size // 28))
+
+        editor = Editor(config_directory=os.path.join(directory, 'config'),
+                        output=DummyOutput(), input=DummyInput())
+
+        print('%i key strokes, %.1f MB file' % (count, size / 1024. / 1024))
+        print('%-12s %10s %10s %10s %10s' % ('', 'mean (us)', 'p50 (us)', 'p99 (us)', 'max (us)'))
+
+        for swapfile in (False, True):
+            editor.swapfile = swapfile
+            editor_buffer = EditorBuffer(editor, location)
+            timings = type_text(editor_buffer, count)
+
+            print('%-12s %10.1f %10.1f %10.1f %10.1f' % (
+                'swapfile' if swapfile else 'noswapfile',
+                sum(timings) / len(timings) * 1e6,
+                timings[len(timings) // 2] * 1e6,
+                timings[int(len(timings) * .99)] * 1e6,
+                timings[-1] * 1e6))
+
+        start = time.time()
+        editor.journal_writer.flush()
+        print('Writer thread caught up %.1f ms after the last key stroke.' % (
+            (time.time() - start) * 1000))
+        editor.journal_writer.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Benchmark: key stroke latency on a big file, with and without large file
+mode.
+
+Opens a generated Python file, and for every key stroke inserts a character
+and renders the visible part of the window (the lexer and the input
+processors run for the visible lines only, but some of them look at the
+whole document). With large file mode off, the reporter runs in the
+background as well.
+
+Usage::
+
+    python benchmarks/bench_large_file.py [file_size_mb] [key_strokes]
+
+(The default of 500 MB needs several GB of memory.)
+"""
+from __future__ import unicode_literals, print_function
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from prompt_toolkit.application.current import set_app
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.layout.controls import BufferControl
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+
+WIDTH = 120
+HEIGHT = 50
+
+
+def create_file(path, size):
+    line = 'def function_%i(a, b): return (a + b) * [1, 2, 3]  # comment \n'
+    with open(path, 'w') as f:
+        written = 0
+        i = 0
+        while written < size:
+            data = ''.join(line % (i + j) for j in range(1000))
+            f.write(data)
+            written += len(data)
+            i += 1000
+
+
+def measure(path, large_file_mode, key_strokes):
+    directory = tempfile.mkdtemp()
+    try:
+        editor = Editor(config_directory=directory,
+                        output=DummyOutput(), input=DummyInput())
+        editor.swapfile = False
+        editor.lazy_load_threshold = float('inf')  # Read at once.
+        editor.large_file_threshold = 1 if large_file_mode else 0
+
+        start = time.time()
+        editor.window_arrangement.open_buffer(path)
+        editor.sync_with_prompt_toolkit()
+        open_time = time.time() - start
+
+        editor_buffer = editor.current_editor_buffer
+        buffer = editor_buffer.buffer
+        control = [c for c in editor.application.layout.find_all_controls()
+                   if isinstance(c, BufferControl) and c.buffer is buffer][0]
+
+        buffer.cursor_position = len(buffer.text) // 2
+        timings = []
+
+        async def type_text():
+            # (Rendering needs a running event loop and the application.)
+            with set_app(editor.application):
+                for i in range(key_strokes):
+                    start = time.time()
+                    buffer.insert_text('x')
+
+                    content = control.create_content(WIDTH, HEIGHT)
+                    row = content.cursor_position.y
+                    for y in range(max(0, row - HEIGHT // 2), row + HEIGHT // 2):
+                        if y < content.line_count:
+                            content.get_line(y)
+
+                    timings.append(time.time() - start)
+
+        asyncio.run(type_text())
+        return open_time, timings
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 500 * 1024 * 1024
+    key_strokes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'big_file.py')
+    try:
+        create_file(path, size)
+        print('File size: %.1f MB, %i key strokes' % (size / 1024. / 1024, key_strokes))
+
+        for large_file_mode in (False, True):
+            open_time, timings = measure(path, large_file_mode, key_strokes)
+            timings.sort()
+            print('%-20s open: %7.2fs  mean: %8.2f ms  median: %8.2f ms  max: %8.2f ms' % (
+                'largefile on:' if large_file_mode else 'largefile off:',
+                open_time,
+                sum(timings) / len(timings) * 1000,
+                timings[len(timings) // 2] * 1000,
+                timings[-1] * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
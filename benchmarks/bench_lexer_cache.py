@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark: cost of highlighting one screen of a big Python file, for every
+new `Document` (so after every key stroke).
+
+Before, the Pygments lexer was looked up by filename and created again for
+every `Document`. Now `DocumentLexer` keeps the resolved lexer.
+
+Usage::
+
+    python benchmarks/bench_lexer_cache.py [lines]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+
+from prompt_toolkit.document import Document
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.lexers import PygmentsLexer
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.lexer import DocumentLexer
+
+SCREEN_HEIGHT = 50
+
+SOURCE = '''\
+class Example%i(object):
+    """ Docstring. """
+    def method(self, value=%i):
+        return [x * 2 for x in range(value) if x %% 3]  # Comment.
+
+'''
+
+
+def measure(func, repeat=20):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    text = ''.join(SOURCE % (i, i) for i in range(lines // 5))
+    document = Document(text)
+    first_row = document.line_count // 2
+
+    editor = Editor(output=DummyOutput(), input=DummyInput())
+    editor_buffer = EditorBuffer(editor, text=text)
+    editor_buffer.location = 'example.py'
+    document_lexer = DocumentLexer(editor_buffer)
+
+    def render(lex_document):
+        get_line = lex_document(document)
+        for row in range(first_row, first_row + SCREEN_HEIGHT):
+            get_line(row)
+
+    def before():
+        render(PygmentsLexer.from_filename('example.py', sync_from_start=False).lex_document)
+
+    def after():
+        render(document_lexer.lex_document)
+
+    def lookup():
+        PygmentsLexer.from_filename('example.py', sync_from_start=False)
+
+    print('%i lines, one screen in the middle of the file' % document.line_count)
+    print('lexer lookup only:  %8.2f ms' % (measure(lookup) * 1000))
+    print('lexer per document: %8.2f ms' % (measure(before, repeat=5) * 1000))
+    print('cached lexer:       %8.2f ms' % (measure(after, repeat=5) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Benchmark: load time and peak memory for big files with 'unix' and 'dos'
+line endings.
+
+Compares `FileIO.load`, which finds the line endings in the bytes, with the
+previous approach: decode, replace '\\r\\n' and strip the final line ending
+on the decoded text.
+
+Usage::
+
+    python benchmarks/bench_line_endings.py [megabytes]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pyvim.io import FileIO
+
+
+def previous_load(io, location):
+    text, encoding = io.read(location)
+    text = text.replace('\r\n', '\n')
+    if text.endswith('\n'):
+        text = text[:-1]
+    return text, encoding
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.time()
+    result = func()
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    directory = tempfile.mkdtemp()
+    io = FileIO()
+
+    try:
+        for fileformat, newline in [('unix', b'\n'), ('dos', b'\r\n')]:
+            location = os.path.join(directory, fileformat + '.txt')
+            line = b'x' * 60 + newline
+            with open(location, 'wb') as f:
+                f.write(line * (megabytes * 1024 * 1024 // len(line)))
+
+            print('%i MB, %s line endings' % (megabytes, fileformat))
+            for name, func in [
+                    ('previous', lambda: previous_load(io, location)),
+                    ('load', lambda: io.load(location))]:
+                elapsed, peak = measure(func)
+                print('  %-8s  %7.1f ms   peak %7.1f MB' % (
+                    name, elapsed * 1000, peak / 1024. / 1024.))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
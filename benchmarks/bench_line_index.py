@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Benchmark: translating the cursor position to a row and column after every
+key stroke, with a `Document` (what the ruler used to do) and with the
+`LineIndex` of the buffer. Also times going to a line.
+
+Usage::
+
+    python benchmarks/bench_line_index.py [line_count] [key_strokes]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+
+from prompt_toolkit.document import Document
+
+from pyvim.line_index import LineIndex
+from pyvim.text_edit import TextEdit
+
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    key_strokes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    text = '\n'.join('line %i of the benchmark text' % i for i in range(line_count))
+    position = len(text) // 2
+
+    # Document: a new document for every change.
+    start = time.time()
+    t = text
+    for i in range(key_strokes):
+        t = t[:position + i] + ('\n' if i % 10 == 9 else 'x') + t[position + i:]
+        Document(t, position + i + 1).cursor_position_row
+    document_time = (time.time() - start) / key_strokes
+
+    # Line index: updated from the edit.
+    start = time.time()
+    index = LineIndex(text)
+    build_time = time.time() - start
+
+    start = time.time()
+    for i in range(key_strokes):
+        index.apply_edit(TextEdit(position + i, '', '\n' if i % 10 == 9 else 'x'))
+        index.translate_index_to_position(position + i + 1)
+    index_time = (time.time() - start) / key_strokes
+
+    start = time.time()
+    for row in range(0, line_count, max(1, line_count // 1000)):
+        index.translate_row_col_to_index(row, 0)
+    goto_time = (time.time() - start) / 1000
+
+    print('%i lines, %i key strokes' % (line_count, key_strokes))
+    print('Document per key stroke:    %8.3f ms' % (document_time * 1000))
+    print('LineIndex per key stroke:   %8.3f ms' % (index_time * 1000))
+    print('LineIndex build (once):     %8.3f ms' % (build_time * 1000))
+    print('LineIndex go to line:       %8.3f ms' % (goto_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Benchmark: reloading a big file that was changed a little by another program.
+
+The line diff runs in a thread, applying the edits runs in the event loop.
+Both are measured, for a few lines changed near the start, in the middle
+and at the end of the file.
+
+Usage::
+
+    python benchmarks/bench_reload.py [lines]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.text_edit import compute_line_edits
+
+
+def measure(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    lines = ['line %i of the file' % i for i in range(count)]
+    old_text = '\n'.join(lines)
+
+    editor = Editor(output=DummyOutput(), input=DummyInput())
+    editor.swapfile = False
+
+    print('%i lines, %.1f MB' % (count, len(old_text) / 1e6))
+
+    for name, row in [('start', 10), ('middle', count // 2), ('end', count - 10)]:
+        new_lines = list(lines)
+        new_lines[row:row + 3] = ['changed', 'lines']
+        new_text = '\n'.join(new_lines)
+
+        diff_time, edits = measure(lambda: compute_line_edits(old_text, new_text))
+
+        def apply():
+            eb = EditorBuffer(editor, text=old_text)
+            eb.line_index  # Created when the buffer is shown.
+            start = time.time()
+            eb._apply_reload(new_text, edits, None)
+            return time.time() - start
+
+        apply_time = min(apply() for _ in range(5))
+
+        print('%-6s  diff (thread): %7.2f ms   apply (event loop): %7.2f ms   %i edits' % (
+            name, diff_time * 1000, apply_time * 1000, len(edits)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Benchmark: highlighting a buffer that is shown in 1, 2 and 4 split windows,
+while typing in the first window.
+
+Before, every window had its own `DocumentLexer`, so that every edit was
+lexed once per window. Now the `EditorBuffer` owns the lexer, and the
+windows share the highlighted lines.
+
+Usage::
+
+    python benchmarks/bench_split_highlighting.py [lines]
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import time
+
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.output import DummyOutput
+
+from pyvim.editor import Editor
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.lexer import DocumentLexer
+import pyvim.lexer
+
+SCREEN_HEIGHT = 30
+KEY_STROKES = 50
+
+SOURCE = '''\
+class Example%i(object):
+    """ Docstring. """
+    def method(self, value=%i):
+        return [x * 2 for x in range(value) if x %% 3]  # Comment.
+
+'''
+
+
+def type_in_splits(lines, splits, shared):
+    """
+    Show the file in `splits` windows (the first screen, and further
+    screens spread over the file), and type in the first one. Returns the
+    time that rendering takes, and the amount of lexed lines, per key
+    stroke.
+    """
+    editor = Editor(output=DummyOutput(), input=DummyInput())
+    editor_buffer = EditorBuffer(editor, text=''.join(SOURCE % (i, i) for i in range(lines // 5)))
+    editor_buffer.location = 'example.py'
+
+    buffer = editor_buffer.buffer
+    buffer.cursor_position = editor_buffer.line_index.line_start(SCREEN_HEIGHT // 2)
+
+    if shared:
+        lexers = [editor_buffer.lexer] * splits
+    else:
+        lexers = [DocumentLexer(editor_buffer) for _ in range(splits)]
+
+    first_rows = [i * (lines // splits) for i in range(splits)]
+
+    def render():
+        for lexer, first_row in zip(lexers, first_rows):
+            get_line = lexer.lex_document(buffer.document)
+            for row in range(first_row, first_row + SCREEN_HEIGHT):
+                get_line(row)
+
+    render()
+    highlighters = set(lexer._get_lexer() for lexer in lexers)
+    count = sum(h.lexed_line_count for h in highlighters)
+
+    elapsed = 0
+    for _ in range(KEY_STROKES):
+        buffer.insert_text('y')
+
+        start = time.time()
+        render()
+        elapsed += time.time() - start
+
+    lexed = sum(h.lexed_line_count for h in highlighters) - count
+    return elapsed / KEY_STROKES, float(lexed) / KEY_STROKES
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    # (Measure all the highlighting, not only what happens in the event loop.)
+    pyvim.lexer.SYNC_HIGHLIGHTING_TIME = float('inf')
+
+    print('%i lines, typing in the first of the split windows' % lines)
+    for splits in (1, 2, 4):
+        print('%i split(s):' % splits)
+        for title, shared in (('lexer per window', False), ('shared lexer', True)):
+            elapsed, lexed = type_in_splits(lines, splits, shared)
+            print('    %-18s %7.3f ms, %5.1f lines lexed per key stroke' % (
+                title + ':', elapsed * 1000, lexed))
+
+if __name__ == '__main__':
+    main()
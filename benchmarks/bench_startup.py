@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Benchmark: time to create the `Editor`, and to preview a colorscheme for
+every key stroke while typing ':colorscheme monokai'.
+
+Before, `Editor.__init__` created the styles of all the installed Pygments
+styles, and the preview created a style again for every key stroke. Now
+the styles are created on first use, and kept.
+
+Every measurement of the startup runs in a new Python process, so that
+importing the Pygments styles is included.
+
+Usage::
+
+    python benchmarks/bench_startup.py [runs]
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+import subprocess
+import sys
+import time
+
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.output import DummyOutput
+from pygments.util import ClassNotFound
+
+from pyvim.commands.preview import CommandPreviewer
+from pyvim.editor import Editor
+from pyvim.style import get_editor_style_by_name
+
+STARTUP = '''
+import time
+from prompt_toolkit.input import DummyInput
+from prompt_toolkit.output import DummyOutput
+from pyvim.editor import Editor
+from pyvim.style import generate_built_in_styles
+
+start = time.time()
+editor = Editor(output=DummyOutput(), input=DummyInput())
+if %r:
+    # (What the editor did before.)
+    editor.styles = generate_built_in_styles()
+print(time.time() - start)
+'''
+
+
+def startup(all_styles, runs):
+    " Best time to create the editor, in a new process. "
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    return min(
+        float(subprocess.check_output([sys.executable, '-c', STARTUP % all_styles], env=env))
+        for _ in range(runs))
+
+
+def preview(editor, use_colorscheme):
+    " Time to preview ':colorscheme monokai', while typing it. "
+    command = 'colorscheme monokai'
+    previewer = CommandPreviewer(editor)
+    previewer.save()
+    editor.use_colorscheme = use_colorscheme
+
+    start = time.time()
+    for i in range(len('colorscheme '), len(command) + 1):
+        previewer.preview(command[:i])
+    elapsed = time.time() - start
+
+    previewer.restore()
+    del editor.use_colorscheme
+    return elapsed
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    before = startup(True, runs)
+    after = startup(False, runs)
+    print('Editor creation, all styles:    %8.2f ms' % (before * 1000))
+    print('Editor creation, lazy styles:   %8.2f ms' % (after * 1000))
+
+    editor = Editor(output=DummyOutput(), input=DummyInput())
+
+    def create_style(name):
+        # (What the editor did before.)
+        try:
+            editor.current_style = get_editor_style_by_name(name)
+        except ClassNotFound:
+            pass
+
+    print('Preview, style per key stroke:  %8.2f ms' % (preview(editor, create_style) * 1000))
+    preview(editor, editor.use_colorscheme)  # (Creates the monokai style.)
+    print('Preview, memoized styles:       %8.2f ms' % (preview(editor, editor.use_colorscheme) * 1000))
+
+
+if __name__ == '__main__':
+    main()
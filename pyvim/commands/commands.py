@@ -2,6 +2,8 @@ from __future__ import unicode_literals, print_function
 from prompt_toolkit.application import run_in_terminal
 from prompt_toolkit.document import Document
 
+from pyvim.text_edit import TextEdit
+
 import os
 import re
 import six
@@ -334,6 +336,34 @@ def write_and_quit(editor, location, force=False):
     editor.application.exit()
 
 
+@cmd('recover', accepts_force=True)
+def recover(editor, force=False):
+    """
+    Restore the changes from the swap file. (With !, delete the swap file.)
+    """
+    eb = editor.window_arrangement.active_editor_buffer
+    eb.recover(discard=force)
+
+
+@cmd('follow')
+def follow(editor):
+    """
+    Append the data that is written to the file, like `tail -f`. (The file
+    is checked every 'watchinterval' milliseconds.)
+    """
+    eb = editor.window_arrangement.active_editor_buffer
+    eb.follow()
+
+
+@cmd('nofollow')
+def no_follow(editor):
+    """
+    Stop following the file.
+    """
+    eb = editor.window_arrangement.active_editor_buffer
+    eb.follow(enable=False)
+
+
 @cmd('cq')
 def quit_nonzero(editor):
     """
@@ -579,6 +609,51 @@ def searc_no_ignorecase(editor):
     editor.ignore_case = False
 
 
+@set_cmd('autoread')
+@set_cmd('ar')
+def enable_autoread(editor):
+    """ Reload buffers without unsaved changes when the file changes. """
+    editor.autoread = True
+
+
+@set_cmd('noautoread')
+@set_cmd('noar')
+def disable_autoread(editor):
+    """ Only warn when a file changes. """
+    editor.autoread = False
+
+
+@set_cmd('watchinterval', accepts_value=True)
+def set_watch_interval(editor, value):
+    """
+    Set the interval in milliseconds for checking the open files for
+    changes. (0 to disable.)
+    """
+    if value is None:
+        editor.show_message('watchinterval=%i' % editor.watch_interval)
+    else:
+        try:
+            value = int(value)
+            if value >= 0:
+                editor.watch_interval = value
+            else:
+                editor.show_message('Argument must be positive')
+        except ValueError:
+            editor.show_message('Number required after =')
+
+
+@set_cmd('dirdetails')
+def enable_directory_details(editor):
+    """ Show size and modification time in directory listings. """
+    editor.directory_details = True
+
+
+@set_cmd('nodirdetails')
+def disable_directory_details(editor):
+    """ Only show the names in directory listings. """
+    editor.directory_details = False
+
+
 @set_cmd('list')
 def unprintable_show(editor):
     """ Display unprintable characters. """
@@ -694,6 +769,245 @@ def disable_cursorcolumn(editor):
     editor.cursorcolumn = False
 
 
+@set_cmd('fastlexers')
+def enable_fast_lexers(editor):
+    " Highlight JSON, YAML, log and Python files with the fast lexers. "
+    editor.fast_lexers = True
+
+
+@set_cmd('nofastlexers')
+def disable_fast_lexers(editor):
+    " Highlight all files with the Pygments lexers. "
+    editor.fast_lexers = False
+
+
+@set_cmd('fsync')
+def enable_fsync(editor):
+    " Flush files to disk when saving. "
+    editor.fsync = True
+
+
+@set_cmd('nofsync')
+def disable_fsync(editor):
+    " Don't wait for the disk when saving. "
+    editor.fsync = False
+
+
+@set_cmd('swapfile')
+@set_cmd('swf')
+def enable_swapfile(editor):
+    " Journal changes in a swap file. "
+    editor.swapfile = True
+
+
+@set_cmd('noswapfile')
+@set_cmd('noswf')
+def disable_swapfile(editor):
+    " Don't use swap files. "
+    editor.swapfile = False
+
+
+@set_cmd('undofile')
+@set_cmd('udf')
+def enable_undofile(editor):
+    " Save the undo history when writing a file, restore it when opening. "
+    editor.undofile = True
+
+
+@set_cmd('noundofile')
+@set_cmd('noudf')
+def disable_undofile(editor):
+    " Don't use undo files. "
+    editor.undofile = False
+
+
+@set_cmd('ioworkers', accepts_value=True)
+def set_io_workers(editor, value):
+    """
+    Set the amount of threads for reading files in the background.
+    """
+    if value is None:
+        editor.show_message('ioworkers=%i' % editor.io_workers)
+    else:
+        try:
+            value = int(value)
+            if value > 0:
+                editor.io_workers = value
+            else:
+                editor.show_message('Argument must be positive')
+        except ValueError:
+            editor.show_message('Number required after =')
+
+
+@set_cmd('compresslevel', accepts_value=True)
+def set_compression_level(editor, value):
+    """
+    Set the compression level for .gz, .bz2 and .xz files.
+    """
+    if value is None:
+        editor.show_message('compresslevel=%s' % (
+            'default' if editor.compression_level is None else editor.compression_level))
+    else:
+        try:
+            value = int(value)
+            if 0 <= value <= 9:
+                editor.compression_level = value
+            else:
+                editor.show_message('Argument must be between 0 and 9')
+        except ValueError:
+            editor.show_message('Number required after =')
+
+
+@set_cmd('parallelcompress')
+def enable_parallel_compression(editor):
+    " Compress big files in blocks on the thread pool. "
+    editor.parallel_compression = True
+
+
+@set_cmd('noparallelcompress')
+def disable_parallel_compression(editor):
+    " Compress files in one stream. "
+    editor.parallel_compression = False
+
+
+@set_cmd('httptimeout', accepts_value=True)
+def set_http_timeout(editor, value):
+    """
+    Set the timeout in seconds for HTTP requests.
+    """
+    if value is None:
+        editor.show_message('httptimeout=%i' % editor.http_timeout)
+    else:
+        try:
+            value = int(value)
+            if value > 0:
+                editor.http_timeout = value
+            else:
+                editor.show_message('Argument must be positive')
+        except ValueError:
+            editor.show_message('Number required after =')
+
+
+@set_cmd('largefile', accepts_value=True)
+def set_large_file_threshold(editor, value):
+    """
+    Set the file size from which files are opened in large file mode.
+    (0 turns large file mode off.)
+    """
+    if value is None:
+        editor.show_message('largefile=%i' % editor.large_file_threshold)
+    else:
+        try:
+            value = int(value)
+            if value >= 0:
+                editor.large_file_threshold = value
+            else:
+                editor.show_message('Argument must be positive')
+        except ValueError:
+            editor.show_message('Number required after =')
+
+
+@set_cmd('fileformat', accepts_value=True)
+@set_cmd('ff', accepts_value=True)
+def set_fileformat(editor, value):
+    """
+    Set the line endings of the current buffer for writing: 'unix' or 'dos'.
+    """
+    editor_buffer = editor.current_editor_buffer
+    if editor_buffer is None:
+        return
+
+    if value is None:
+        editor.show_message('fileformat=%s' % editor_buffer.fileformat)
+    elif value in ('unix', 'dos'):
+        editor_buffer.fileformat = value
+    else:
+        editor.show_message('Invalid argument: %s' % value)
+
+
+@set_cmd('eol')
+def enable_eol(editor):
+    " Write a line ending after the last line of the current buffer. "
+    editor_buffer = editor.current_editor_buffer
+    if editor_buffer is not None:
+        editor_buffer.eol = True
+
+
+@set_cmd('noeol')
+def disable_eol(editor):
+    " Don't write a line ending after the last line of the current buffer. "
+    editor_buffer = editor.current_editor_buffer
+    if editor_buffer is not None:
+        editor_buffer.eol = False
+
+
+def _set_buffer_feature(editor, name, enabled):
+    " Turn a feature of the current buffer on or off. "
+    editor_buffer = editor.current_editor_buffer
+    if editor_buffer is not None:
+        editor_buffer.set_feature(name, enabled)
+
+
+@set_cmd('syntax')
+def enable_syntax(editor):
+    " Enable syntax highlighting for the current buffer. "
+    _set_buffer_feature(editor, 'syntax', True)
+
+
+@set_cmd('nosyntax')
+def disable_syntax(editor):
+    " Disable syntax highlighting for the current buffer. "
+    _set_buffer_feature(editor, 'syntax', False)
+
+
+@set_cmd('pyflakes')
+def enable_pyflakes(editor):
+    " Enable the pyflakes reporter for the current buffer. "
+    _set_buffer_feature(editor, 'pyflakes', True)
+
+
+@set_cmd('nopyflakes')
+def disable_pyflakes(editor):
+    " Disable the pyflakes reporter for the current buffer. "
+    _set_buffer_feature(editor, 'pyflakes', False)
+
+
+@set_cmd('completion')
+def enable_completion(editor):
+    " Enable completion for the current buffer. "
+    _set_buffer_feature(editor, 'completion', True)
+
+
+@set_cmd('nocompletion')
+def disable_completion(editor):
+    " Disable completion for the current buffer. "
+    _set_buffer_feature(editor, 'completion', False)
+
+
+@set_cmd('matchparen')
+def enable_matchparen(editor):
+    " Enable highlighting of matching brackets for the current buffer. "
+    _set_buffer_feature(editor, 'matchparen', True)
+
+
+@set_cmd('nomatchparen')
+def disable_matchparen(editor):
+    " Disable highlighting of matching brackets for the current buffer. "
+    _set_buffer_feature(editor, 'matchparen', False)
+
+
+@set_cmd('trailspace')
+def enable_trailspace(editor):
+    " Enable highlighting of trailing whitespace for the current buffer. "
+    _set_buffer_feature(editor, 'trailspace', True)
+
+
+@set_cmd('notrailspace')
+def disable_trailspace(editor):
+    " Disable highlighting of trailing whitespace for the current buffer. "
+    _set_buffer_feature(editor, 'trailspace', False)
+
+
 @set_cmd('colorcolumn', accepts_value=True)
 @set_cmd('cc', accepts_value=True)
 def set_scroll_offset(editor, value):
@@ -726,8 +1040,10 @@ def substitute(editor, range_start, range_end, search, replace, flags):
         return lambda s: re.sub(search, replace, s, count=sub_count)
 
     search_state = editor.application.current_search_state
-    buffer = editor.current_editor_buffer.buffer
-    cursor_position_row = buffer.document.cursor_position_row
+    editor_buffer = editor.current_editor_buffer
+    buffer = editor_buffer.buffer
+    line_index = editor_buffer.line_index
+    cursor_position_row = line_index.translate_index_to_position(buffer.cursor_position)[0]
 
     # read editor state
     if not search:
@@ -738,16 +1054,29 @@ def substitute(editor, range_start, range_end, search, replace, flags):
 
     line_index_iterator = get_line_index_iterator(cursor_position_row, range_start, range_end)
     transform_callback = get_transform_callback(search, replace, flags)
-    new_text = buffer.transform_lines(line_index_iterator, transform_callback)
 
     assert len(line_index_iterator) >= 1
     new_cursor_position_row = line_index_iterator[-1]
 
-    # update text buffer
-    buffer.document = Document(
-        new_text,
-        Document(new_text).translate_row_col_to_index(new_cursor_position_row, 0),
-    )
+    # Only transform the lines in the range, and tell the buffer what
+    # changed, instead of splitting and joining the whole text.
+    # (Rows after the end of the text are ignored, like `transform_lines` does.)
+    first_row = line_index_iterator[0]
+    last_row = min(line_index_iterator[-1], line_index.line_count - 1)
+
+    if first_row <= last_row:
+        start = line_index.line_start(first_row)
+        end = line_index.line_start(last_row) + line_index.line_length(last_row)
+
+        text = buffer.text
+        lines = text[start:end].split('\n')
+        edit = TextEdit(start, text[start:end], '\n'.join(transform_callback(l) for l in lines))
+
+        # update text buffer
+        buffer._apply_with_hint(
+            edit, setattr, buffer, 'document', Document(edit.apply(text), start))
+
+    buffer.cursor_position = line_index.translate_row_col_to_index(new_cursor_position_row, 0)
     buffer.cursor_position += buffer.document.get_start_of_line_position(after_whitespace=True)
     buffer._search(search_state, include_current_position=True)
 
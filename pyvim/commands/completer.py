@@ -56,6 +56,6 @@ class ColorSchemeCompleter(Completer):
     def get_completions(self, document, complete_event):
         text = document.text_before_cursor
 
-        for style_name in self.editor.styles:
+        for style_name in self.editor.styles.names:
             if style_name.startswith(text):
                 yield Completion(style_name[len(text):], display=style_name)
@@ -59,5 +59,7 @@ def _go_to_line(editor, line):
     """
     Move cursor to this line in the current buffer.
     """
-    b = editor.application.current_buffer
-    b.cursor_position = b.document.translate_row_col_to_index(max(0, int(line) - 1), 0)
+    editor_buffer = editor.current_editor_buffer
+    if editor_buffer is not None:
+        editor_buffer.buffer.cursor_position = \
+            editor_buffer.line_index.translate_row_col_to_index(max(0, int(line) - 1), 0)
@@ -42,7 +42,12 @@ class DocumentCompleter(Completer):
 
     def get_completions(self, document, complete_event):
         editor = self._editor_ref()
-        location = self._editor_buffer_ref().location or '.txt'
+        editor_buffer = self._editor_buffer_ref()
+        location = editor_buffer.location or '.txt'
+
+        # Turned off for large files.
+        if not editor_buffer.features['completion']:
+            return []
 
         # Select completer.
         if location.endswith('.py') and editor.enable_jedi:
@@ -10,6 +10,7 @@ Usage::
 from __future__ import unicode_literals
 
 from prompt_toolkit.application import Application
+from prompt_toolkit import __version__ as ptk_version
 from prompt_toolkit.buffer import Buffer
 from prompt_toolkit.enums import EditingMode
 from prompt_toolkit.filters import Condition
@@ -20,15 +21,31 @@ from prompt_toolkit.styles import DynamicStyle
 from .commands.completer import create_command_completer
 from .commands.handler import handle_command
 from .commands.preview import CommandPreviewer
+from .editor_buffer import EditorBuffer
+from .file_watcher import FileWatcher, file_stat
 from .help import HELP_TEXT
+from .journal import JournalWriter
 from .key_bindings import create_key_bindings
 from .layout import EditorLayout, get_terminal_title
-from .style import generate_built_in_styles, get_editor_style_by_name
+from .style import StyleRegistry
 from .window_arrangement import WindowArrangement
-from .io import FileIO, DirectoryIO, HttpIO, GZipFileIO
+from .io import FileIO, DirectoryIO, HttpIO, GZipFileIO, BZ2FileIO, XZFileIO
 
 import pygments
 import os
+import threading
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None  # Python 2, without the `futures` backport.
+
+PTK3 = ptk_version.startswith('3.')
+
+if PTK3:
+    from asyncio import get_event_loop
+else:
+    from prompt_toolkit.eventloop import call_from_executor
 
 __all__ = (
     'Editor',
@@ -67,25 +84,94 @@ class Editor(object):
         self.cursorline = False  # ':set cursorline'
         self.cursorcolumn = False  # ':set cursorcolumn'
         self.colorcolumn = []  # ':set colorcolumn'. List of integers.
+        self.fast_lexers = False  # ':set fastlexers', see `pyvim.fast_lexers`.
+        self.fsync = True  # ':set fsync', flush files to disk when saving.
+        self.swapfile = True  # ':set swapfile', journal changes for recovery.
+        self.undofile = False  # ':set undofile', keep undo history on disk.
+
+        # Compression of .gz, .bz2 and .xz files. (':set compresslevel',
+        # `None` is the default of the format. ':set parallelcompress'
+        # compresses big files in blocks on the thread pool. This is off by
+        # default: the blocks are written as concatenated members, which
+        # changes the layout of the file.)
+        self.compression_level = None
+        self.parallel_compression = False
+
+        # Timeout in seconds for HTTP requests. (':set httptimeout')
+        self.http_timeout = 30
+
+        # Show size and modification time in directory listings.
+        # (':set dirdetails')
+        self.directory_details = False
+
+        # Check the open files for changes by other programs every
+        # `watch_interval` milliseconds (0 to disable), and reload the
+        # buffers without unsaved changes. (':set watchinterval', ':set
+        # autoread')
+        self.watch_interval = 2000
+        self.autoread = True
+
+        # Amount of threads for reading files and running reporters in the
+        # background. (':set ioworkers')
+        self.io_workers = 8
+
+        # Files bigger than this (in bytes) are loaded in the background. A
+        # preview of the first screen is shown in the meantime.
+        self.lazy_load_threshold = 8 * 1024 * 1024
+
+        # Files bigger than this (in characters, roughly bytes) are opened in
+        # large file mode: syntax highlighting, pyflakes, completion and
+        # other expensive services are turned off. (':set largefile', 0 to
+        # disable.)
+        self.large_file_threshold = 20 * 1024 * 1024
 
         # Ensure config directory exists.
         self.config_directory = os.path.abspath(os.path.expanduser(config_directory))
         if not os.path.exists(self.config_directory):
             os.mkdir(self.config_directory)
 
+        # Swap files. (The writer thread is started on the first change.)
+        self.swap_directory = os.path.join(self.config_directory, 'swap')
+        self._journal_writer = None
+
+        # Undo files. (':set undofile')
+        self.undo_directory = os.path.join(self.config_directory, 'undo')
+
         self.window_arrangement = WindowArrangement(self)
         self.message = None
 
-        # Load styles. (Mapping from name to Style class.)
-        self.styles = generate_built_in_styles()
-        self.current_style = get_editor_style_by_name('vim')
+        # Thread that watches the open files. (Started with the event loop.)
+        self.file_watcher = FileWatcher(
+            self._get_watched_files, self._report_file_changes,
+            interval=lambda: self.watch_interval / 1000.)
+        self._call_in_loop = None
+
+        # Background jobs that were submitted before the event loop started.
+        self._pending_background_jobs = []
+
+        # Thread pool for the background jobs. (Created on first use.)
+        self._executor = None
+        self._executor_workers = None
+
+        # Styles, created on first use.
+        self.styles = StyleRegistry()
+        self.current_style = self.styles.get_style('vim')
 
         # I/O backends.
+        fsync = Condition(lambda: self.fsync)
+        compressed_io_options = dict(
+            fsync=fsync,
+            compression_level=lambda: self.compression_level,
+            executor=lambda: self.executor if self.parallel_compression else None)
+
         self.io_backends = [
-            DirectoryIO(),
-            HttpIO(),
-            GZipFileIO(),  # Should come before FileIO.
-            FileIO(),
+            DirectoryIO(show_details=Condition(lambda: self.directory_details)),
+            HttpIO(cache_directory=os.path.join(self.config_directory, 'http_cache'),
+                   timeout=lambda: self.http_timeout),
+            GZipFileIO(**compressed_io_options),  # Should come before FileIO.
+            BZ2FileIO(**compressed_io_options),
+            XZFileIO(**compressed_io_options),
+            FileIO(fsync=fsync),
         ]
 
         # Create history and search buffers.
@@ -140,6 +226,18 @@ class Editor(object):
         # When no files were given, open at least one empty buffer.
         locations2 = locations or [None]
 
+        # Create placeholders for all files, and read them in the background,
+        # so that the UI shows up right away. The files are read in this
+        # order, so the first window is filled in first.
+        # (No buffers are open yet, so we don't have to look up existing
+        # buffers, except for duplicate arguments.)
+        created = set()
+        for f in locations or []:
+            if f not in created:
+                created.add(f)
+                self.window_arrangement._add_editor_buffer(
+                    EditorBuffer(self, f, load_in_background=True))
+
         # First file
         self.window_arrangement.open_buffer(locations2[0])
 
@@ -150,8 +248,6 @@ class Editor(object):
                 self.window_arrangement.hsplit(location=f)
             elif vsplit:
                 self.window_arrangement.vsplit(location=f)
-            else:
-                self.window_arrangement.open_buffer(f)
 
         self.window_arrangement.active_tab_index = 0
 
@@ -209,6 +305,107 @@ class Editor(object):
         """
         return self.key_bindings.add
 
+    @property
+    def executor(self):
+        """
+        Thread pool for background jobs, with `io_workers` threads. (`None`
+        when `concurrent.futures` is not available.)
+        """
+        if ThreadPoolExecutor is None:
+            return None
+
+        if self._executor is None or self._executor_workers != self.io_workers:
+            if self._executor is not None:
+                # The running jobs still finish.
+                self._executor.shutdown(wait=False)
+
+            self._executor = ThreadPoolExecutor(max_workers=self.io_workers)
+            self._executor_workers = self.io_workers
+        return self._executor
+
+    @property
+    def journal_writer(self):
+        """
+        `JournalWriter` for the swap files of all buffers.
+        """
+        if self._journal_writer is None:
+            self._journal_writer = JournalWriter(self.swap_directory)
+        return self._journal_writer
+
+    def run_in_background(self, func, callback=None):
+        """
+        Call `func` in a thread. When it's done, `callback` is called with
+        the result, in the event loop.
+
+        All jobs share one bounded thread pool, and start in the order of
+        submission. Jobs that are submitted before the event loop runs are
+        started as soon as it runs. (Without `concurrent.futures`, every job
+        gets its own thread.)
+        """
+        def start():
+            call_in_loop = self._get_loop_caller()
+
+            def in_executor():
+                result = func()
+
+                if callback is not None:
+                    call_in_loop(lambda: callback(result))
+
+            executor = self.executor
+            if executor is not None:
+                executor.submit(in_executor)
+            else:
+                thread = threading.Thread(target=in_executor)
+                thread.daemon = True
+                thread.start()
+
+        if self.application.is_running:
+            start()
+        else:
+            self._pending_background_jobs.append(start)
+
+    def _get_loop_caller(self):
+        """
+        Return a function that schedules a callable in the event loop, and
+        that can be called from any thread. (Call this in the event loop.)
+        """
+        if PTK3:
+            return get_event_loop().call_soon_threadsafe
+        else:
+            return call_from_executor
+
+    def _get_watched_files(self):
+        " Files for the `FileWatcher`. (Called in its thread, only reads.) "
+        return [(eb, eb.location, eb.storage_stat)
+                for eb in list(self.window_arrangement.editor_buffers)
+                if eb.location and '://' not in eb.location and
+                not eb.is_loading and not eb.isdir]
+
+    def _report_file_changes(self, changes):
+        " Called in the `FileWatcher` thread. "
+        self._call_in_loop(lambda: self._files_changed(changes))
+
+    def _files_changed(self, changes):
+        """
+        Called in the event loop, for the files that the `FileWatcher`
+        reported.
+        """
+        for editor_buffer, _ in changes:
+            # The buffer could have been closed, or saved in the meantime.
+            if editor_buffer in self.window_arrangement.editor_buffers:
+                stat = file_stat(editor_buffer.location)
+                if stat != editor_buffer.storage_stat and not editor_buffer.is_loading:
+                    editor_buffer.storage_changed(stat)
+
+        self.application.invalidate()
+
+    def _start_pending_background_jobs(self):
+        jobs = self._pending_background_jobs
+        self._pending_background_jobs = []
+
+        for start in jobs:
+            start()
+
     def show_message(self, message):
         """
         Set a warning message. The layout will render it as a "pop-up" at the
@@ -221,7 +418,7 @@ class Editor(object):
         Apply new colorscheme. (By name.)
         """
         try:
-            self.current_style = get_editor_style_by_name(name)
+            self.current_style = self.styles.get_style(name)
         except pygments.util.ClassNotFound:
             pass
 
@@ -233,6 +430,16 @@ class Editor(object):
         # prompt-toolkit matches our WindowArrangement.
         self.editor_layout.update()
 
+        # Only the buffers that are shown run the reporter. Start it for the
+        # buffers that became visible.
+        visible = set(self.window_arrangement.active_tab.visible_editor_buffers()
+                      if self.window_arrangement.active_tab else [])
+
+        for eb in self.window_arrangement.editor_buffers:
+            eb.is_visible = eb in visible
+            if eb.is_visible:
+                eb.run_reporter()
+
         # Make sure that the focus stack of prompt-toolkit has the current
         # page.
         window = self.window_arrangement.active_pt_window
@@ -258,9 +465,22 @@ class Editor(object):
             # Start in navigation mode.
             self.application.vi_state.input_mode = InputMode.NAVIGATION
 
+            # Start the jobs that were submitted before the event loop was
+            # running.
+            self._start_pending_background_jobs()
+
+            self._call_in_loop = self._get_loop_caller()
+            self.file_watcher.start()
+
         # Run eventloop of prompt_toolkit.
         self.application.run(pre_run=pre_run)
 
+        self.file_watcher.stop()
+
+        # Clean exit: remove the swap files. (When we crash, they are kept.)
+        if self._journal_writer is not None:
+            self._journal_writer.close()
+
     def enter_command_mode(self):
         """
         Go into command mode.
@@ -1,28 +1,139 @@
 from __future__ import unicode_literals
-from prompt_toolkit.application.current import get_app
 from prompt_toolkit.buffer import Buffer
 from prompt_toolkit.document import Document
-from prompt_toolkit import __version__ as ptk_version
+from prompt_toolkit.filters import Condition
 
 from pyvim.completion import DocumentCompleter
+from pyvim.file_watcher import file_stat
+from pyvim.journal import Journal, JournalError, find_swap_files, read_journal
+from pyvim.lexer import DocumentLexer
+from pyvim.line_index import LineIndex
 from pyvim.reporting import report
+from pyvim.text_edit import TextEdit, compute_line_edits, compute_text_edit, edits_apply_to, map_position
+from pyvim.undo import UndoHistory, undo_file_path
 
 from six import string_types
 
 import os
 import weakref
 
-PTK3 = ptk_version.startswith('3.')
-
-if PTK3:
-    from asyncio import get_event_loop
-else:
-    from prompt_toolkit.eventloop import call_from_executor, run_in_executor
-
 __all__ = (
     'EditorBuffer',
+    'LARGE_FILE_FEATURES',
+)
+
+#: Per-buffer services that are turned off in large file mode. They can be
+#: turned on again one at a time. (':set syntax', ':set nopyflakes', ...)
+LARGE_FILE_FEATURES = (
+    'syntax',  # Pygments highlighting.
+    'pyflakes',  # The reporter.
+    'completion',  # Jedi or word completion.
+    'matchparen',  # Highlighting of the matching bracket.
+    'trailspace',  # Highlighting of trailing whitespace.
 )
 
+#: When writing with 'dos' line endings, the line endings are replaced in
+#: pieces of this many characters.
+NEWLINE_CHUNK_SIZE = 256 * 1024
+
+#: When the text changes while the file is compared in the background for a
+#: reload, it's compared again, at most this many times. After that, it's
+#: compared with the current text in the event loop.
+MAX_RELOAD_ATTEMPTS = 3
+
+
+def _load_with_stat(io, location):
+    """
+    Call `io.load`. Returns its result, and the `file_stat` of the version of
+    the file that was read, or `None` when the file changed while it was
+    read. (Then we don't know how many bytes were read: the file watcher
+    reports a change, and follow mode reads the file again from the start.)
+    """
+    stat = file_stat(location)
+    loaded = io.load(location)
+    if file_stat(location) != stat:
+        stat = None
+    return loaded, stat
+
+
+class _TrackingBuffer(Buffer):
+    """
+    `Buffer` that knows what the most common editing operations change.
+
+    While one of these operations is applied, `edit_hint` contains the
+    corresponding `TextEdit` (or a list of them, see `compute_line_edits`),
+    so that `EditorBuffer` doesn't have to compare the old and the new text
+    in the `on_text_changed` handler.
+
+    The undo stack of `Buffer` is replaced by an `UndoHistory`, that stores
+    these edits instead of copies of the text. (`EditorBuffer` feeds it.)
+    """
+    def __init__(self, *a, **kw):
+        self.edit_hint = None
+        self.undo_history = UndoHistory()
+        super(_TrackingBuffer, self).__init__(*a, **kw)
+
+    def reset(self, *a, **kw):
+        super(_TrackingBuffer, self).reset(*a, **kw)
+        self.undo_history.clear()
+
+    def save_to_undo_stack(self, clear_redo_stack=True):
+        self.undo_history.checkpoint(self.cursor_position, clear_redo=clear_redo_stack)
+
+    def undo(self):
+        self._restore(self.undo_history.undo(self.text, self.cursor_position))
+
+    def redo(self):
+        self._restore(self.undo_history.redo(self.text, self.cursor_position))
+
+    def _restore(self, state):
+        if state is not None:
+            text, cursor_position, edits = state
+
+            self.undo_history.recording = False
+            try:
+                self._apply_with_hint(
+                    edits, setattr, self, 'document', Document(text, cursor_position))
+            finally:
+                self.undo_history.recording = True
+
+    def _apply_with_hint(self, edit, func, *a, **kw):
+        self.edit_hint = edit
+        try:
+            return func(*a, **kw)
+        finally:
+            self.edit_hint = None
+
+    def insert_text(self, data, overwrite=False, move_cursor=True, fire_event=True):
+        position = self.cursor_position
+        deleted = ''
+
+        if overwrite:
+            # Same logic as `Buffer.insert_text`: don't overwrite line endings.
+            deleted = self.text[position:position + len(data)]
+            if '\n' in deleted:
+                deleted = deleted[:deleted.find('\n')]
+
+        return self._apply_with_hint(
+            TextEdit(position, deleted, data),
+            super(_TrackingBuffer, self).insert_text,
+            data, overwrite=overwrite, move_cursor=move_cursor, fire_event=fire_event)
+
+    def delete_before_cursor(self, count=1):
+        position = self.cursor_position
+        start = max(0, position - count)
+
+        return self._apply_with_hint(
+            TextEdit(start, self.text[start:position], ''),
+            super(_TrackingBuffer, self).delete_before_cursor, count)
+
+    def delete(self, count=1):
+        position = self.cursor_position
+
+        return self._apply_with_hint(
+            TextEdit(position, self.text[position:position + count], ''),
+            super(_TrackingBuffer, self).delete, count)
+
 
 class EditorBuffer(object):
     """
@@ -31,7 +142,7 @@ class EditorBuffer(object):
     A 'prompt-toolkit' `Buffer` doesn't know anything about files, changes,
     etc... This wrapper contains the necessary data for the editor.
     """
-    def __init__(self, editor, location=None, text=None):
+    def __init__(self, editor, location=None, text=None, load_in_background=False):
         assert location is None or isinstance(location, string_types)
         assert text is None or isinstance(text, string_types)
         assert not (location and text)
@@ -40,42 +151,272 @@ class EditorBuffer(object):
         self.location = location
         self.encoding = 'utf-8'
 
+        #: Line endings of the file: 'unix' ('\\n') or 'dos' ('\\r\\n'). And
+        #: whether the last line has a line ending. These are restored when
+        #: writing. (':set fileformat', ':set eol')
+        self.fileformat = 'unix'
+        self.eol = True
+
         #: is_new: True when this file does not yet exist in the storage.
         self.is_new = True
 
         # Empty if not in file explorer mode, directory path otherwise.
         self.isdir = False
 
-        # Read text.
-        if location:
-            text = self._read(location)
+        #: True while the file is being read in the background.
+        self.is_loading = False
+
+        # Swap file. (Created on the first change after loading or saving.)
+        self._journal = None
+        self._journaling = True
+
+        #: Swap files of another session that were found for this location.
+        self.swap_files = []
+
+        #: `file_stat` of the file as we read or wrote it. (For detecting
+        #: changes by other programs, and the offset where follow mode starts
+        #: reading.)
+        self.storage_stat = None
+
+        #: True when the file is bigger than `Editor.large_file_threshold`.
+        self.is_large_file = False
+
+        #: Mapping from the names in `LARGE_FILE_FEATURES` to a boolean.
+        self.features = dict.fromkeys(LARGE_FILE_FEATURES, True)
+
+        #: `BinaryFile` when this is a binary file, shown in the hex view.
+        #: (The buffer stays empty then.)
+        self.binary_file = None
+
+        # Reader of the appended data in follow mode. (':follow')
+        self._tail = None
+        self._tail_is_reading = False
+        self._tail_read_again = False
+
+        # Read text. When loading in the background, we start as an empty,
+        # read-only placeholder. Binary files are not read at all. (When
+        # loading in the background, that is found out in the background
+        # too: opening the file can be slow.)
+        if location and not load_in_background:
+            self.binary_file = self._open_binary(location)
+
+        if self.binary_file is not None:
+            self.is_new = False
+            self.storage_stat = file_stat(location)
+            text = ''
+        elif location and load_in_background:
+            self.is_new = False
+            self._load_in_background(location)
+            text = ''
+        elif location:
+            text = self._read(location, background=True)
+            if not self.is_loading:
+                self._set_swap_files(self._find_swap_files(location))
         else:
             text = text or ''
 
-        self._file_content = text
+        self._update_large_file_mode(text)
+
+        #: Incremented on every change of the text. (Edit generation.)
+        self.text_version = 0
+
+        # The text as it was after the last change. (This is the same string
+        # object as the one in the buffer, not a copy.)
+        self._text = text
+
+        # Line offsets. (Created when needed, kept in sync with the buffer.)
+        self._line_index = None
 
         # Create Buffer.
-        self.buffer = Buffer(
+        self.buffer = _TrackingBuffer(
             multiline=True,
             completer=DocumentCompleter(editor, self),
             document=Document(text, 0),
-            on_text_changed=lambda _: self.run_reporter())
+            read_only=Condition(lambda: self.is_loading or self.binary_file is not None),
+            on_text_changed=self._text_changed)
+
+        if location and not self.is_loading:
+            self.buffer.undo_history = self._read_undo_history(location, text)
+
+        # Undo history state of the text in the storage. Used to find out
+        # whether there are unsaved changes, without comparing the text.
+        self._mark_as_saved(self.storage_stat)
+
+        #: Callables that are called with a `TextEdit` for every change of
+        #: the text.
+        self.text_edit_handlers = []
+
+        #: Highlighting, shared by all the windows that show this buffer.
+        self.lexer = DocumentLexer(self)
 
         # List of reporting errors.
         self.report_errors = []
         self._reporter_is_running = False
+        self._report_version = None  # `text_version` of `report_errors`.
+
+        #: True when this buffer is shown in the active tab. The reporter
+        #: only runs for visible buffers.
+        self.is_visible = False
 
     @property
     def editor(self):
         """ Back reference to the Editor. """
         return self._editor_ref()
 
+    @property
+    def line_index(self):
+        """
+        `LineIndex` for the content of this buffer. Use this instead of the
+        `Document` for translating between rows and offsets: it doesn't
+        have to split the whole text after every change.
+        """
+        if self._line_index is None:
+            self._line_index = LineIndex(self.buffer.text)
+        return self._line_index
+
+    def _text_changed(self, buffer):
+        """
+        Called when the text of the buffer changed. Turn the change into
+        `TextEdit` objects and notify everyone who keeps track of the text.
+        """
+        old_text = self._text
+        old_state = self._text_state
+        text = buffer.text
+        edits = buffer.edit_hint
+
+        if isinstance(edits, TextEdit):
+            edits = [edits]
+
+        if edits is None or not edits_apply_to(edits, old_text, text):
+            # (Other operations are compared with the old text, which is
+            # linear in the size of the text.)
+            edit = compute_text_edit(old_text, text)
+            edits = [] if edit is None else [edit]
+
+        self._text = text
+        self.text_version += 1
+
+        for edit in edits:
+            if self._line_index is not None:
+                self._line_index.apply_edit(edit)
+
+            self.buffer.undo_history.record(edit)
+
+            for handler in self.text_edit_handlers:
+                handler(edit)
+
+            if self._journaling:
+                self._journal_edit(old_text, old_state, edit)
+
+        self._text_state = self.buffer.undo_history.state
+
+        if self.is_visible:
+            self.run_reporter()
+
+    def _mark_as_saved(self, stat):
+        """
+        Remember that the current text is what we have in the storage. `stat`
+        is the `file_stat` of the version of the file that the text was read
+        from, or written to.
+        """
+        self._text_state = self._saved_state = self.buffer.undo_history.state
+        self._saved_format = (self.fileformat, self.eol)
+        self.storage_stat = stat
+
+        # Nothing to recover anymore.
+        self._discard_journal()
+
+    def _journal_edit(self, old_text, old_state, edit):
+        """
+        Write this edit to the swap file.
+        """
+        if not self.editor.swapfile or self.location is None or self.is_loading:
+            self._discard_journal()
+            return
+
+        if self._journal is None:
+            # Start a new journal. When `old_text` is not what we have in the
+            # storage, it has to be stored in the journal as well.
+            self._journal = Journal(self.editor.journal_writer, self.location)
+            self._journal.start(old_text, snapshot=old_state != self._saved_state)
+
+        self._journal.append(edit)
+
+    def _discard_journal(self):
+        if self._journal is not None:
+            self._journal.remove()
+            self._journal = None
+
+    def _find_swap_files(self, location):
+        " Swap files for this location. (Can run in a thread.) "
+        if self.editor.swapfile and not self.isdir:
+            return find_swap_files(self.editor.swap_directory, location)
+        return []
+
+    def _set_swap_files(self, swap_files):
+        self.swap_files = swap_files
+        if swap_files:
+            self.editor.show_message(
+                'Found a swap file for %s. Use :recover to restore the changes, '
+                'or :recover! to delete it.' % self.get_display_name(short=True))
+
+    def recover(self, discard=False):
+        """
+        Restore the unsaved changes of a previous session from its swap file.
+
+        :param discard: Delete the swap files instead.
+        """
+        if not self.swap_files:
+            self.editor.show_message('No swap file found for %s' % self.get_display_name())
+            return
+
+        if self.is_loading:
+            self.editor.show_message('Cannot recover while the file is still loading.')
+            return
+
+        if not discard:
+            try:
+                text = read_journal(self.swap_files[0]).replay(self.buffer.text)
+            except (IOError, OSError, JournalError) as e:
+                self.editor.show_message('Cannot recover: %s' % e)
+                return
+
+            # This is a change like any other: it is journaled, and the
+            # buffer has unsaved changes now.
+            self.buffer.document = Document(text, min(self.buffer.cursor_position, len(text)))
+
+        for path in self.swap_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.swap_files = []
+
+    def close(self):
+        """
+        Called when the buffer is closed.
+        """
+        self._discard_journal()
+        self._tail = None
+        self.lexer.close()
+
+        if self.binary_file is not None:
+            self.binary_file.close()
+
     @property
     def has_unsaved_changes(self):
         """
         True when some changes are not yet written to file.
+
+        This is called for every window on every render, so it doesn't look
+        at the text: the text is saved when the undo history is in the state
+        that was saved. (Undoing back to it makes the buffer clean again.)
         """
-        return self._file_content != self.buffer.text
+        if self.binary_file is not None:
+            return bool(self.binary_file.patches)
+
+        return ((self.fileformat, self.eol) != self._saved_format or
+                self.buffer.undo_history.state != self._saved_state)
 
     @property
     def in_file_explorer_mode(self):
@@ -84,56 +425,462 @@ class EditorBuffer(object):
         """
         return self.isdir
 
-    def _read(self, location):
+    def storage_changed(self, stat):
         """
-        Read file I/O backend.
+        Called when the file was changed by another program. (`stat` is the
+        new `file_stat`, or `None` when it was removed.) Reload when there
+        are no unsaved changes, otherwise show a warning.
+        """
+        self.storage_stat = stat
+        name = self.get_display_name(short=True)
+
+        if stat is None:
+            self.editor.show_message('File %s is no longer available.' % name)
+        elif self.following:
+            self._read_appended()
+        elif not self.has_unsaved_changes and self.editor.autoread:
+            self.reload()
+        else:
+            self.editor.show_message(
+                'Warning: file %s was changed on disk since reading it. '
+                'Use :e! to reload.' % name)
+
+    def _find_io(self, location):
+        """
+        Return the I/O backend for this location, or `None`.
         """
         for io in self.editor.io_backends:
             if io.can_open_location(location):
-                # Found an I/O backend.
-                exists = io.exists(location)
-                self.isdir = io.isdir(location)
-
-                if exists in (True, NotImplemented):
-                    # File could exist. Read it.
-                    self.is_new = False
-                    try:
-                        text, self.encoding = io.read(location)
-
-                        # Replace \r\n by \n.
-                        text = text.replace('\r\n', '\n')
-
-                        # Drop trailing newline while editing.
-                        # (prompt-toolkit doesn't enforce the trailing newline.)
-                        if text.endswith('\n'):
-                            text = text[:-1]
-                    except Exception as e:
-                        self.editor.show_message('Cannot read %r: %r' % (location, e))
-                        return ''
-                    else:
-                        return text
-                else:
-                    # File doesn't exist.
-                    self.is_new = True
+                return io
+
+    def _open_binary(self, location):
+        """
+        Return a `BinaryFile` when this location is a binary file.
+        """
+        io = self._find_io(location)
+
+        if io is not None and io.exists(location) is True and not io.isdir(location):
+            try:
+                return io.open_binary(location)
+            except (IOError, OSError):
+                pass
+
+    def _read(self, location, background=False):
+        """
+        Read file I/O backend.
+
+        :param background: Allow big files to be loaded in the background. In
+            that case, only a preview of the file is returned and
+            `is_loading` is set until the whole file has been read.
+        """
+        io = self._find_io(location)
+
+        if io is not None:
+            exists = io.exists(location)
+            self.isdir = io.isdir(location)
+
+            if exists in (True, NotImplemented):
+                # File could exist. Read it.
+                self.is_new = False
+                try:
+                    if background:
+                        preview = self._read_preview(io, location)
+                        if preview is not None:
+                            self._load_in_background(location)
+                            return preview
+
+                    (text, self.encoding, self.fileformat, self.eol), self.storage_stat = \
+                        _load_with_stat(io, location)
+                except Exception as e:
+                    self.editor.show_message('Cannot read %r: %r' % (location, e))
                     return ''
+                else:
+                    return text
+            else:
+                # File doesn't exist.
+                self.is_new = True
+                return ''
 
         self.editor.show_message('Cannot read: %r' % location)
         return ''
 
+    def _load(self, location):
+        """
+        Like `_read`, but without touching the `EditorBuffer`, so that it can
+        run in a thread. Returns an (is_new, isdir, text, encoding,
+        fileformat, eol, stat) tuple. (See `_load_with_stat` for `stat`.)
+        """
+        io = self._find_io(location)
+        if io is None:
+            raise IOError('Unknown location.')
+
+        isdir = io.isdir(location)
+
+        if io.exists(location) in (True, NotImplemented):
+            # (The line endings are normalized by the backend. The final line
+            # ending is removed while editing: prompt-toolkit doesn't
+            # enforce it.)
+            loaded, stat = _load_with_stat(io, location)
+            return (False, isdir) + loaded + (stat, )
+        else:
+            return True, isdir, '', self.encoding, self.fileformat, self.eol, None
+
+    def _read_preview(self, io, location):
+        """
+        For big files, return the first screen of text, or `None` when the
+        file should be read at once. (When the size is not known upfront, the
+        backend decides.)
+        """
+        size = io.size(location)
+
+        if size is None or size >= self.editor.lazy_load_threshold:
+            rows = self.editor.application.output.get_size().rows
+            preview = io.read_preview(location, rows)
+
+            if preview is not None:
+                return preview.replace('\r\n', '\n')
+
+    def _load_in_background(self, location):
+        """
+        Read the whole file in a thread, and replace the content of the
+        buffer when done. The buffer is read-only in the meantime.
+
+        (Jobs are started in the order of submission, so the buffers that
+        were opened first, like the one in the first window, are read first.)
+        """
+        self.is_loading = True
+
+        def load():
+            binary_file = self._open_binary(location)
+            if binary_file is not None:
+                return None, [], None, binary_file, None
+
+            try:
+                loaded = self._load(location)
+                return (loaded, self._find_swap_files(location),
+                        self._read_undo_history(location, loaded[2]), None, None)
+            except Exception as e:
+                return None, [], None, None, e
+
+        def done(result):
+            loaded, swap_files, undo_history, binary_file, error = result
+            self.is_loading = False
+
+            if binary_file is not None:
+                # Show the hex view instead. (The layout creates another
+                # window for it.)
+                self.binary_file = binary_file
+                self.storage_stat = file_stat(location)
+                self.editor.sync_with_prompt_toolkit()
+                self.editor.application.invalidate()
+                return
+
+            if error is None:
+                self.is_new, self.isdir, text, self.encoding, self.fileformat, self.eol, stat = loaded
+            else:
+                text = ''
+                stat = file_stat(location)
+                self.editor.show_message('Cannot read %r: %r' % (location, error))
+
+            self._set_text_from_storage(text, stat, undo_history)
+            self._set_swap_files(swap_files)
+            self.editor.application.invalidate()
+
+        self.editor.run_in_background(load, done)
+
     def reload(self):
         """
         Reload file again from storage.
+
+        The file is read and compared with the current text in a thread. Only
+        the lines that are different are replaced, so the cursor and the
+        scroll position of the windows stay on the same lines, and the reload
+        can be undone like any other change.
         """
-        text = self._read(self.location)
-        cursor_position = min(self.buffer.cursor_position, len(text))
+        self._reload(1)
+
+    def _reload(self, attempt):
+        if self.location is None or self.is_loading:
+            return
+
+        if self.binary_file is not None:
+            self.binary_file.reload()
+            self.storage_stat = file_stat(self.location)
+            return
+
+        if self.following:
+            self._tail.reset()
+            self._read_appended()
+            return
+
+        location = self.location
+        old_text = self.buffer.text
+        text_version = self.text_version
+
+        def load():
+            try:
+                loaded = self._load(location)
+                return loaded, compute_line_edits(old_text, loaded[2]), None
+            except Exception as e:
+                return None, None, e
+
+        def done(result):
+            loaded, edits, error = result
+
+            if error is not None:
+                self.editor.show_message('Cannot read %r: %r' % (location, error))
+            elif self.location != location:
+                self.reload()  # Renamed in the meantime.
+            elif self.text_version != text_version and attempt < MAX_RELOAD_ATTEMPTS:
+                # Changed in the meantime, compare again.
+                self._reload(attempt + 1)
+            else:
+                self.is_new, self.isdir, text, self.encoding, self.fileformat, self.eol, stat = loaded
+                if self.text_version != text_version:
+                    # Still changing. Compare with the current text here,
+                    # instead of trying again forever.
+                    edits = compute_line_edits(self.buffer.text, text)
+                self._apply_reload(text, edits, stat)
+                self.editor.application.invalidate()
+
+        self.editor.run_in_background(load, done)
 
-        self.buffer.document = Document(text, cursor_position)
-        self._file_content = text
+    def _apply_reload(self, text, edits, stat):
+        """
+        Apply the edits that turn the current text into `text`, the content
+        of the storage. (Like `_set_text_from_storage`, but this is an undo
+        step, and the undo history is kept.)
+        """
+        buffer = self.buffer
+        line_index = self.line_index
+
+        # Top lines of the windows that show this buffer, as offsets.
+        windows = []
+        for tab in self.editor.window_arrangement.tab_pages:
+            for window in tab.windows():
+                pt_window = window.pt_window
+                if window.editor_buffer is self and pt_window is not None:
+                    row = min(pt_window.vertical_scroll, line_index.line_count - 1)
+                    windows.append((pt_window, line_index.line_start(row)))
+
+        if edits:
+            buffer.save_to_undo_stack()
+            cursor_position = map_position(buffer.cursor_position, edits)
+
+            self._journaling = False
+            try:
+                buffer._apply_with_hint(
+                    edits, buffer.set_document, Document(text, cursor_position),
+                    bypass_readonly=True)
+            finally:
+                self._journaling = True
+
+            for pt_window, offset in windows:
+                pt_window.vertical_scroll = line_index.translate_index_to_position(
+                    map_position(offset, edits))[0]
+
+        self._mark_as_saved(stat)
+        self._update_large_file_mode(text)
+
+    @property
+    def following(self):
+        " True in follow mode. (':follow') "
+        return self._tail is not None
+
+    def follow(self, enable=True):
+        """
+        Turn follow mode on or off. In follow mode, the data that is appended
+        to the file is read when the file changes, and appended to the
+        buffer, like `tail -f`. Only the new bytes are read.
+        """
+        if not enable:
+            self._tail = None
+            return
+
+        if self.following:
+            return
+
+        if self.binary_file is not None:
+            self.editor.show_message('Cannot follow a binary file.')
+            return
+
+        # (`storage_stat` is the stat of the version of the file that was read,
+        # so its size is the amount of bytes the text was read from.)
+        io = self._find_io(self.location) if self.location else None
+        stat = self.storage_stat
+
+        try:
+            tail = io and io.follow(
+                self.location, self.encoding,
+                offset=stat[1] if stat else 0, inode=stat[2] if stat else None)
+        except (IOError, OSError) as e:
+            self.editor.show_message('Cannot follow %s: %s' % (self.get_display_name(), e))
+            return
+
+        if tail is None:
+            self.editor.show_message('Cannot follow %s' % self.get_display_name())
+        else:
+            self._tail = tail
+            self._read_appended()  # Catch up.
+
+    def _read_appended(self):
+        """
+        Read the data that was appended to the file in the background, and
+        append it to the buffer. When the file was truncated or replaced, the
+        new content is applied as a diff, like `reload` does.
+        """
+        if self._tail_is_reading:
+            self._tail_read_again = True
+            return
+
+        tail = self._tail
+        old_text = self.buffer.text
+        text_version = self.text_version
+
+        def read():
+            # (Take the stat before reading: anything that is appended
+            # afterwards will be reported by the `FileWatcher` again.)
+            stat = file_stat(self.location)
+            try:
+                text, reset = tail.read()
+            except (IOError, OSError) as e:
+                return None, None, None, e
+
+            edits = compute_line_edits(old_text, text) if reset else None
+            return stat, text, edits, None
+
+        def done(result):
+            stat, text, edits, error = result
+            self._tail_is_reading = False
+
+            if tail is not self._tail:
+                return  # Follow mode was turned off in the meantime.
+
+            if error is not None:
+                self.editor.show_message('Cannot read %s: %s' % (self.get_display_name(), error))
+            elif edits is not None:
+                if self.text_version != text_version:
+                    edits = compute_line_edits(self.buffer.text, text)
+                self._apply_follow(text, edits, stat)
+            elif text:
+                self._apply_follow(
+                    self.buffer.text + text,
+                    [TextEdit(len(self.buffer.text), '', text)], stat)
+
+            if self._tail_read_again:
+                self._tail_read_again = False
+                self._read_appended()
+
+        self._tail_is_reading = True
+        self.editor.run_in_background(read, done)
+
+    def _apply_follow(self, text, edits, stat):
+        """
+        Apply the edits that follow mode read. Appended text is not an undo
+        step. When the cursor was on the last line, it moves to the new last
+        line, so that the view stays at the bottom.
+        """
+        buffer = self.buffer
+        line_index = self.line_index
+        row, col = line_index.translate_index_to_position(buffer.cursor_position)
+        at_bottom = row == line_index.line_count - 1
+        was_saved = not self.has_unsaved_changes
+
+        if len(edits) == 1 and edits[0].position == len(buffer.text) and not edits[0].deleted:
+            self._journaling = False
+            buffer.undo_history.recording = False
+            try:
+                buffer._apply_with_hint(
+                    edits, buffer.set_document,
+                    Document(text, buffer.cursor_position), bypass_readonly=True)
+            finally:
+                self._journaling = True
+                buffer.undo_history.recording = True
+
+            buffer.undo_history.new_state()
+            self._text_state = buffer.undo_history.state
+            if was_saved:
+                self._saved_state = self._text_state
+            self.storage_stat = stat
+        else:
+            self._apply_reload(text, edits, stat)
+
+        if at_bottom:
+            buffer.cursor_position = line_index.translate_row_col_to_index(
+                line_index.line_count - 1, col)
+
+        self._update_large_file_mode(text)
+        self.editor.application.invalidate()
+
+    def _set_text_from_storage(self, text, stat, undo_history=None):
+        """
+        Replace the text by the content of the storage. (This change is not
+        journaled, and there are no unsaved changes afterwards.) The undo
+        history is replaced as well.
+        """
+        self._journaling = False
+        try:
+            self.buffer.set_document(
+                Document(text, min(self.buffer.cursor_position, len(text))),
+                bypass_readonly=True)
+        finally:
+            self._journaling = True
+
+        self.buffer.undo_history = undo_history or UndoHistory()
+        self._mark_as_saved(stat)
+        self._update_large_file_mode(text)
+
+    def _update_large_file_mode(self, text):
+        """
+        Turn large file mode on or off, depending on the size of the text
+        that was read from the storage.
+        """
+        threshold = self.editor.large_file_threshold
+        is_large_file = bool(threshold) and len(text) >= threshold
+
+        if is_large_file != self.is_large_file:
+            self.is_large_file = is_large_file
+            self.features = dict.fromkeys(LARGE_FILE_FEATURES, not is_large_file)
+
+            if is_large_file:
+                self.report_errors = []
+
+    def set_feature(self, name, enabled):
+        """
+        Turn one of the `LARGE_FILE_FEATURES` on or off for this buffer.
+        """
+        assert name in LARGE_FILE_FEATURES
+        self.features[name] = enabled
+
+        if name == 'pyflakes':
+            if enabled:
+                self.run_reporter()
+            else:
+                self.report_errors = []
+                self._report_version = None
 
     def write(self, location=None):
         """
         Write file to I/O backend.
         """
+        # Don't overwrite the file with a partially loaded buffer.
+        if self.is_loading:
+            self.editor.show_message('Cannot write while the file is still loading.')
+            return
+
+        # Binary files are patched in place.
+        if self.binary_file is not None:
+            if location is not None and location != self.location:
+                self.editor.show_message('Cannot write a binary file to another location.')
+                return
+            try:
+                self.binary_file.write(fsync=self.editor.fsync)
+            except (IOError, OSError) as e:
+                self.editor.show_message('%s' % e)
+            else:
+                self.storage_stat = file_stat(self.location)
+            return
+
         # Take location and expand tilde.
         if location is not None:
             self.location = location
@@ -146,16 +893,65 @@ class EditorBuffer(object):
         else:
             self.editor.show_message('Unknown location: %r' % location)
 
-        # Write it.
+        # Write it. (The text is passed in chunks, followed by the trailing
+        # newline, so that the backend never needs a copy of the whole text.
+        # For 'dos' line endings, the chunks are converted piece by piece.)
+        text = self.buffer.text
+        newline = '\r\n' if self.fileformat == 'dos' else '\n'
+
+        def chunks():
+            if newline == '\n':
+                yield text
+            else:
+                for i in range(0, len(text), NEWLINE_CHUNK_SIZE):
+                    yield text[i:i + NEWLINE_CHUNK_SIZE].replace('\n', newline)
+            if self.eol:
+                yield newline
+
         try:
-            io.write(self.location, self.buffer.text + '\n', self.encoding)
+            io.write_chunks(self.location, chunks(), self.encoding)
             self.is_new = False
         except Exception as e:
             # E.g. "No such file or directory."
             self.editor.show_message('%s' % e)
         else:
-            # When the save succeeds: update: _file_content.
-            self._file_content = self.buffer.text
+            # When the save succeeds: remember what's in the file now.
+            self._mark_as_saved(file_stat(self.location))
+
+            if self.editor.undofile:
+                self._write_undo_file(text)
+
+    def _read_undo_history(self, location, text):
+        """
+        Return the `UndoHistory` from the undo file, if there is one that
+        matches this text. Otherwise an empty one. (Can run in a thread.)
+        """
+        history = None
+        if self.editor.undofile and not self.isdir:
+            history = UndoHistory.read(
+                undo_file_path(self.editor.undo_directory, location), text)
+        return history or UndoHistory()
+
+    def _write_undo_file(self, text):
+        """
+        Write the undo history in the background. (Only the serialization
+        happens here, it's proportional to the size of the history.)
+        """
+        path = undo_file_path(self.editor.undo_directory, self.location)
+        history = self.buffer.undo_history
+        data = history.serialize()
+
+        def write():
+            try:
+                history.write(path, text, data)
+            except (IOError, OSError) as e:
+                return e
+
+        def done(error):
+            if error is not None:
+                self.editor.show_message('Cannot write undo file: %s' % error)
+
+        self.editor.run_in_background(write, done)
 
     def get_display_name(self, short=False):
         """
@@ -173,45 +969,41 @@ class EditorBuffer(object):
 
     def run_reporter(self):
         " Buffer text changed. "
+        # Don't run reporter when we don't have a location. (We need to
+        # know the filetype, actually.) Also wait until the file is loaded,
+        # and don't run again when the errors are up to date.
+        if (self.location is None or self.is_loading or
+                not self.features['pyflakes'] or
+                self._report_version == self.text_version):
+            return
+
         if not self._reporter_is_running:
             self._reporter_is_running = True
 
-            text = self.buffer.text
+            text_version = self.text_version
             self.report_errors = []
 
-            # Don't run reporter when we don't have a location. (We need to
-            # know the filetype, actually.)
-            if self.location is None:
-                return
-
-            # Better not to access the document in an executor.
+            # Better not to access the document in an executor. (The line
+            # index changes in place, so pass a copy. It shares the blocks of
+            # lines with the index, so this doesn't copy every line.)
             document = self.buffer.document
-
-            if PTK3:
-                loop = get_event_loop()
+            line_index = self.line_index.copy()
 
             def in_executor():
                 # Call reporter
-                report_errors = report(self.location, document)
-
-                def ready():
-                    self._reporter_is_running = False
-
-                    # If the text has not been changed yet in the meantime, set
-                    # reporter errors. (We were running in another thread.)
-                    if text == self.buffer.text:
-                        self.report_errors = report_errors
-                        get_app().invalidate()
-                    else:
-                        # Restart reporter when the text was changed.
-                        self.run_reporter()
-
-                if PTK3:
-                    loop.call_soon_threadsafe(ready)
+                return report(self.location, document, line_index)
+
+            def ready(report_errors):
+                self._reporter_is_running = False
+
+                # If the text has not been changed yet in the meantime, set
+                # reporter errors. (We were running in another thread.)
+                if text_version == self.text_version and self.features['pyflakes']:
+                    self.report_errors = report_errors
+                    self._report_version = text_version
+                    self.editor.application.invalidate()
                 else:
-                    call_from_executor(ready)
+                    # Restart reporter when the text was changed.
+                    self.run_reporter()
 
-            if PTK3:
-                loop.run_in_executor(None, in_executor)
-            else:
-                run_in_executor(in_executor)
+            self.editor.run_in_background(in_executor, ready)
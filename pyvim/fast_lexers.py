@@ -0,0 +1,371 @@
+"""
+Hand written lexers for file types that are common, and big.
+
+Pygments' `RegexLexer` tries the rules of a state one by one, for every
+token. The lexers here compile all the rules of a state into one regular
+expression instead, and tokenize a state with a single `finditer` loop. They
+output the same Pygments tokens as the Pygments lexers (or, for log files,
+tokens that the styles already have), so that the color schemes keep
+working.
+
+They follow the syntax less precisely than the Pygments lexers. For
+instance, the content of a YAML block scalar is highlighted like the other
+lines, and Python strings are not split into escapes and interpolations.
+"""
+from __future__ import unicode_literals
+
+from pygments.lexer import Lexer
+from pygments.token import (
+    Comment, Error, Generic, Keyword, Literal, Name, Number, Operator,
+    Punctuation, String, Text, Whitespace)
+from pygments.util import ClassNotFound
+
+import fnmatch
+import os
+import re
+
+__all__ = (
+    'FastLexer',
+    'JsonFastLexer',
+    'YamlFastLexer',
+    'LogFastLexer',
+    'PythonFastLexer',
+    'get_fast_lexer_for_filename',
+)
+
+
+class FastLexer(Lexer):
+    """
+    Base class for the fast lexers.
+
+    `tokens` has the same layout as for a Pygments `RegexLexer`: a list of
+    rules for every state. A rule is a (regex, token) or (regex, token,
+    new_state) tuple, where token can be a tuple of tokens, one for every
+    group of the regex (like `bygroups`), and new_state is '#pop' or the
+    name of a state to push. The regexes should not match an empty string, and should not use
+    group references.
+
+    Like Pygments, at a newline that no rule matches, the state goes back
+    to "root". Other characters that no rule matches are an `Error`.
+    """
+    tokens = {}
+    flags = re.MULTILINE | re.UNICODE
+
+    def __init__(self, **options):
+        super(FastLexer, self).__init__(**options)
+
+        cls = type(self)
+        if '_compiled_states' not in cls.__dict__:
+            cls._compiled_states = dict(
+                (name, _compile_rules(rules, cls.flags))
+                for name, rules in cls.tokens.items())
+
+    def lex(self, text, pos=0, stack=('root', )):
+        """
+        Tokenize `text`, starting at `pos` with this state stack.
+
+        Yields (token, value) tuples. After every match that ends with a
+        newline, a (None, stack) tuple is yielded, with the state stack for the
+        next line. (The same as `pyvim.lexer._lex` does for Pygments.)
+        """
+        states = self._compiled_states
+        statestack = list(stack)
+        end = len(text)
+
+        while pos < end:
+            pattern, actions = states[statestack[-1]]
+
+            # (Every character matches, because of the fallback rules, so the
+            # matches are adjacent.)
+            for m in pattern.finditer(text, pos):
+                token, groups, new_state = actions[m.lastindex]
+                pos = m.end()
+
+                if groups:
+                    for token, value in zip(token, m.group(*groups)):
+                        if value:
+                            yield token, value
+                else:
+                    yield token, m.group()
+
+                if new_state is not None:
+                    if new_state == '#pop':
+                        if len(statestack) > 1:
+                            statestack.pop()
+                    elif new_state == '#root':
+                        statestack = ['root']
+                    else:
+                        statestack.append(new_state)
+
+                    if text[pos - 1] == '\n':
+                        yield None, tuple(statestack)
+                    break
+
+                if text[pos - 1] == '\n':
+                    yield None, tuple(statestack)
+
+    def get_tokens_unprocessed(self, text):
+        " The Pygments interface: yield (index, token, value) tuples. "
+        index = 0
+        for token, value in self.lex(text):
+            if token is not None:
+                yield index, token, value
+                index += len(value)
+
+
+def _compile_rules(rules, flags):
+    """
+    Compile the rules of one state into one regex, with a group around
+    every rule. Return the regex and the (token, groups, new_state) action
+    for the group number of every rule. `groups` are the numbers of the
+    groups inside the rule, when there is a token for each of them.
+    """
+    rules = list(rules) + [
+        (r'\n', Whitespace, '#root'),
+        (r'.', Error, None),
+    ]
+    parts = []
+    actions = [None]
+    for rule in rules:
+        regex, token = rule[:2]
+        new_state = rule[2] if len(rule) > 2 else None
+
+        group = len(actions)
+        group_count = re.compile(regex, flags).groups
+        if type(token) is tuple:
+            groups = tuple(range(group + 1, group + 1 + group_count))
+        else:
+            groups = ()
+
+        actions.append((token, groups, new_state))
+        actions.extend([None] * group_count)
+        parts.append('(%s)' % regex)
+
+    return re.compile('|'.join(parts), flags), actions
+
+
+# Quoted strings, inside a line.
+_DOUBLE_QUOTED = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+_YAML_SINGLE_QUOTED = r"'(?:[^'\n]|'')*'"
+
+
+class JsonFastLexer(FastLexer):
+    """
+    JSON, with the tokens of the Pygments `JsonLexer`.
+
+    (The whitespace after punctuation is part of the punctuation token. That
+    looks the same, and there are a third less tokens.)
+    """
+    name = 'JSON (fast)'
+    aliases = ['json-fast']
+    filenames = ['*.json', '*.jsonl', '*.ndjson']
+
+    tokens = {
+        'root': [
+            (r'[{}\[\],:]+[ \t\r]*\n?', Punctuation),
+            (_DOUBLE_QUOTED + r'(?=[ \t\r]*:)', Name.Tag),
+            (_DOUBLE_QUOTED + '?', String.Double),  # (Or not closed yet.)
+            (r'-?\d+(?:\.\d+(?:[eE][+-]?\d+)?|[eE][+-]?\d+)', Number.Float),
+            (r'-?\d+', Number.Integer),
+            (r'(?:true|false|null)\b', Keyword.Constant),
+            (r'[ \t\r]*\n|[ \t\r]+', Whitespace),
+            (r'//[^\n]*', Comment.Single),
+            (r'/\*', Comment.Multiline, 'comment'),
+        ],
+        'comment': [
+            (r'[^*\n]+', Comment.Multiline),
+            (r'\*/', Comment.Multiline, '#pop'),
+            (r'\*', Comment.Multiline),
+            (r'\n', Whitespace),
+        ],
+    }
+
+
+# (The end of a YAML indicator or key.)
+_YAML_END = r'(?=[ \t\r\n]|$)'
+
+# Rules for the YAML block and flow context.
+_YAML_RULES = [
+    (r'[ \t\r]+', Whitespace),
+    (r'\n', Whitespace),
+    (r'#[^\n]*', Comment.Single),
+    (r'(%s|%s)([ \t]*)(:)%s' % (_DOUBLE_QUOTED, _YAML_SINGLE_QUOTED, _YAML_END),
+     (Name.Tag, Whitespace, Punctuation)),
+    (_DOUBLE_QUOTED + '?', String),
+    (_YAML_SINGLE_QUOTED + '?', String),
+    (r'&[^\s,\[\]{}]+', Name.Label),
+    (r'\*[^\s,\[\]{}]+', Name.Variable),
+    (r'![^\s,\[\]{}]*', Keyword.Type),
+    (r'[\[{]', Punctuation.Indicator, 'flow'),
+]
+
+
+class YamlFastLexer(FastLexer):
+    """
+    YAML, with the tokens of the Pygments `YamlLexer`.
+
+    (Block scalars and strings over several lines are highlighted like the
+    other lines.)
+    """
+    name = 'YAML (fast)'
+    aliases = ['yaml-fast']
+    filenames = ['*.yaml', '*.yml']
+
+    tokens = {
+        'root': [
+            (r'^(?:---|\.\.\.)' + _YAML_END, Name.Namespace),
+            (r'^%[^\n]*', Name.Tag),
+            (r'([^\s#\'"\[\]{},&*!|>%@`-][^\n]*?)([ \t]*)(:)' + _YAML_END,
+             (Name.Tag, Whitespace, Punctuation)),
+        ] + _YAML_RULES + [
+            (r'[-?]' + _YAML_END, Punctuation.Indicator),
+            (r':' + _YAML_END, Punctuation),
+            (r'[|>][-+0-9]*' + _YAML_END, Punctuation.Indicator),
+            (r'[^\s#](?:\S|[ \t]+(?=[^\s#]))*', Literal.Scalar.Plain),
+        ],
+        'flow': [
+            (r'([^\s#\'"\[\]{},:][^\n,\[\]{}]*?)([ \t]*)(:)(?=[ \t\r\n,\]}]|$)',
+             (Name.Tag, Whitespace, Punctuation)),
+        ] + _YAML_RULES + [
+            (r'[\]}]', Punctuation.Indicator, '#pop'),
+            (r',', Punctuation.Indicator),
+            (r':', Punctuation),
+            (r'[^\s#,\[\]{}:](?:[^\s,\[\]{}]|[ \t]+(?=[^\s#,\[\]{}]))*',
+             Literal.Scalar.Plain),
+        ],
+    }
+
+
+class LogFastLexer(FastLexer):
+    """
+    Log files: timestamps, log levels, exceptions, quoted strings and
+    numbers. (Pygments has no lexer for these.)
+    """
+    name = 'Log file'
+    aliases = ['log']
+    filenames = ['*.log']
+
+    tokens = {
+        'root': [
+            (r'[ \t\r]+', Whitespace),
+            (r'\n', Whitespace),
+            (r'\d{4}-\d\d-\d\d(?:[T ]\d\d:\d\d:\d\d(?:[.,]\d+)?'
+             r'(?:Z|[+-]\d\d:?\d\d)?)?\b', Literal.Date),
+            (r'\d\d:\d\d:\d\d(?:[.,]\d+)?\b', Literal.Date),
+            (r'(?:ERROR|FATAL|CRITICAL|SEVERE|error|fatal|critical)\b', Generic.Error),
+            (r'(?:WARNING|WARN|warning|warn)\b', Generic.Strong),
+            (r'(?:INFO|DEBUG|TRACE|NOTICE|info|debug|trace|notice)\b', Keyword),
+            (r'^Traceback \(most recent call last\):', Generic.Traceback),
+            (r'[A-Z]\w*(?:Error|Exception)\b', Name.Exception),
+            (r'\[[^\]\n]*\]', Name.Label),
+            (_DOUBLE_QUOTED, String.Double),
+            (r'\d+(?:\.\d+)*\b', Number),
+            (r'\w+', Text),
+            (r'[^\w\s"\[]+|[\["]', Text),
+        ],
+    }
+
+
+def _words(words):
+    " Regex for one of these words. "
+    return r'(?:%s)\b' % '|'.join(words)
+
+
+def _triple_quoted(quote, token):
+    " The rules inside a triple quoted Python string. "
+    return [
+        (r'[^%s\\\n]+' % quote, token),
+        (r'\\[^\n]?', token),
+        (quote * 3, token, '#pop'),
+        (quote, token),
+        (r'\n', token),
+    ]
+
+
+_PYTHON_BUILTINS = (
+    '__import__', 'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytearray',
+    'breakpoint', 'bytes', 'callable', 'chr', 'classmethod', 'compile',
+    'complex', 'delattr', 'dict', 'dir', 'divmod', 'enumerate', 'eval',
+    'exec', 'filter', 'float', 'format', 'frozenset', 'getattr', 'globals',
+    'hasattr', 'hash', 'hex', 'id', 'input', 'int', 'isinstance',
+    'issubclass', 'iter', 'len', 'list', 'locals', 'map', 'max',
+    'memoryview', 'min', 'next', 'object', 'oct', 'open', 'ord', 'pow',
+    'print', 'property', 'range', 'repr', 'reversed', 'round', 'set',
+    'setattr', 'slice', 'sorted', 'staticmethod', 'str', 'sum', 'super',
+    'tuple', 'type', 'vars', 'zip')
+
+_PYTHON_KEYWORDS = (
+    'assert', 'async', 'await', 'break', 'continue', 'del', 'elif', 'else',
+    'except', 'finally', 'for', 'global', 'if', 'lambda', 'nonlocal', 'pass',
+    'raise', 'return', 'try', 'while', 'with', 'yield', 'as', 'def', 'class')
+
+
+class PythonFastLexer(FastLexer):
+    """
+    Python, with the tokens of the Pygments `PythonLexer`.
+    """
+    name = 'Python (fast)'
+    aliases = ['python-fast']
+    filenames = ['*.py', '*.pyw', '*.pyi']
+
+    tokens = {
+        'root': [
+            (r'\n', Whitespace),
+            (r'^([ \t]*)([rRuUbB]{0,2})(""")', (Whitespace, String.Affix, String.Doc), 'docdq'),
+            (r"^([ \t]*)([rRuUbB]{0,2})(''')", (Whitespace, String.Affix, String.Doc), 'docsq'),
+            (r'[ \t\r\f]+', Whitespace),
+            (r'\\\n', Text),
+            (r'#[^\n]*', Comment.Single),
+            (r'([rRuUbBfF]{0,2})(""")', (String.Affix, String.Double), 'tdqs'),
+            (r"([rRuUbBfF]{0,2})(''')", (String.Affix, String.Single), 'tsqs'),
+            (r'([rRuUbBfF]{0,2})("[^"\\\n]*(?:\\(?:.|\n)[^"\\\n]*)*"?)', (String.Affix, String.Double)),
+            (r"([rRuUbBfF]{0,2})('[^'\\\n]*(?:\\(?:.|\n)[^'\\\n]*)*'?)", (String.Affix, String.Single)),
+            (r'(def)([ \t]+)(__\w+__)\b', (Keyword, Whitespace, Name.Function.Magic)),
+            (r'(def)([ \t]+)([^\W\d]\w*)', (Keyword, Whitespace, Name.Function)),
+            (r'(class)([ \t]+)([^\W\d]\w*)', (Keyword, Whitespace, Name.Class)),
+            (r'(from)([ \t]+)([\w.]+)', (Keyword.Namespace, Whitespace, Name.Namespace)),
+            (r'^([ \t]*)(import)([ \t]+)([\w.]+)',
+             (Whitespace, Keyword.Namespace, Whitespace, Name.Namespace)),
+            (_words(['from', 'import']), Keyword.Namespace),
+            (_words(['True', 'False', 'None']), Keyword.Constant),
+            (_words(['and', 'in', 'is', 'not', 'or']), Operator.Word),
+            (_words(_PYTHON_KEYWORDS), Keyword),
+            (_words(['self', 'cls']), Name.Builtin.Pseudo),
+            (r'(?<!\.)' + _words(_PYTHON_BUILTINS), Name.Builtin),
+            (r'(?<!\.)[A-Z]\w*(?:Error|Exception|Warning)\b', Name.Exception),
+            (r'@[^\W\d]\w*', Name.Decorator),
+            (r'[^\W\d]\w*', Name),
+            (r'0[xX][\da-fA-F_]+', Number.Hex),
+            (r'0[oO][0-7_]+', Number.Oct),
+            (r'0[bB][01_]+', Number.Bin),
+            (r'(?:\d[\d_]*\.[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d[\d_]*)?j?', Number.Float),
+            (r'\d[\d_]*[eE][+-]?\d[\d_]*j?', Number.Float),
+            (r'\d[\d_]*j?', Number.Integer),
+            (r'(?:\*\*|//|<<|>>|->|:=|[-+*/%@&|^~<>=!.])=?', Operator),
+            (r'[\[\](){},:;]', Punctuation),
+        ],
+        'tdqs': _triple_quoted('"', String.Double),
+        'tsqs': _triple_quoted("'", String.Single),
+        'docdq': _triple_quoted('"', String.Doc),
+        'docsq': _triple_quoted("'", String.Doc),
+    }
+
+
+#: The fast lexers, in the order that they are looked up.
+FAST_LEXERS = [JsonFastLexer, YamlFastLexer, LogFastLexer, PythonFastLexer]
+
+
+def get_fast_lexer_for_filename(filename):
+    """
+    Return a fast lexer instance for this filename. (Like
+    `pygments.lexers.get_lexer_for_filename`, this raises `ClassNotFound`
+    when there is none.)
+    """
+    basename = os.path.basename(filename)
+
+    for cls in FAST_LEXERS:
+        for pattern in cls.filenames:
+            if fnmatch.fnmatch(basename, pattern):
+                return cls()
+
+    raise ClassNotFound('No fast lexer for filename %r' % filename)
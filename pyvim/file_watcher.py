@@ -0,0 +1,95 @@
+"""
+Detection of changes to open files by other programs.
+
+A `FileWatcher` thread checks the files of all the open buffers, once per
+interval, in one batch. It compares the modification time, size and inode
+of every file with the ones that were recorded when the buffer was read or
+written, and reports the files that are different.
+
+The comparison happens in the thread as well. The event loop is only
+involved for the files that actually changed.
+"""
+from __future__ import unicode_literals
+
+import os
+import threading
+
+__all__ = (
+    'FileWatcher',
+    'file_stat',
+)
+
+
+def file_stat(location):
+    """
+    Return the (mtime, size, inode) tuple that identifies the current version
+    of this file, or `None` when it doesn't exist (or is not a local file).
+    """
+    if location is None or '://' in location:
+        return None
+
+    try:
+        st = os.stat(os.path.expanduser(location))
+    except OSError:
+        return None
+
+    return st.st_mtime, st.st_size, st.st_ino
+
+
+class FileWatcher(object):
+    """
+    Background thread that watches files for changes.
+
+    :param get_files: Callable that returns a list of (key, location,
+        known_stat) tuples, for the files to check. `known_stat` is the
+        `file_stat` that was recorded for this file. (Called in the thread.)
+    :param callback: Called with a list of (key, new_stat) tuples for the
+        files that changed. (Called in the thread.)
+    :param interval: Callable that returns the interval in seconds. When it
+        returns 0, nothing is checked.
+    """
+    def __init__(self, get_files, callback, interval):
+        self.get_files = get_files
+        self.callback = callback
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        """
+        Check all the files once. Returns the list of changes.
+        """
+        changes = []
+
+        for key, location, known_stat in self.get_files():
+            stat = file_stat(location)
+            if stat != known_stat:
+                changes.append((key, stat))
+
+        return changes
+
+    def _run(self):
+        while True:
+            interval = self.interval()
+
+            # (When disabled, look again at the interval once per second.)
+            if self._stop.wait(interval or 1):
+                return
+
+            if interval:
+                changes = self.check()
+                if changes:
+                    self.callback(changes)
@@ -0,0 +1,195 @@
+"""
+Hex view for binary files.
+
+The content of a binary file is never turned into text. `HexControl` is a
+prompt_toolkit `UIControl` that formats only the rows that are visible, by
+reading them from the `BinaryFile` when they are rendered. Typing hex digits
+changes the byte under the cursor.
+"""
+from __future__ import unicode_literals
+
+from prompt_toolkit.application import get_app
+from prompt_toolkit.data_structures import Point
+from prompt_toolkit.filters import vi_navigation_mode
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout.controls import UIContent, UIControl
+
+__all__ = (
+    'HexControl',
+)
+
+BYTES_PER_ROW = 16
+
+# Width of the offset column, including the spaces after it.
+_OFFSET_WIDTH = 10
+
+_HEX_DIGITS = '0123456789abcdefABCDEF'
+
+
+def _column(index):
+    " Position of the hex representation of this byte in the row. "
+    return _OFFSET_WIDTH + 3 * index + (1 if index >= BYTES_PER_ROW // 2 else 0)
+
+
+class HexControl(UIControl):
+    """
+    Hex dump of a `BinaryFile`: the offset, the bytes in hex and the bytes
+    as ASCII, for 16 bytes per row. Changed bytes are highlighted.
+
+    :param binary_file: `pyvim.io.BinaryFile` instance.
+    """
+    def __init__(self, binary_file):
+        self.binary_file = binary_file
+
+        #: Offset of the byte under the cursor, and the half of it. (0 for
+        #: the high four bits.)
+        self.offset = 0
+        self.nibble = 0
+
+        self._key_bindings = self._create_key_bindings()
+
+    @property
+    def line_count(self):
+        return max(1, (self.binary_file.size + BYTES_PER_ROW - 1) // BYTES_PER_ROW)
+
+    def is_focusable(self):
+        return True
+
+    def create_content(self, width, height):
+        # (The file could have been reloaded with a different size.)
+        self.offset = max(0, min(self.offset, self.binary_file.size - 1))
+
+        row, index = divmod(self.offset, BYTES_PER_ROW)
+
+        return UIContent(
+            get_line=self._get_line,
+            line_count=self.line_count,
+            cursor_position=Point(x=_column(index) + self.nibble, y=row),
+            show_cursor=True)
+
+    def _get_line(self, row):
+        binary_file = self.binary_file
+        start = row * BYTES_PER_ROW
+        data = binary_file.read(start, BYTES_PER_ROW)
+
+        result = [('class:hex.offset', '%08x' % start), ('', '  ')]
+
+        for i in range(BYTES_PER_ROW):
+            if i == BYTES_PER_ROW // 2:
+                result.append(('', ' '))
+
+            if i < len(data):
+                style = 'class:hex.changed' if binary_file.is_patched(start + i) else ''
+                result.append((style, '%02x ' % data[i]))
+            else:
+                result.append(('', '   '))
+
+        result.append(('class:hex.ascii', ' ' + ''.join(
+            chr(c) if 32 <= c < 127 else '.' for c in data)))
+        return result
+
+    def get_key_bindings(self):
+        return self._key_bindings
+
+    def move(self, count):
+        " Move the cursor by this amount of bytes. "
+        self.offset = max(0, min(self.offset + count, self.binary_file.size - 1))
+        self.nibble = 0
+
+    def type_digit(self, digit):
+        """
+        Replace the half of the byte under the cursor by this hex digit, and
+        move to the next half.
+        """
+        if self.offset >= self.binary_file.size:
+            return  # Empty file.
+
+        value = self.binary_file.read(self.offset, 1)[0]
+        digit = int(digit, 16)
+
+        if self.nibble == 0:
+            value = (value & 0x0f) | (digit << 4)
+        else:
+            value = (value & 0xf0) | digit
+
+        self.binary_file.patch(self.offset, value)
+
+        if self.nibble == 0:
+            self.nibble = 1
+        else:
+            self.move(1)
+
+    def _create_key_bindings(self):
+        # (These are 'eager', so that the Vi key bindings for the same keys,
+        # like 'f' followed by a character, don't wait for more keys.)
+        kb = KeyBindings()
+
+        def handle(*keys):
+            return kb.add(*keys, filter=vi_navigation_mode, eager=True)
+
+        def page_size():
+            info = get_app().layout.current_window.render_info
+            return BYTES_PER_ROW * (info.window_height if info else 1)
+
+        @handle('h')
+        @handle('left')
+        def _(event):
+            self.move(-event.arg)
+
+        @handle('l')
+        @handle('right')
+        def _(event):
+            self.move(event.arg)
+
+        @handle('k')
+        @handle('up')
+        def _(event):
+            if self.offset >= BYTES_PER_ROW:
+                self.move(-BYTES_PER_ROW * min(event.arg, self.offset // BYTES_PER_ROW))
+
+        @handle('j')
+        @handle('down')
+        def _(event):
+            self.move(BYTES_PER_ROW * event.arg)
+
+        @handle('^')
+        @handle('home')
+        def _(event):
+            self.move(-(self.offset % BYTES_PER_ROW))
+
+        @handle('$')
+        @handle('end')
+        def _(event):
+            self.move(BYTES_PER_ROW - 1 - self.offset % BYTES_PER_ROW)
+
+        @handle('g', 'g')
+        def _(event):
+            self.offset = self.nibble = 0
+
+        @handle('G')
+        def _(event):
+            self.move(self.binary_file.size)
+
+        @handle('c-f')
+        @handle('pagedown')
+        def _(event):
+            self.move(page_size())
+
+        @handle('c-b')
+        @handle('pageup')
+        def _(event):
+            self.move(-min(page_size(), self.offset - self.offset % BYTES_PER_ROW))
+
+        @handle('u')
+        def _(event):
+            offset = self.binary_file.undo()
+            if offset is not None:
+                self.offset = offset
+                self.nibble = 0
+
+        for digit in _HEX_DIGITS:
+            @handle(digit)
+            def _(event):
+                self.type_digit(event.data)
+
+        return kb
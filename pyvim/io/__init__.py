@@ -2,3 +2,4 @@ from __future__ import unicode_literals
 
 from .base import *
 from .backends import *
+from .binary import *
@@ -1,28 +1,104 @@
 from __future__ import unicode_literals
 
+from prompt_toolkit.filters import to_filter
+from six.moves import http_client, urllib
+
+import bz2
 import codecs
+import collections
+import contextlib
+import errno
 import gzip
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
+import operator
 import os
-import six
-from six.moves import urllib
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import lzma
+except ImportError:
+    lzma = None  # Python 2.
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None  # Python 2.
 
 from .base import EditorIO
+from .binary import BinaryFile, SNIFF_SIZE, is_binary
 
 __all__ = (
     'FileIO',
+    'FileTail',
+    'CompressedFileIO',
     'GZipFileIO',
+    'BZ2FileIO',
+    'XZFileIO',
     'DirectoryIO',
+    'directory_entry_name',
     'HttpIO',
 )
 
 
 ENCODINGS = ['utf-8', 'latin-1']
 
+# Text is encoded and written in pieces of this many characters, so that
+# saving never needs an encoded copy of the whole text.
+WRITE_CHUNK_SIZE = 256 * 1024
+
+# Compressed files are read in pieces of this many bytes.
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Decompressed data that is not UTF-8 is decoded again from a copy. The copy
+# is kept in memory up to this size, and goes to a temporary file beyond it.
+SPOOL_SIZE = 16 * 1024 * 1024
+
+# Size of the blocks (before compression) when compressing in parallel.
+COMPRESS_BLOCK_SIZE = 4 * 1024 * 1024
+MAX_PENDING_BLOCKS = 16
+
+# Directories with more entries than this are read in the background.
+LARGE_DIRECTORY_SIZE = 10000
+
+# Number of directory entries that are formatted at once.
+LISTING_CHUNK_SIZE = 4096
+
+# Byte order marks. A file that starts with one of these is decoded with the
+# corresponding codec, and saved with the same byte order mark again. (When
+# that codec fails, the file is decoded like a file without byte order mark.)
+# (The UTF-32 LE mark starts with the UTF-16 LE mark, so it is tested first.)
+BYTE_ORDER_MARKS = [
+    ('utf-32-le', codecs.BOM_UTF32_LE),
+    ('utf-32-be', codecs.BOM_UTF32_BE),
+    ('utf-8-sig', codecs.BOM_UTF8),
+    ('utf-16-le', codecs.BOM_UTF16_LE),
+    ('utf-16-be', codecs.BOM_UTF16_BE),
+]
+
 
 class FileIO(EditorIO):
     """
     I/O backend for the native file system.
+
+    Files are saved atomically: the content is written to a temporary file
+    in the same directory, which is renamed to the destination afterwards.
+
+    :param fsync: Bool or `Filter`: flush the data to the disk before
+        renaming the temporary file.
     """
+    def __init__(self, fsync=False):
+        self.fsync = to_filter(fsync)
+
     def can_open_location(cls, location):
         # We can handle all local files.
         return '://' not in location and not os.path.isdir(location)
@@ -30,42 +106,252 @@ class FileIO(EditorIO):
     def exists(self, location):
         return os.path.exists(os.path.expanduser(location))
 
+    def size(self, location):
+        return os.path.getsize(os.path.expanduser(location))
+
     def read(self, location):
         """
         Read file from disk.
         """
         location = os.path.expanduser(location)
 
-        # Try to open this file, using different encodings.
-        for e in ENCODINGS:
+        # Decode straight from a memory map of the file. (Without reading it
+        # into a bytes object first.)
+        with _MappedFile(location) as data:
+            return _auto_decode(data)
+
+    def load(self, location):
+        """
+        Find the line endings in the bytes, and decode the file without the
+        final line ending, so that the text is only copied when the line
+        endings have to be replaced.
+        """
+        location = os.path.expanduser(location)
+
+        with _MappedFile(location) as data:
+            encoding, bom = _sniff_byte_order_mark(data)
+            if encoding not in (None, 'utf-8-sig'):
+                # Lines don't end with b'\n' in UTF-16/32.
+                return super(FileIO, self).load(location)
+
+            first = data.find(b'\n')
+            dos = first > 0 and data[first - 1:first] == b'\r'
+
+            end = len(data)
+            eol = data[end - 1:end] == b'\n'
+            if eol:
+                end -= 2 if dos and data[end - 2:end] == b'\r\n' else 1
+
+            body = _slice(data, 0, end)
             try:
-                with codecs.open(location, 'r', e) as f:
-                    return f.read(), e
-            except UnicodeDecodeError:
-                pass  # Try next codec.
+                text, encoding = _auto_decode(body)
+            finally:
+                _release(body)
+
+        if dos:
+            text = text.replace('\r\n', '\n')
+
+        return text, encoding, 'dos' if dos else 'unix', eol
+
+    def read_preview(self, location, max_lines):
+        """
+        Decode only the first lines of the file. Only the pages that contain
+        these lines are read from disk.
+        """
+        location = os.path.expanduser(location)
 
-        # Unable to open.
-        raise Exception('Unable to open file: %r' % location)
+        with _MappedFile(location) as data:
+            encoding, bom = _sniff_byte_order_mark(data)
+            if encoding not in (None, 'utf-8-sig'):
+                return None  # Lines don't end with b'\n' in UTF-16/32.
+
+            # Look up the end of the requested lines.
+            end = 0
+            for _ in range(max_lines):
+                end = data.find(b'\n', end) + 1
+                if end == 0:
+                    end = len(data)
+                    break
+
+            return codecs.decode(data[:end], encoding or ENCODINGS[0], 'replace')
 
     def write(self, location, text, encoding):
         """
         Write file to disk.
         """
+        self.write_chunks(location, [text], encoding)
+
+    def write_chunks(self, location, chunks, encoding):
+        """
+        Encode and write the text chunk by chunk.
+        """
+        location = os.path.expanduser(location)
+
+        with _atomic_write(location, fsync=self.fsync()) as f:
+            for data in _encode_chunks(chunks, encoding):
+                f.write(data)
+
+    def follow(self, location, encoding, offset, inode=None):
+        if encoding in FileTail.encodings:
+            return FileTail(location, encoding, offset, inode)
+
+    def open_binary(self, location):
         location = os.path.expanduser(location)
 
-        with codecs.open(location, 'w', encoding) as f:
-            f.write(text)
+        with open(location, 'rb') as f:
+            if not is_binary(f.read(SNIFF_SIZE)):
+                return None
 
+        return BinaryFile(location)
 
-class GZipFileIO(EditorIO):
+
+class FileTail(object):
     """
-    I/O backend for gzip files.
+    Reader for the data that is appended to a file, like `tail -f`. Only the
+    new bytes are read and decoded, from the last offset onwards.
+
+    The text is returned in the form that `EditorBuffer` uses: line endings
+    are '\\n', and the final line ending of the file is held back until more
+    text follows.
 
-    It is possible to edit this file as if it were not compressed.
-    The read and write call will decompress and compress transparently.
+    When the file was truncated, or replaced by another file (log rotation),
+    it is read again from the start.
+
+    :param offset: Amount of bytes that were already read.
+    :param inode: Inode of the file that was read, if known.
     """
-    def can_open_location(cls, location):
-        return FileIO().can_open_location(location) and location.endswith('.gz')
+    #: Encodings in which line endings can be found byte by byte.
+    encodings = ('utf-8', 'utf-8-sig', 'latin-1')
+
+    def __init__(self, location, encoding, offset, inode=None):
+        assert encoding in self.encodings
+
+        self.location = os.path.expanduser(location)
+        self.encoding = encoding
+        self.offset = offset
+        self.inode = inode
+
+        self._decoder = codecs.getincrementaldecoder(encoding)('replace')
+        self._pending_cr = False
+
+        # Was the final line ending of what we have read held back?
+        self._pending_newline = False
+
+        if offset > 0:
+            with open(self.location, 'rb') as f:
+                f.seek(offset - 1)
+                self._pending_newline = f.read(1) == b'\n'
+
+    def reset(self):
+        """
+        Read the whole file again on the next `read`.
+        """
+        self.offset = 0
+        self.inode = None
+
+    def read(self):
+        """
+        Read the new data. Returns a (text, reset) tuple. When `reset` is
+        True, the file was truncated or replaced and `text` is its whole
+        content. Otherwise, `text` has to be appended to the current text.
+        Raises `IOError` when the file can't be read.
+        """
+        with open(self.location, 'rb') as f:
+            st = os.fstat(f.fileno())
+            reset = self.offset == 0 or st.st_size < self.offset or (
+                self.inode is not None and st.st_ino != self.inode)
+
+            if reset:
+                self.offset = 0
+                self._decoder.reset()
+                self._pending_cr = False
+                self._pending_newline = False
+
+            self.inode = st.st_ino
+            f.seek(self.offset)
+
+            result = []
+            while True:
+                data = f.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                self.offset += len(data)
+                result.append(self._decoder.decode(data))
+
+        text = ''.join(result)
+
+        # A '\\r' at the end could be the first half of a '\\r\\n'.
+        if self._pending_cr:
+            text = '\r' + text
+        self._pending_cr = text.endswith('\r')
+        if self._pending_cr:
+            text = text[:-1]
+
+        text = text.replace('\r\n', '\n')
+
+        if text:
+            if self._pending_newline:
+                text = '\n' + text
+            self._pending_newline = text.endswith('\n')
+            if self._pending_newline:
+                text = text[:-1]
+
+        return text, reset
+
+
+class CompressedFileIO(EditorIO):
+    """
+    Base class for I/O backends of compressed files.
+
+    It is possible to edit these files as if they were not compressed. The
+    read and write calls decompress and compress transparently. Both stream
+    the data: reading decodes the decompressed data piece by piece, and
+    writing compresses the encoded chunks as they come.
+
+    :param fsync: Like for `FileIO`.
+    :param compression_level: Integer, or callable that returns the
+        compression level. `None` means the default of the format.
+    :param executor: Optional callable that returns a
+        `concurrent.futures.Executor`, or `None`. When an executor is given,
+        big files are compressed in blocks on this executor. The blocks are
+        written as concatenated members (or streams), which every
+        decompressor reads as one file.
+    """
+    #: File name extension, like '.gz'.
+    extension = None
+
+    #: Allowed compression levels.
+    min_level = 1
+    max_level = 9
+
+    def __init__(self, fsync=False, compression_level=None, executor=None):
+        self.fsync = to_filter(fsync)
+        self._compression_level = compression_level
+        self._executor = executor
+
+    def _open_read(self, location):
+        " Return a file object that decompresses this file. "
+        raise NotImplementedError
+
+    def _open_write(self, fileobj, level, name):
+        " Return a file object that compresses into `fileobj`. "
+        raise NotImplementedError
+
+    @property
+    def compression_level(self):
+        level = self._compression_level
+        if callable(level):
+            level = level()
+        if level is not None:
+            level = max(self.min_level, min(self.max_level, level))
+        return level
+
+    @property
+    def executor(self):
+        return self._executor() if self._executor is not None else None
+
+    def can_open_location(self, location):
+        return FileIO().can_open_location(location) and location.endswith(self.extension)
 
     def exists(self, location):
         return FileIO().exists(location)
@@ -73,24 +359,111 @@ class GZipFileIO(EditorIO):
     def read(self, location):
         location = os.path.expanduser(location)
 
-        with gzip.open(location, 'rb') as f:
-            data = f.read()
-        return _auto_decode(data)
+        with self._open_read(location) as f:
+            return _auto_decode_stream(f)
 
     def write(self, location, text, encoding):
         """
         Write file to disk.
         """
+        self.write_chunks(location, [text], encoding)
+
+    def write_chunks(self, location, chunks, encoding):
         location = os.path.expanduser(location)
+        name = os.path.basename(location)
+        level = self.compression_level
+        executor = self.executor
+        cpu_count = _cpu_count()
+
+        with _atomic_write(location, fsync=self.fsync()) as f:
+            # (Compressing in parallel only helps with more than one CPU.)
+            if executor is None or cpu_count < 2:
+                with self._open_write(f, level, name) as compressed:
+                    for data in _encode_chunks(chunks, encoding):
+                        compressed.write(data)
+            else:
+                def compress(block):
+                    out = io.BytesIO()
+                    with self._open_write(out, level, name) as compressed:
+                        compressed.write(block)
+                    return out.getvalue()
+
+                # Keep only a few blocks in flight, so that memory usage
+                # doesn't depend on the size of the text.
+                pending = collections.deque()
+                max_pending = min(2 * cpu_count, MAX_PENDING_BLOCKS)
+
+                for block in _blocks(_encode_chunks(chunks, encoding), COMPRESS_BLOCK_SIZE):
+                    pending.append(executor.submit(compress, block))
+                    if len(pending) >= max_pending:
+                        f.write(pending.popleft().result())
+
+                while pending:
+                    f.write(pending.popleft().result())
+
+
+class GZipFileIO(CompressedFileIO):
+    """
+    I/O backend for gzip files.
+    """
+    extension = '.gz'
+    min_level = 0
+
+    def _open_read(self, location):
+        return gzip.GzipFile(location, 'rb')
+
+    def _open_write(self, fileobj, level, name):
+        return gzip.GzipFile(name, 'wb', 9 if level is None else level, fileobj=fileobj)
+
+
+class BZ2FileIO(CompressedFileIO):
+    """
+    I/O backend for bzip2 files.
+    """
+    extension = '.bz2'
+
+    def _open_read(self, location):
+        return bz2.BZ2File(location, 'rb')
+
+    def _open_write(self, fileobj, level, name):
+        return bz2.BZ2File(fileobj, 'wb', compresslevel=9 if level is None else level)
 
-        with gzip.open(location, 'wb') as f:
-            f.write(text.encode(encoding))
+
+class XZFileIO(CompressedFileIO):
+    """
+    I/O backend for xz files. (Requires the `lzma` module.)
+    """
+    extension = '.xz'
+    min_level = 0
+
+    def can_open_location(self, location):
+        return lzma is not None and super(XZFileIO, self).can_open_location(location)
+
+    def _open_read(self, location):
+        return lzma.LZMAFile(location, 'rb')
+
+    def _open_write(self, fileobj, level, name):
+        return lzma.LZMAFile(fileobj, 'wb', preset=level)
 
 
 class DirectoryIO(EditorIO):
     """
     Create a textual listing of the directory content.
+
+    The directory is read with `os.scandir`, which tells for most entries
+    whether they are directories without an extra `stat` call. Listings are
+    cached until the modification time of the directory changes.
+
+    :param show_details: Bool or `Filter`: show the size and modification
+        time of every entry. (These listings are not cached, because the
+        details can change without changing the directory.)
     """
+    def __init__(self, show_details=False):
+        self.show_details = to_filter(show_details)
+
+        # Maps the absolute path to a (mtime, text) tuple.
+        self._cache = {}
+
     def can_open_location(cls, location):
         # We can handle all local directories.
         return '://' not in location and os.path.isdir(location)
@@ -99,34 +472,43 @@ class DirectoryIO(EditorIO):
         return os.path.isdir(location)
 
     def read(self, directory):
-        # Read content.
-        content = sorted(os.listdir(directory))
-        directories = []
-        files = []
-
-        for f in content:
-            if os.path.isdir(os.path.join(directory, f)):
-                directories.append(f)
-            else:
-                files.append(f)
+        path = os.path.abspath(directory)
+        show_details = self.show_details()
+
+        if not show_details:
+            mtime = os.stat(path).st_mtime
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1], 'utf-8'
+
+        entries = _scan_directory(path, show_details)
+        text = ''.join(_format_directory_listing(path, entries, show_details))
 
-        # Construct output.
-        result = []
-        result.append('" ==================================\n')
-        result.append('" Directory Listing\n')
-        result.append('"    %s\n' % os.path.abspath(directory))
-        result.append('"    Quick help: -: go up dir\n')
-        result.append('" ==================================\n')
-        result.append('../\n')
-        result.append('./\n')
+        if not show_details:
+            self._cache[path] = (mtime, text)
 
-        for d in directories:
-            result.append('%s/\n' % d)
+        return text, 'utf-8'
 
-        for f in files:
-            result.append('%s\n' % f)
+    def read_preview(self, directory, max_lines):
+        """
+        Big directories are read in the background. Show the header in the
+        meantime.
+        """
+        path = os.path.abspath(directory)
 
-        return ''.join(result), 'utf-8'
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == os.stat(path).st_mtime:
+            return None  # Cached, reading is cheap.
+
+        with _iter_directory(path) as entries:
+            for i, _ in enumerate(entries):
+                if i >= LARGE_DIRECTORY_SIZE:
+                    return ''.join(_format_directory_listing(path, [], False))
+
+        return None
+
+    def size(self, location):
+        return None  # Not known, see `read_preview`.
 
     def write(self, location, text, encoding):
         raise NotImplementedError('Cannot write to directory.')
@@ -135,10 +517,161 @@ class DirectoryIO(EditorIO):
         return True
 
 
+def directory_entry_name(line):
+    """
+    Return the name in this line of a directory listing. (Without the
+    details columns.)
+    """
+    m = _DETAILS_RE.match(line)
+    if m:
+        return line[m.end():]
+    return line
+
+
+_DETAILS_RE = re.compile(r'^ *\S+  \d{4}-\d\d-\d\d \d\d:\d\d  ')
+
+
+@contextlib.contextmanager
+def _iter_directory(path):
+    """
+    Context manager that gives an iterator over the `os.DirEntry` objects of
+    this directory. (Or compatible objects, when `os.scandir` is not
+    available.) The directory is closed on exit, also when the iteration
+    stopped early.
+    """
+    if scandir is not None:
+        entries = scandir(path)
+        try:
+            yield entries
+        finally:
+            # (No `close` before Python 3.6. It's closed when exhausted.)
+            if hasattr(entries, 'close'):
+                entries.close()
+    else:
+        yield (_DirEntry(path, name) for name in os.listdir(path))
+
+
+class _DirEntry(object):
+    " Minimal `os.DirEntry` for Python 2. "
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def _scan_directory(path, show_details):
+    """
+    Return a sorted list of (name, is_dir, size, mtime) tuples, with the
+    directories first. (Size and mtime are `None` without details.)
+    """
+    directories = []
+    files = []
+
+    with _iter_directory(path) as entries:
+        for entry in entries:
+            try:
+                # Follows symlinks, like `os.path.isdir`. This only needs a stat
+                # call for symlinks and file systems without `d_type`.
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            size = mtime = None
+            if show_details:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    pass  # Broken symlink.
+                else:
+                    size, mtime = st.st_size, st.st_mtime
+
+            (directories if is_dir else files).append((entry.name, is_dir, size, mtime))
+
+    # (Sorting on the name only is a lot faster than comparing tuples.)
+    directories.sort(key=operator.itemgetter(0))
+    files.sort(key=operator.itemgetter(0))
+    return directories + files
+
+
+def _format_size(size):
+    for unit in 'BKMG':
+        if size < 1024:
+            break
+        size /= 1024.
+    else:
+        unit = 'T'
+
+    if unit == 'B':
+        return '%i' % size
+    return '%.1f%s' % (size, unit)
+
+
+def _format_directory_listing(path, entries, show_details):
+    """
+    Yield the text of the listing in chunks. (Formatting is done for many
+    entries at once, which is a lot faster for huge directories than one
+    string per entry.)
+    """
+    yield ''.join([
+        '" ==================================\n',
+        '" Directory Listing\n',
+        '"    %s\n' % path,
+        '"    Quick help: -: go up dir\n',
+        '" ==================================\n',
+        '../\n',
+        './\n',
+    ])
+
+    for i in range(0, len(entries), LISTING_CHUNK_SIZE):
+        chunk = entries[i:i + LISTING_CHUNK_SIZE]
+
+        if show_details:
+            lines = []
+            for name, is_dir, size, mtime in chunk:
+                lines.append('%7s  %s  %s%s\n' % (
+                    '-' if is_dir or size is None else _format_size(size),
+                    time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime or 0)),
+                    name, '/' if is_dir else ''))
+            yield ''.join(lines)
+        else:
+            yield ''.join([name + ('/\n' if is_dir else '\n')
+                           for name, is_dir, _, _ in chunk])
+
+
 class HttpIO(EditorIO):
     """
     I/O backend that reads from HTTP.
+
+    Connections are kept alive and reused for the next request to the same
+    host. Responses are decoded while they are downloaded.
+
+    :param cache_directory: Directory for the response cache, or `None`.
+        Cached responses with an ETag or Last-Modified header are revalidated
+        with a conditional request. (When the server replies with 304 Not
+        Modified, the body is read from the cache.)
+    :param timeout: Timeout in seconds for connecting and for every read from
+        the socket, or a callable that returns it.
     """
+    max_redirects = 5
+
+    def __init__(self, cache_directory=None, timeout=30):
+        self.cache_directory = cache_directory
+        self._timeout = timeout
+
+        # Idle connections, per (scheme, host, port). (Reading happens in
+        # several threads at once.)
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        return self._timeout() if callable(self._timeout) else self._timeout
+
     def can_open_location(cls, location):
         # We can handle all local directories.
         return location.startswith('http://') or location.startswith('https://')
@@ -147,26 +680,528 @@ class HttpIO(EditorIO):
         return NotImplemented  # We don't know.
 
     def read(self, location):
-        # Do Http request.
-        bytes = urllib.request.urlopen(location).read()
+        cache = _HttpCache(self.cache_directory, location)
+
+        for _ in range(self.max_redirects + 1):
+            key, connection, response = self._request(location, cache.validators())
+
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                self._release(key, connection, response)
+                location = urllib.parse.urljoin(location, response.getheader('Location'))
+                cache = _HttpCache(self.cache_directory, location)
+                continue
+
+            try:
+                if response.status == 304 and cache.exists():
+                    response.read()
+                    return cache.read()
+                elif response.status == 200:
+                    return cache.store(response)
+                else:
+                    raise IOError('HTTP error %i: %s' % (response.status, response.reason))
+            finally:
+                self._release(key, connection, response)
 
-        # Return decoded.
-        return _auto_decode(bytes)
+        raise IOError('Too many redirects.')
 
     def write(self, location, text, encoding):
         raise NotImplementedError('Cannot write to HTTP.')
 
+    def _request(self, location, headers):
+        """
+        Send a GET request. Returns a (key, connection, response) tuple.
+        """
+        url = urllib.parse.urlsplit(location)
+        key = (url.scheme, url.hostname, url.port)
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+
+        headers = dict(headers, **{'Accept-Encoding': 'identity'})
+
+        # A reused connection could have been closed by the server in the
+        # meantime. Try again with a new connection in that case.
+        while True:
+            connection, reused = self._acquire(key)
+            try:
+                connection.request('GET', path, headers=headers)
+                return key, connection, connection.getresponse()
+            except (http_client.HTTPException, socket.error):
+                connection.close()
+                if not reused:
+                    raise
+
+    def _acquire(self, key):
+        " Return a (connection, reused) tuple. "
+        with self._lock:
+            idle = self._connections.get(key)
+            if idle:
+                connection = idle.pop()
+                connection.timeout = self.timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(self.timeout)
+                return connection, True
+
+        scheme, host, port = key
+        if scheme == 'https':
+            return http_client.HTTPSConnection(host, port, timeout=self.timeout), False
+        else:
+            return http_client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def _release(self, key, connection, response):
+        " Keep the connection for the next request, if possible. "
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                self._connections.setdefault(key, []).append(connection)
+
+
+class _HttpCache(object):
+    """
+    Cached response for one URL: a file with the body, and a JSON file with
+    the validators. (Without cache directory, nothing is cached.)
+    """
+    def __init__(self, directory, location):
+        self.directory = directory
+
+        if directory:
+            name = hashlib.sha1(location.encode('utf-8')).hexdigest()
+            self.body_path = os.path.join(directory, name + '.body')
+            self.meta_path = os.path.join(directory, name + '.json')
+
+    def exists(self):
+        return bool(self.directory) and os.path.exists(self.body_path)
+
+    def validators(self):
+        " Headers for a conditional request. "
+        headers = {}
+
+        if self.exists():
+            try:
+                with open(self.meta_path) as f:
+                    meta = json.load(f)
+            except (IOError, OSError, ValueError):
+                return {}
+
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        return headers
+
+    def read(self):
+        with open(self.body_path, 'rb') as f:
+            return _auto_decode_file(f)
+
+    def store(self, response):
+        """
+        Read and decode the body of this response. It is decoded while it is
+        downloaded, and stored in the cache at the same time. Returns a
+        (text, encoding) tuple.
+        """
+        etag = response.getheader('ETag')
+        last_modified = response.getheader('Last-Modified')
+
+        if self.directory and (etag or last_modified):
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+
+            with _atomic_write(self.body_path) as f:
+                result = _decode_response(response, f)
+
+            with open(self.meta_path, 'w') as f:
+                json.dump({'etag': etag, 'last_modified': last_modified}, f)
+
+            # Not UTF-8, decode again from the file.
+            return result or self.read()
+        else:
+            with tempfile.TemporaryFile() as f:
+                result = _decode_response(response, f)
+                if result is None:
+                    f.seek(0)
+                    return _auto_decode(f.read())
+                return result
+
+
+def _decode_response(response, f):
+    """
+    Copy the body of the response to `f`, and decode it as UTF-8 at the same
+    time. Returns a (text, encoding) tuple, or `None` when the data is not
+    UTF-8 (or starts with another byte order mark), in which case it has to
+    be decoded from `f`.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    encoding = 'utf-8'
+    result = []
+    first = True
+
+    while True:
+        data = response.read(READ_CHUNK_SIZE)
+        if not data:
+            break
+
+        f.write(data)
+
+        if first:
+            first = False
+            bom_encoding = _sniff_byte_order_mark(data)[0]
+            if bom_encoding == 'utf-8-sig':
+                encoding = bom_encoding
+            elif bom_encoding is not None:
+                result = None  # UTF-16 or UTF-32.
+
+        if result is not None:
+            try:
+                result.append(decoder.decode(data))
+            except UnicodeDecodeError:
+                result = None
+
+    if result is not None:
+        # (Incomplete multibyte sequence at the end.)
+        try:
+            result.append(decoder.decode(b'', True))
+        except UnicodeDecodeError:
+            result = None
+
+    if result is None:
+        return None
+
+    return ''.join(result), encoding
+
+
+def _encode_chunks(chunks, encoding):
+    """
+    Encode an iterable of text chunks. Yield bytes, starting with the byte
+    order mark, if the encoding requires one. Big chunks are split, so that
+    we never hold more than `WRITE_CHUNK_SIZE` encoded characters at once.
+    """
+    bom = _byte_order_mark(encoding)
+    if bom:
+        yield bom
+
+    encoder = codecs.getincrementalencoder(encoding)()
+
+    for chunk in chunks:
+        for i in range(0, len(chunk), WRITE_CHUNK_SIZE):
+            yield encoder.encode(chunk[i:i + WRITE_CHUNK_SIZE])
+
+    yield encoder.encode('', True)
+
+
+def _blocks(pieces, size):
+    """
+    Join an iterable of bytes into blocks of at least `size` bytes. (The
+    last block can be smaller.)
+    """
+    block = []
+    block_size = 0
+
+    for piece in pieces:
+        block.append(piece)
+        block_size += len(piece)
+
+        if block_size >= size:
+            yield b''.join(block)
+            block = []
+            block_size = 0
+
+    if block:
+        yield b''.join(block)
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def _create_temp_file(directory, name):
+    """
+    Create a new temporary file for `name` in `directory`. Returns a (fd,
+    path) tuple. (Unlike `tempfile.mkstemp`, the file gets the permissions
+    of a new file: the kernel applies the umask.)
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+
+    while True:
+        path = os.path.join(directory, '.%s.%s.tmp' % (name, uuid.uuid4().hex[:12]))
+        try:
+            return os.open(path, flags, 0o666), path
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+
+@contextlib.contextmanager
+def _atomic_write(location, fsync=False):
+    """
+    Context manager that yields a binary file object for writing `location`.
+
+    The data goes into a temporary file in the same directory, that replaces
+    the original file when everything has been written. (A crash while
+    writing leaves the original file intact.) Permissions and ownership of
+    the original file are preserved.
+
+    Renaming would break hard links. For a file with several links, the
+    temporary file is copied into the original file instead. Everything is
+    written before the original file is touched, but a crash during the copy
+    leaves it truncated.
+    """
+    # Replace the target of symlinks, not the symlink itself.
+    location = os.path.realpath(location)
+
+    try:
+        stat = os.stat(location)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        stat = None
+
+    directory, name = os.path.split(location)
+    fd, temp_location = _create_temp_file(directory, name)
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            _flush(f, fsync)
+
+        if stat is not None and stat.st_nlink > 1:
+            with open(temp_location, 'rb') as source:
+                with open(location, 'wb') as f:
+                    shutil.copyfileobj(source, f, WRITE_CHUNK_SIZE)
+                    _flush(f, fsync)
+            os.remove(temp_location)
+            return
+
+        if stat is not None:
+            os.chmod(temp_location, stat.st_mode & 0o7777)
+            try:
+                os.chown(temp_location, stat.st_uid, stat.st_gid)
+            except (AttributeError, OSError):
+                pass  # Not supported, or not allowed.
+
+        _replace(temp_location, location)
+    except BaseException:
+        try:
+            os.remove(temp_location)
+        except OSError:
+            pass
+        raise
+
+    if fsync:
+        # Also flush the rename itself.
+        _fsync_directory(directory)
+
+
+def _flush(f, fsync):
+    f.flush()
+    if fsync:
+        os.fsync(f.fileno())
+
+
+def _replace(source, destination):
+    try:
+        os.replace(source, destination)
+    except AttributeError:
+        # Python 2: `os.rename` replaces the destination on Posix.
+        os.rename(source, destination)
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except (AttributeError, OSError):
+        return  # Not possible on Windows.
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class _MappedFile(object):
+    """
+    Context manager that memory maps a file for reading.
+    (Empty files can't be mapped, these are represented by an empty bytes
+    object.)
+    """
+    def __init__(self, location):
+        self.location = location
+
+    def __enter__(self):
+        self._file = open(self.location, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Cannot mmap an empty file.
+            self._mmap = None
+            return b''
+        else:
+            return self._mmap
+
+    def __exit__(self, *a):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+def _slice(data, start, end):
+    """
+    Return `data[start:end]`. For a memory map, this is a `memoryview` on
+    Python 3, so that the data is not copied. (It has to be passed to
+    `_release` before the map is closed.) Python 2 can't make a memoryview
+    of a memory map, there it's a copy.
+    """
+    if start == 0 and end == len(data):
+        return data
+    try:
+        return memoryview(data)[start:end]
+    except TypeError:
+        return data[start:end]
+
+
+def _release(data):
+    " Release the memoryview that `_slice` returned. (Python 3.2+.) "
+    if isinstance(data, memoryview) and hasattr(data, 'release'):
+        data.release()
+
+
+def _byte_order_mark(encoding):
+    """
+    Return the byte order mark that has to be written in front of the data
+    for this encoding. ('utf-8-sig' writes its own mark.)
+    """
+    for e, bom in BYTE_ORDER_MARKS:
+        if e == encoding and e != 'utf-8-sig':
+            return bom
+    return b''
+
+
+def _sniff_byte_order_mark(data):
+    """
+    Return an (encoding, byte_order_mark) tuple for data that starts with a
+    byte order mark, or (None, b'') otherwise.
+    """
+    for encoding, bom in BYTE_ORDER_MARKS:
+        if data[:len(bom)] == bom:
+            return encoding, bom
+    return None, b''
+
 
 def _auto_decode(data):
     """
     Decode bytes. Return a (text, encoding) tuple.
+    (`data` can be any object that supports the buffer protocol, like a memory
+    mapped file.)
+
+    The data is never copied. A byte order mark selects the encoding right
+    away. Otherwise, or when the data doesn't decode with that encoding
+    (like a latin-1 file that starts with the UTF-16 byte order mark), the
+    `ENCODINGS` are tried one after the other: the decoders stop at the
+    first invalid byte, so a failing attempt doesn't cost a full decode.
     """
-    assert isinstance(data, six.binary_type)
+    encoding, bom = _sniff_byte_order_mark(data)
+
+    if encoding is not None:
+        # ('utf-8-sig' removes the byte order mark by itself.)
+        body = data if encoding == 'utf-8-sig' else _slice(data, len(bom), len(data))
+        try:
+            return codecs.decode(body, encoding), encoding
+        except UnicodeDecodeError:
+            pass
+        finally:
+            _release(body)
 
     for e in ENCODINGS:
         try:
-            return data.decode(e), e
+            return codecs.decode(data, e), e
         except UnicodeDecodeError:
             pass
 
-    return data.decode('utf-8', 'ignore')
+    return codecs.decode(data, 'utf-8', 'ignore'), 'utf-8'
+
+
+def _auto_decode_stream(f):
+    """
+    Like `_auto_decode`, but for data that is read from a file object, piece
+    by piece, like the output of a decompressor. The data is read only once.
+
+    It's decoded as UTF-8 while it is read. When it turns out not to be
+    UTF-8, the data is copied into a spooled temporary file (kept in memory
+    up to `SPOOL_SIZE`), and decoded again from there. (Valid UTF-8 encodes
+    to the same bytes again, so the text that was decoded so far gives back
+    the data that was read so far.)
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    result = []
+
+    data = f.read(READ_CHUNK_SIZE)
+    encoding, bom = _sniff_byte_order_mark(data)
+
+    if encoding is None:
+        try:
+            while data:
+                result.append(decoder.decode(data))
+                data = f.read(READ_CHUNK_SIZE)
+
+            result.append(decoder.decode(b'', True))
+            return ''.join(result), 'utf-8'
+        except UnicodeDecodeError:
+            # (The decoder keeps the bytes of an incomplete sequence.)
+            data = ''.join(result).encode('utf-8') + decoder.getstate()[0] + data
+            del result[:]
+
+    with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as copy:
+        copy.write(data)
+        del data
+        shutil.copyfileobj(f, copy, READ_CHUNK_SIZE)
+
+        copy.seek(0)
+        return _auto_decode_file(copy, ENCODINGS[1:] if encoding is None else ENCODINGS)
+
+
+def _auto_decode_file(f, encodings=ENCODINGS):
+    """
+    Like `_auto_decode`, but for a seekable file object that is decoded
+    piece by piece. When decoding fails, the file is read again with the next
+    of the `encodings`.
+    """
+    encoding, bom = _sniff_byte_order_mark(f.read(4))
+
+    if encoding is not None:
+        # ('utf-8-sig' removes the byte order mark by itself.)
+        skip = 0 if encoding == 'utf-8-sig' else len(bom)
+        try:
+            return _decode_stream(f, encoding, skip), encoding
+        except UnicodeDecodeError:
+            pass
+
+    for e in encodings:
+        try:
+            return _decode_stream(f, e), e
+        except UnicodeDecodeError:
+            pass
+
+    return _decode_stream(f, 'utf-8', errors='ignore'), 'utf-8'
+
+
+def _decode_stream(f, encoding, skip=0, errors='strict'):
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    result = []
+
+    f.seek(skip)
+
+    while True:
+        data = f.read(READ_CHUNK_SIZE)
+        if not data:
+            break
+        result.append(decoder.decode(data))
+
+    result.append(decoder.decode(b'', True))
+    return ''.join(result)
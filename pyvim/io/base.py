@@ -38,6 +38,30 @@ class EditorIO(six.with_metaclass(ABCMeta, object)):
         Can raise IOError.
         """
 
+    def load(self, location):
+        """
+        Read file for editing. Returns a (text, encoding, fileformat, eol)
+        tuple. `fileformat` is 'dos' when the lines end with '\\r\\n' (these
+        are turned into '\\n' in `text`), 'unix' otherwise. `eol` tells
+        whether the file ends with a line ending. (It is removed from `text`.)
+
+        Backends that can find the line endings without copying the text
+        should override this. (The default calls `read`.)
+        Can raise IOError.
+        """
+        text, encoding = self.read(location)
+
+        first = text.find('\n')
+        fileformat = 'dos' if first > 0 and text[first - 1] == '\r' else 'unix'
+        if fileformat == 'dos':
+            text = text.replace('\r\n', '\n')
+
+        eol = text.endswith('\n')
+        if eol:
+            text = text[:-1]
+
+        return text, encoding, fileformat, eol
+
     @abstractmethod
     def write(self, location, data, encoding='utf-8'):
         """
@@ -45,8 +69,49 @@ class EditorIO(six.with_metaclass(ABCMeta, object)):
         Can raise IOError.
         """
 
+    def write_chunks(self, location, chunks, encoding='utf-8'):
+        """
+        Write the text, given as an iterable of strings, to storage.
+        Backends that can encode and write the text piece by piece should
+        override this. (The default joins the chunks and calls `write`.)
+        Can raise IOError.
+        """
+        self.write(location, ''.join(chunks), encoding)
+
     def isdir(self, location):
         """
         Return whether this location is a directory.
         """
         return False
+
+    def size(self, location):
+        """
+        Return the size of this location in bytes, or `None` when it's not
+        known upfront.
+        """
+        return None
+
+    def read_preview(self, location, max_lines):
+        """
+        Read only the first `max_lines` lines of this location, so that
+        something can be displayed while the whole file is being read.
+        Returns the text, or `None` when this is not supported.
+        """
+        return None
+
+    def follow(self, location, encoding, offset, inode=None):
+        """
+        Return an object with a `read` method that returns the text that was
+        appended to this location since `offset` (in bytes), for following
+        a growing file. (See `FileTail`.) Returns `None` when this is not
+        supported.
+        """
+        return None
+
+    def open_binary(self, location):
+        """
+        Return a `BinaryFile` when this location contains binary data, so
+        that it can be shown in the hex view instead of being decoded.
+        Otherwise (or when this is not supported), return `None`.
+        """
+        return None
@@ -0,0 +1,161 @@
+"""
+Access to the bytes of binary files, for the hex view.
+
+Binary files are not decoded. The file is memory mapped, so that only the
+pages that are displayed are read from disk, and changes are kept as
+patches of single bytes, that are written back in place.
+"""
+from __future__ import unicode_literals
+
+import codecs
+import mmap
+import os
+
+__all__ = (
+    'BinaryFile',
+    'is_binary',
+)
+
+# Amount of bytes that are looked at to decide whether a file is binary.
+SNIFF_SIZE = 8192
+
+# Text in these encodings contains null bytes.
+_WIDE_BYTE_ORDER_MARKS = (
+    codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE,
+    codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE,
+)
+
+
+def is_binary(data):
+    """
+    True when these bytes (the start of a file) don't look like text.
+    """
+    return b'\0' in data and not data.startswith(_WIDE_BYTE_ORDER_MARKS)
+
+
+class BinaryFile(object):
+    """
+    The bytes of a file, with changes that are not yet written.
+
+    :param location: Path of a local file.
+    """
+    def __init__(self, location):
+        self.location = os.path.expanduser(location)
+
+        #: Mapping from offset to the new value of the byte.
+        self.patches = {}
+
+        # (offset, previous patch) tuples, for undo.
+        self._history = []
+
+        self._file = None
+        self._data = b''
+        self._open()
+
+    def _open(self):
+        self._file = open(self.location, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._data = b''  # Cannot mmap an empty file.
+
+    @property
+    def size(self):
+        return len(self._data)
+
+    def close(self):
+        if self._data:
+            self._data.close()
+            self._data = b''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def reload(self):
+        """
+        Map the file again (it could have a different size now), and drop
+        all the changes.
+        """
+        self.close()
+        self.patches = {}
+        self._history = []
+        self._open()
+
+    def read(self, offset, count):
+        """
+        Return `count` bytes (or less at the end of the file) from `offset`,
+        with the changes applied, as a `bytearray`.
+        """
+        result = bytearray(self._data[offset:offset + count])
+
+        if self.patches:
+            for i in range(len(result)):
+                value = self.patches.get(offset + i)
+                if value is not None:
+                    result[i] = value
+
+        return result
+
+    def is_patched(self, offset):
+        return offset in self.patches
+
+    def patch(self, offset, value):
+        """
+        Change the byte at this offset.
+        """
+        assert 0 <= offset < self.size and 0 <= value < 256
+
+        self._history.append((offset, self.patches.get(offset)))
+
+        if self._data[offset] == value:
+            self.patches.pop(offset, None)
+        else:
+            self.patches[offset] = value
+
+    def undo(self):
+        """
+        Undo the last `patch`. Returns its offset, or `None` when there is
+        nothing to undo.
+        """
+        if self._history:
+            offset, value = self._history.pop()
+            if value is None:
+                self.patches.pop(offset, None)
+            else:
+                self.patches[offset] = value
+            return offset
+
+    def write(self, fsync=False):
+        """
+        Write the changed bytes in place. Only the ranges of consecutive
+        changed bytes are written, not the whole file.
+        """
+        if not self.patches:
+            return
+
+        with open(self.location, 'r+b') as f:
+            for start, data in _runs(self.patches):
+                f.seek(start)
+                f.write(data)
+
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+        # (The memory map shows the new content.)
+        self.patches = {}
+        self._history = []
+
+
+def _runs(patches):
+    """
+    Group the patches into (offset, bytes) tuples of consecutive bytes.
+    """
+    offsets = sorted(patches)
+    start = 0
+
+    for i in range(1, len(offsets) + 1):
+        if i == len(offsets) or offsets[i] != offsets[i - 1] + 1:
+            run = offsets[start:i]
+            yield run[0], bytes(bytearray(patches[o] for o in run))
+            start = i
@@ -0,0 +1,391 @@
+"""
+Swap files: a journal of the edits to an `EditorBuffer`, for crash recovery.
+
+The journal is an append-only binary file. It starts with a header that
+describes the text the edits apply to (the base text), and contains one
+record for every `TextEdit`::
+
+    header:    MAGIC, base length, base crc32, location length, location
+    edit:      b'E', position, deleted length, inserted size, inserted, crc32
+    snapshot:  b'S', size, text, crc32
+
+Lengths and positions count characters, sizes count bytes. Strings are
+UTF-8. The crc32 of a record covers everything in front of it, so that a
+record that was only partially written when the process died is detected.
+A snapshot record replaces the base text. It is only written when the
+journal starts while there are unsaved changes already. (The writer finds
+that out, by comparing the digest of the base text with the digest of the
+saved text.)
+
+All the file operations happen in the thread of the `JournalWriter`. The
+event loop only puts the edits in a queue, so the journal doesn't add any
+latency to key strokes. The data is flushed to the operating system after
+every batch of edits (this survives a crash of pyvim), and synced to the disk
+at most once per `fsync_interval` (this survives a crash of the system).
+"""
+from __future__ import unicode_literals
+
+from six.moves import queue
+
+from .rope import Rope
+
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+
+__all__ = (
+    'Journal',
+    'JournalWriter',
+    'JournalError',
+    'find_swap_files',
+    'location_file_prefix',
+    'read_journal',
+    'text_digest',
+)
+
+MAGIC = b'PYVIMSWP1\n'
+
+_HEADER = struct.Struct('<QII')
+_EDIT = struct.Struct('<QQI')
+_SNAPSHOT = struct.Struct('<Q')
+_CRC = struct.Struct('<I')
+
+# Text is encoded in pieces of this many characters when computing digests
+# and writing snapshots.
+_CHUNK_SIZE = 64 * 1024
+
+
+class JournalError(Exception):
+    " Invalid swap file, or swap file that doesn't match the text. "
+
+
+def _encode(text):
+    # Surrogates don't appear in decoded files, but they can be typed.
+    return text.encode('utf-8', 'surrogatepass')
+
+
+def _decode(data):
+    return data.decode('utf-8', 'surrogatepass')
+
+
+def text_digest(text):
+    """
+    Return the (length, crc32) tuple that identifies the base text.
+    """
+    crc = 0
+    for i in range(0, len(text), _CHUNK_SIZE):
+        crc = zlib.crc32(_encode(text[i:i + _CHUNK_SIZE]), crc)
+    return len(text), crc & 0xffffffff
+
+
+def location_file_prefix(location):
+    """
+    Unique file name prefix for files that belong to this location. (It
+    contains the base name, for the humans.)
+    """
+    location = os.path.abspath(os.path.expanduser(location))
+    digest = hashlib.sha1(_encode(location)).hexdigest()[:12]
+    return '%s.%s.' % (os.path.basename(location), digest)
+
+
+def find_swap_files(directory, location):
+    """
+    Return the paths of the swap files for this location in `directory`,
+    newest first. (The ones of this process are not included.)
+    """
+    prefix = location_file_prefix(location)
+    own = '%s%i.swp' % (prefix, os.getpid())
+
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+
+    paths = [os.path.join(directory, name) for name in names
+             if name.startswith(prefix) and name.endswith('.swp') and name != own]
+
+    return sorted(paths, key=lambda p: os.path.getmtime(p), reverse=True)
+
+
+class RecoveredJournal(object):
+    """
+    Content of a swap file, as returned by `read_journal`.
+    """
+    def __init__(self, location, base_digest, snapshot, edits):
+        self.location = location
+        self.base_digest = base_digest
+        self.snapshot = snapshot
+        self.edits = edits  # List of (position, deleted length, inserted).
+
+    def replay(self, text):
+        """
+        Apply the edits to `text` (the content of the file) and return the
+        recovered text. Raises `JournalError` when the edits don't apply to
+        this text.
+        """
+        if self.snapshot is not None:
+            text = self.snapshot
+        elif text_digest(text) != self.base_digest:
+            raise JournalError('The file was changed after the swap file was created.')
+
+        # Use a rope, so that a long journal doesn't copy the whole text for
+        # every edit.
+        rope = Rope(text)
+
+        for position, deleted, inserted in self.edits:
+            if position + deleted > len(rope):
+                raise JournalError('Edit out of range.')
+            rope = rope.replace(position, position + deleted, inserted)
+
+        return rope.text
+
+
+def read_journal(path):
+    """
+    Read a swap file. Returns a `RecoveredJournal`. Reading stops at the
+    first incomplete or damaged record.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if not data.startswith(MAGIC) or len(data) < len(MAGIC) + _HEADER.size:
+        raise JournalError('Not a swap file: %r' % path)
+
+    pos = len(MAGIC)
+    base_length, base_crc, location_size = _HEADER.unpack_from(data, pos)
+    pos += _HEADER.size
+    location = _decode(data[pos:pos + location_size])
+    pos += location_size
+
+    snapshot = None
+    edits = []
+
+    def checked(start, end):
+        " True when the record between start and end has a valid crc. "
+        if end + _CRC.size > len(data):
+            return False
+        crc, = _CRC.unpack_from(data, end)
+        return zlib.crc32(data[start:end]) & 0xffffffff == crc
+
+    while pos < len(data):
+        start = pos
+        kind = data[pos:pos + 1]
+        pos += 1
+
+        if kind == b'E' and pos + _EDIT.size <= len(data):
+            position, deleted, size = _EDIT.unpack_from(data, pos)
+            pos += _EDIT.size + size
+            if not checked(start, pos):
+                break
+            edits.append((position, deleted, _decode(data[pos - size:pos])))
+
+        elif kind == b'S' and pos + _SNAPSHOT.size <= len(data):
+            size, = _SNAPSHOT.unpack_from(data, pos)
+            pos += _SNAPSHOT.size + size
+            if not checked(start, pos):
+                break
+            snapshot = _decode(data[pos - size:pos])
+            edits = []
+
+        else:
+            break
+
+        pos += _CRC.size
+
+    return RecoveredJournal(location, (base_length, base_crc), snapshot, edits)
+
+
+class Journal(object):
+    """
+    The swap file of one buffer.
+
+    All methods return immediately: they hand the work to the
+    `JournalWriter` thread.
+    """
+    def __init__(self, writer, location):
+        self.writer = writer
+        self.location = location
+        self.path = os.path.join(
+            writer.directory, '%s%i.swp' % (location_file_prefix(location), os.getpid()))
+
+        # Only accessed by the writer thread.
+        self._file = None
+
+    def start(self, base_text, snapshot=False):
+        """
+        Start (or restart) the journal for this base text. When `snapshot`
+        is given, the base text itself is stored, because it's not what's in
+        the file.
+        """
+        self.writer.submit(self, 'start', base_text, snapshot)
+
+    def append(self, edit):
+        " Add a `TextEdit` to the journal. "
+        self.writer.submit(self, 'edit', edit)
+
+    def remove(self):
+        " Delete the swap file. "
+        self.writer.submit(self, 'remove')
+
+
+class JournalWriter(object):
+    """
+    Background thread that writes all the journals.
+
+    :param directory: Directory for the swap files. (Created when needed.)
+    :param fsync_interval: Maximum time in seconds before written data is
+        synced to the disk.
+    :param batch_delay: Time in seconds to collect edits before writing
+        them.
+    """
+    def __init__(self, directory, fsync_interval=1.0, batch_delay=0.02):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.batch_delay = batch_delay
+
+        self._queue = queue.Queue()
+        self._journals = set()  # Journals with an open file.
+        self._unsynced = set()  # Journals with data that was not yet synced.
+        self._last_sync = time.time()
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, journal, command, *args):
+        self._queue.put((journal, command, args))
+
+    def flush(self):
+        """
+        Block until all the submitted work has been written and synced.
+        """
+        self.submit(None, 'sync')
+        self._queue.join()
+
+    def close(self):
+        """
+        Remove all the swap files and stop the thread. (Called when the
+        editor quits normally.)
+        """
+        self.submit(None, 'stop')
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            # Wait for work. When there is unsynced data, wait at most until
+            # it has to be synced.
+            timeout = None
+            if self._unsynced:
+                timeout = max(0, self._last_sync + self.fsync_interval - time.time())
+
+            try:
+                items = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+            else:
+                # Let more edits come in while typing, instead of waking up
+                # (and taking the GIL) for every key stroke.
+                time.sleep(self.batch_delay)
+
+            # Take everything that's in the queue, and write it as one batch.
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            sync = False
+
+            for journal, command, args in items:
+                try:
+                    if command == 'stop':
+                        stop = True
+                    elif command == 'sync':
+                        sync = True
+                    else:
+                        getattr(self, '_' + command)(journal, *args)
+                except (IOError, OSError):
+                    # Never crash the writer. Drop this journal.
+                    self._close_file(journal)
+
+            for journal in list(self._unsynced):
+                try:
+                    journal._file.flush()
+                except (IOError, OSError):
+                    # E.g. no space left. Drop this journal.
+                    self._close_file(journal)
+
+            if sync or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+            for _ in items:
+                self._queue.task_done()
+
+            if stop:
+                for journal in list(self._journals):
+                    self._remove(journal)
+                return
+
+    def _sync(self):
+        for journal in self._unsynced:
+            try:
+                os.fsync(journal._file.fileno())
+            except (IOError, OSError):
+                pass
+        self._unsynced.clear()
+        self._last_sync = time.time()
+
+    def _close_file(self, journal):
+        if journal._file is not None:
+            try:
+                journal._file.close()
+            except (IOError, OSError):
+                pass  # (Closed anyway, when the buffered data can't be written.)
+            journal._file = None
+        self._journals.discard(journal)
+        self._unsynced.discard(journal)
+
+    def _start(self, journal, base_text, snapshot):
+        self._close_file(journal)
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        location = _encode(journal.location)
+        length, crc = text_digest(base_text)
+
+        f = open(journal.path, 'wb')
+        f.write(MAGIC)
+        f.write(_HEADER.pack(length, crc, len(location)))
+        f.write(location)
+
+        journal._file = f
+        self._journals.add(journal)
+        self._unsynced.add(journal)
+
+        if snapshot:
+            data = b''.join(_encode(base_text[i:i + _CHUNK_SIZE])
+                            for i in range(0, len(base_text), _CHUNK_SIZE))
+            self._write_record(journal, b'S' + _SNAPSHOT.pack(len(data)) + data)
+
+    def _edit(self, journal, edit):
+        if journal._file is not None:
+            inserted = _encode(edit.inserted)
+            self._write_record(journal, b''.join([
+                b'E', _EDIT.pack(edit.position, len(edit.deleted), len(inserted)), inserted]))
+
+    def _write_record(self, journal, record):
+        journal._file.write(record)
+        journal._file.write(_CRC.pack(zlib.crc32(record) & 0xffffffff))
+        self._unsynced.add(journal)
+
+    def _remove(self, journal):
+        self._close_file(journal)
+        try:
+            os.remove(journal.path)
+        except OSError:
+            pass
@@ -4,6 +4,8 @@ from prompt_toolkit.application import get_app
 from prompt_toolkit.filters import Condition, has_focus, vi_insert_mode, vi_navigation_mode
 from prompt_toolkit.key_binding import KeyBindings
 
+from .io import directory_entry_name
+
 import os
 
 __all__ = (
@@ -149,7 +151,7 @@ def create_key_bindings(editor):
         """
         Open file/directory in file explorer mode.
         """
-        name_under_cursor = event.current_buffer.document.current_line
+        name_under_cursor = directory_entry_name(event.current_buffer.document.current_line)
         new_path = os.path.normpath(os.path.join(
             editor.current_editor_buffer.location, name_under_cursor))
 
@@ -19,7 +19,7 @@ from prompt_toolkit.selection import SelectionType
 from prompt_toolkit.widgets.toolbars import FormattedTextToolbar, SystemToolbar, SearchToolbar, ValidationToolbar, CompletionsToolbar
 
 from .commands.lexer import create_command_lexer
-from .lexer import DocumentLexer
+from .hex_view import HexControl
 from .welcome_message import WELCOME_MESSAGE_TOKENS, WELCOME_MESSAGE_HEIGHT, WELCOME_MESSAGE_WIDTH
 
 import pyvim.window_arrangement as window_arrangement
@@ -140,6 +140,22 @@ class WelcomeMessageWindow(ConditionalContainer):
             filter=Condition(condition))
 
 
+class LoadingMessage(ConditionalContainer):
+    """
+    Placeholder, displayed on top of a window while the file is being read,
+    and there is nothing to show yet.
+    """
+    def __init__(self, editor_buffer):
+        def get_tokens():
+            return [('class:loading', ' Loading %s%s ' % (
+                editor_buffer.get_display_name(short=True),
+                _try_char('\u2026', '...', get_app().output.encoding())))]
+
+        super(LoadingMessage, self).__init__(
+            Window(FormattedTextControl(get_tokens), height=1, dont_extend_width=True),
+            filter=Condition(lambda: editor_buffer.is_loading and editor_buffer.buffer.text == ''))
+
+
 def _bufferlist_overlay_visible(editor):
     """
     True when the buffer list overlay should be displayed.
@@ -341,6 +357,12 @@ class WindowStatusBar(FormattedTextToolbar):
                 recording(),
                 (editor_buffer.location or ''),
                 (' [New File]' if editor_buffer.is_new else ''),
+                (' [loading]' if editor_buffer.is_loading else ''),
+                (' [large]' if editor_buffer.is_large_file else ''),
+                (' [follow]' if editor_buffer.following else ''),
+                (' [hex]' if editor_buffer.binary_file is not None else ''),
+                (' [dos]' if editor_buffer.fileformat == 'dos' else ''),
+                (' [noeol]' if not editor_buffer.eol else ''),
                 ('*' if editor_buffer.has_unsaved_changes else ''),
                 (' '),
                 mode(),
@@ -355,7 +377,9 @@ class WindowStatusBarRuler(ConditionalContainer):
     The right side of the Vim toolbar, showing the location of the cursor in
     the file, and the vectical scroll percentage.
     """
-    def __init__(self, editor, buffer_window, buffer):
+    def __init__(self, editor, buffer_window, editor_buffer):
+        # Use the line index of the buffer, not the `Document`, so that this
+        # doesn't split the whole text after every key stroke.
         def get_scroll_text():
             info = buffer_window.render_info
 
@@ -366,18 +390,30 @@ class WindowStatusBarRuler(ConditionalContainer):
                     return 'Top'
                 elif info.bottom_visible:
                     return 'Bot'
+                elif editor_buffer.binary_file is not None:
+                    percentage = 100 * info.vertical_scroll // buffer_window.content.line_count
+                    return '%2i%%' % percentage
                 else:
-                    percentage = info.vertical_scroll_percentage
+                    line_count = editor_buffer.line_index.line_count
+                    percentage = 100 * info.vertical_scroll // max(1, line_count)
                     return '%2i%%' % percentage
 
             return ''
 
         def get_tokens():
-            main_document = buffer.document
+            if editor_buffer.binary_file is not None:
+                return [
+                    ('class:cursorposition', '0x%x' % buffer_window.content.offset),
+                    ('', ' - '),
+                    ('class:percentage', get_scroll_text()),
+                    ('', ' '),
+                ]
+
+            row, col = editor_buffer.line_index.translate_index_to_position(
+                editor_buffer.buffer.cursor_position)
 
             return [
-                ('class:cursorposition', '(%i,%i)' % (main_document.cursor_position_row + 1,
-                                                      main_document.cursor_position_col + 1)),
+                ('class:cursorposition', '(%i,%i)' % (row + 1, col + 1)),
                 ('', ' - '),
                 ('class:percentage', get_scroll_text()),
                 ('', ' '),
@@ -502,7 +538,10 @@ class EditorLayout(object):
         def create_layout_from_node(node):
             if isinstance(node, window_arrangement.Window):
                 # Create frame for Window, or reuse it, if we had one already.
-                key = (node, node.editor_buffer)
+                # (A binary file that was loaded in the background gets
+                # another frame, with a hex view.)
+                editor_buffer = node.editor_buffer
+                key = (node, editor_buffer, editor_buffer.binary_file is not None)
                 frame = existing_frames.get(key)
                 if frame is None:
                     frame, pt_window = self._create_window_frame(node.editor_buffer)
@@ -534,32 +573,44 @@ class EditorLayout(object):
         def wrap_lines():
             return self.editor.wrap_lines
 
-        window = Window(
-            self._create_buffer_control(editor_buffer),
-            allow_scroll_beyond_bottom=True,
-            scroll_offsets=ScrollOffsets(
-                left=0, right=0,
-                top=(lambda: self.editor.scroll_offset),
-                bottom=(lambda: self.editor.scroll_offset)),
-            wrap_lines=wrap_lines,
-            left_margins=[ConditionalMargin(
-                    margin=NumberedMargin(
-                        display_tildes=True,
-                        relative=Condition(lambda: self.editor.relative_number)),
-                    filter=Condition(lambda: self.editor.show_line_numbers))],
-            cursorline=Condition(lambda: self.editor.cursorline),
-            cursorcolumn=Condition(lambda: self.editor.cursorcolumn),
-            colorcolumns=(
-                lambda: [ColorColumn(pos) for pos in self.editor.colorcolumn]),
-            ignore_content_width=True,
-            ignore_content_height=True,
-            get_line_prefix=partial(self._get_line_prefix, editor_buffer.buffer))
+        if editor_buffer.binary_file is not None:
+            window = Window(
+                HexControl(editor_buffer.binary_file),
+                scroll_offsets=ScrollOffsets(
+                    top=(lambda: self.editor.scroll_offset),
+                    bottom=(lambda: self.editor.scroll_offset)),
+                cursorline=Condition(lambda: self.editor.cursorline),
+                ignore_content_width=True,
+                ignore_content_height=True)
+        else:
+            window = Window(
+                self._create_buffer_control(editor_buffer),
+                allow_scroll_beyond_bottom=True,
+                scroll_offsets=ScrollOffsets(
+                    left=0, right=0,
+                    top=(lambda: self.editor.scroll_offset),
+                    bottom=(lambda: self.editor.scroll_offset)),
+                wrap_lines=wrap_lines,
+                left_margins=[ConditionalMargin(
+                        margin=NumberedMargin(
+                            display_tildes=True,
+                            relative=Condition(lambda: self.editor.relative_number)),
+                        filter=Condition(lambda: self.editor.show_line_numbers))],
+                cursorline=Condition(lambda: self.editor.cursorline),
+                cursorcolumn=Condition(lambda: self.editor.cursorcolumn),
+                colorcolumns=(
+                    lambda: [ColorColumn(pos) for pos in self.editor.colorcolumn]),
+                ignore_content_width=True,
+                ignore_content_height=True,
+                get_line_prefix=partial(self._get_line_prefix, editor_buffer.buffer))
 
         return HSplit([
-            window,
+            FloatContainer(window, floats=[
+                Float(content=LoadingMessage(editor_buffer)),
+            ]),
             VSplit([
                 WindowStatusBar(self.editor, editor_buffer),
-                WindowStatusBarRuler(self.editor, window, editor_buffer.buffer),
+                WindowStatusBarRuler(self.editor, window, editor_buffer),
             ], width=Dimension()),  # Ignore actual status bar width.
         ]), window
 
@@ -577,7 +628,8 @@ class EditorLayout(object):
             # selected.)
             ConditionalProcessor(
                 ShowTrailingWhiteSpaceProcessor(),
-                Condition(lambda: self.editor.display_unprintable_characters)),
+                Condition(lambda: self.editor.display_unprintable_characters and
+                          editor_buffer.features['trailspace'])),
 
             # Replace tabs by spaces.
             TabsProcessor(
@@ -596,12 +648,14 @@ class EditorLayout(object):
             ConditionalProcessor(
                 HighlightIncrementalSearchProcessor(),
                 Condition(lambda: self.editor.highlight_search) & preview_search),
-            HighlightMatchingBracketProcessor(),
+            ConditionalProcessor(
+                HighlightMatchingBracketProcessor(),
+                Condition(lambda: editor_buffer.features['matchparen'])),
             DisplayMultipleCursors(),
         ]
 
         return BufferControl(
-            lexer=DocumentLexer(editor_buffer),
+            lexer=editor_buffer.lexer,
             include_default_input_processors=False,
             input_processors=input_processors,
             buffer=editor_buffer.buffer,
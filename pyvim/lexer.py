@@ -1,38 +1,618 @@
 from __future__ import unicode_literals
 
 from prompt_toolkit.lexers import Lexer, SimpleLexer, PygmentsLexer
-from pygments.lexer import RegexLexer
-from pygments.token import Token
+from prompt_toolkit.styles.pygments import pygments_token_to_classname
+from pygments.lexer import ExtendedRegexLexer, RegexLexer
+from pygments.lexers import get_lexer_for_filename
+from pygments.token import Error, Token, Whitespace, _TokenType
+from pygments.util import ClassNotFound
+
+from pyvim.fast_lexers import FastLexer, get_fast_lexer_for_filename
+
+from bisect import bisect_left, bisect_right
+import sys
+import time
 
 __all__ = (
     'DocumentLexer',
+    'IncrementalHighlighter',
 )
 
+#: A lexer state checkpoint is kept for at least every this many lines.
+CHECKPOINT_INTERVAL = 50
+
+#: Maximum amount of highlighted lines that are kept.
+MAX_CACHED_LINES = 2000
+
+#: Time (in seconds) that highlighting may take in the event loop, for one
+#: line. When it takes longer, it continues in a background thread.
+SYNC_HIGHLIGHTING_TIME = 0.005
+
+#: Amount of lines after the requested one that a background job highlights.
+BACKGROUND_LINES = 200
+
+# (How often highlighting checks the time, in tokens.)
+_TOKENS_PER_CHECK = 100
+
 
 class DocumentLexer(Lexer):
     """
     Lexer that depending on the filetype, uses another pygments lexer.
+
+    The lexer for the current location is looked up once, and kept until
+    the location, or the kind of buffer changes. (Looking up the lexer for a
+    filename, and creating its syntax sync, is too expensive for every new
+    `Document`.)
+
+    There is one `DocumentLexer` for every `EditorBuffer`, shared by all the
+    windows that show it. For every version of the text, the lines are
+    highlighted once, whatever the amount of windows.
     """
     def __init__(self, editor_buffer):
         self.editor_buffer = editor_buffer
 
+        self._lexer_key = None
+        self._lexer = None
+
+        # The `get_line` function for the current version of the text.
+        self._document_key = None
+        self._get_line = None
+
+    def close(self):
+        " Called when the buffer is closed. "
+        if isinstance(self._lexer, IncrementalHighlighter):
+            self._lexer.close()
+
+        self._lexer_key = self._lexer = None
+        self._document_key = self._get_line = None
+
+    def _get_lexer(self):
+        """
+        Return the lexer for the current state of the buffer.
+        """
+        eb = self.editor_buffer
+        location = eb.location
+        syntax = bool(location) and eb.features['syntax']
+        fast = eb.editor.fast_lexers
+        key = (location, syntax, eb.in_file_explorer_mode, fast)
+
+        if key != self._lexer_key:
+            if not syntax:
+                lexer = SimpleLexer()
+            elif eb.in_file_explorer_mode:
+                lexer = _create_lexer(eb, DirectoryListingLexer())
+            else:
+                try:
+                    lexer = _create_lexer(eb, _get_pygments_lexer(location, fast))
+                except ClassNotFound:
+                    lexer = SimpleLexer()
+
+            if isinstance(self._lexer, IncrementalHighlighter):
+                self._lexer.close()
+
+            self._lexer_key = key
+            self._lexer = lexer
+
+        return self._lexer
+
     def lex_document(self, document):
         """
         Call the lexer and return a get_tokens_for_line function.
         """
-        location = self.editor_buffer.location
+        lexer = self._get_lexer()
+        eb = self.editor_buffer
+
+        if document.text != eb.buffer.text:
+            # Not the text of the buffer. (For instance a preview.)
+            return lexer.lex_document(document)
+
+        key = (self._lexer_key, eb.text_version)
+        if key != self._document_key:
+            self._document_key = key
+            self._get_line = lexer.lex_document(document)
+
+        return self._get_line
+
+    def invalidation_hash(self):
+        # (The highlighting changes when another lexer is used.)
+        self._get_lexer()
+        return self._lexer_key
+
+
+def _get_pygments_lexer(location, fast):
+    """
+    Return the Pygments lexer for this location. When `fast` is set, prefer
+    the lexers of `pyvim.fast_lexers`. Raises `ClassNotFound`.
+    """
+    if fast:
+        try:
+            return get_fast_lexer_for_filename(location)
+        except ClassNotFound:
+            pass
+
+    return get_lexer_for_filename(location)
+
+
+def _create_lexer(editor_buffer, pygments_lexer):
+    """
+    Highlight the buffer incrementally if the Pygments lexer allows it.
+    """
+    if isinstance(pygments_lexer, FastLexer):
+        return IncrementalHighlighter(editor_buffer, pygments_lexer)
+    elif (isinstance(pygments_lexer, RegexLexer) and
+            not isinstance(pygments_lexer, ExtendedRegexLexer) and
+            type(pygments_lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed):
+        return IncrementalHighlighter(editor_buffer, pygments_lexer)
+    else:
+        return PygmentsLexer(type(pygments_lexer), sync_from_start=False)
+
+
+class _TokenStyles(dict):
+    " Cache that converts Pygments tokens into prompt_toolkit style strings. "
+    def __missing__(self, token):
+        result = 'class:' + pygments_token_to_classname(token)
+        self[token] = result
+        return result
+
+
+_TOKEN_STYLES = _TokenStyles()
+
+
+def _lex(pygments_lexer, text, pos, stack):
+    """
+    Like `RegexLexer.get_tokens_unprocessed`, but start at `pos` of `text`,
+    and tell what the state is when a match ends a line.
+
+    Yields (token, value) tuples. After every match that ends with a
+    newline, a (None, stack) tuple is yielded, with the state stack for the
+    next line.
+    """
+    tokendefs = pygments_lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    end = len(text)
+
+    while pos < end:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(text, pos)
+            if m:
+                if action is not None:
+                    if type(action) is _TokenType:
+                        yield action, m.group()
+                    else:
+                        for _, token, value in action(pygments_lexer, m):
+                            yield token, value
+
+                start, pos = pos, m.end()
+
+                if new_state is not None:
+                    # State transition. (The same as in Pygments.)
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == '#pop':
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+
+                if pos > start and text[pos - 1] == '\n':
+                    yield None, tuple(statestack)
+                break
+        else:
+            # No rule matches. At the end of the line, Pygments resets the
+            # state to "root".
+            if text[pos] == '\n':
+                statestack = ['root']
+                statetokens = tokendefs['root']
+                yield Whitespace, '\n'
+                yield None, ('root', )
+            else:
+                yield Error, text[pos]
+            pos += 1
+
+
+def _highlight_lines(pygments_lexer, text, pos, row, stack):
+    """
+    Highlight the lines of `text`, from `pos`, the start of line `row`,
+    with this state stack at that position.
+
+    Yields a (row, fragments, state) tuple for every line. `state` is the
+    state stack at the start of the next line, or `None` when the next line
+    starts in the middle of a token. In between, `None` is yielded
+    regularly, so that the caller can find out whether it takes too long.
+    (This only reads `text`, so it can run in another thread.)
+    """
+    styles = _TOKEN_STYLES
+    fragments = []
+    done = []  # Lines of which the state after them is not known yet.
+    at_line_start = True  # No token of this line yet.
+    count = 0
+
+    if isinstance(pygments_lexer, FastLexer):
+        tokens = pygments_lexer.lex(text, pos, stack)
+    else:
+        tokens = _lex(pygments_lexer, text, pos, stack)
+
+    for token, value in tokens:
+        if token is None:
+            if at_line_start and done:
+                done[-1][2] = value
+            continue
+        elif not value:
+            continue
+
+        for line in done:
+            yield tuple(line)
+        done = []
+
+        count += 1
+        if count % _TOKENS_PER_CHECK == 0:
+            yield None
+
+        style = styles[token]
+
+        if '\n' not in value:
+            fragments.append((style, value))
+            at_line_start = False
+            continue
+
+        parts = value.split('\n')
+        for part in parts[:-1]:
+            if part:
+                fragments.append((style, part))
+            done.append([row, fragments, None])
+            row += 1
+            fragments = []
+
+        at_line_start = not parts[-1]
+        if parts[-1]:
+            fragments.append((style, parts[-1]))
+
+    for line in done:
+        yield tuple(line)
+
+    # The last line.
+    yield row, fragments, None
+
+
+class IncrementalHighlighter(Lexer):
+    """
+    Highlighting of an `EditorBuffer` with a Pygments `RegexLexer`, that is
+    kept up to date with the `TextEdit`s of the buffer, instead of lexing
+    again for every new `Document`.
+
+    The state stack of the Pygments lexer is kept at the start of the lines
+    that were highlighted recently, and as a checkpoint for at least every
+    `CHECKPOINT_INTERVAL` lines. Lines are highlighted lazily, starting at the
+    nearest known state before them. After an edit, the states and lines
+    below the change are kept, but they are stale: when lexing from before
+    the change reaches a line of which the state is the same as before, the
+    state has converged, and everything below is valid again. So, typing
+    usually highlights only the line under the cursor again.
+
+    (Like the syntax sync of prompt_toolkit, this assumes that the text after
+    a change doesn't affect the tokens before it. That is not always true for
+    rules that match several lines, but the next edit above it fixes that.)
+
+    :param editor_buffer: `EditorBuffer` instance.
+    :param pygments_lexer: Pygments `RegexLexer` or `FastLexer` instance.
+    """
+    def __init__(self, editor_buffer, pygments_lexer):
+        self.editor_buffer = editor_buffer
+        self.pygments_lexer = pygments_lexer
+
+        #: Amount of lines that were tokenized. (For testing.)
+        self.lexed_line_count = 0
+
+        # Checkpoints: sorted rows and the state stacks at their start.
+        self._rows = [0]
+        self._states = [('root', )]
+
+        # Highlighted lines and the states at the start of lines, per row.
+        self._lines = {}
+        self._line_states = {0: ('root', )}
+
+        # Everything up to this row is valid. The lines, states and
+        # checkpoints below it are stale, after an edit. When the state
+        # converges, they are valid again, up to the line of the next edit
+        # in `_dirty_rows`.
+        self._valid_row = sys.maxsize
+        self._dirty_rows = []
+
+        # Generator that highlights the next lines, and its position.
+        self._generator = None
+        self._next_row = 0
+
+        # Background highlighting, and the first row that was edited since
+        # it started.
+        self._highlighting_in_background = False
+        self._edited_row = sys.maxsize
+
+        # (Creating the line index now means it is up to date when the text
+        # changes.)
+        self._line_index = editor_buffer.line_index
+        editor_buffer.text_edit_handlers.append(self._text_edit)
+
+    def close(self):
+        " Stop following the changes of the buffer. "
+        handlers = self.editor_buffer.text_edit_handlers
+        if self._text_edit in handlers:
+            handlers.remove(self._text_edit)
+
+    def _text_edit(self, edit):
+        """
+        Called for every `TextEdit` of the buffer.
+        """
+        # (The text before the edit didn't change, so the row of its
+        # position is the same in the updated line index.)
+        row = self._line_index.translate_index_to_position(edit.position)[0]
+        last_row = row + edit.deleted.count('\n')
+        delta = edit.inserted.count('\n') - edit.deleted.count('\n')
+
+        def shift(mapping, keep_row):
+            # (The state at the start of the changed line is still valid,
+            # but its tokens are not.)
+            return dict((r if r <= keep_row else r + delta, value)
+                        for r, value in mapping.items()
+                        if r <= keep_row or r > last_row)
+
+        self._generator = None
+        self._edited_row = min(self._edited_row, row)
+        self._lines = shift(self._lines, row - 1)
+        self._line_states = shift(self._line_states, row)
+
+        i = bisect_right(self._rows, row)
+        j = bisect_right(self._rows, last_row)
+        del self._rows[i:j]
+        del self._states[i:j]
+        if delta:
+            for k in range(i, len(self._rows)):
+                self._rows[k] += delta
+
+        dirty_rows = self._dirty_rows
+        if self._valid_row < sys.maxsize:
+            dirty_rows = [self._valid_row + 1] + dirty_rows
+
+        self._valid_row = min(self._valid_row, row - 1)
+        self._dirty_rows = [
+            r for r in [r for r in dirty_rows if r < row] + [row] +
+            [r + delta for r in dirty_rows if r > last_row]
+            if r > self._valid_row + 1]
+
+    def lex_document(self, document):
+        if document.text == self.editor_buffer.buffer.text:
+            return self.get_line
+        else:
+            # Not the text of the buffer. (For instance a preview.)
+            lexer = PygmentsLexer(type(self.pygments_lexer), sync_from_start=False)
+            return lexer.lex_document(document)
+
+    def invalidation_hash(self):
+        return self.pygments_lexer
+
+    def get_line(self, row):
+        """
+        Return the fragments for this line of the current text.
+
+        When highlighting takes too long, it continues in the background.
+        Until it's done, the old fragments of the line are returned when
+        the text of the line didn't change, or else the plain text.
+        """
+        if row not in self._lines or row > self._valid_row:
+            if not self._highlighting_in_background:
+                self._highlight(row)
+
+            if row not in self._lines or row > self._valid_row:
+                return self._old_line(row)
+
+        return self._lines[row]
+
+    def _old_line(self, row):
+        " Fragments for a line that is not highlighted yet. "
+        line_index = self._line_index
+        if not 0 <= row < line_index.line_count:
+            return []
+
+        start = line_index.line_start(row)
+        text = self.editor_buffer.buffer.text[start:start + line_index.line_length(row)]
+
+        fragments = self._lines.get(row)
+        if fragments is not None and ''.join(f[1] for f in fragments) == text:
+            return fragments
+        return [('', text)]
+
+    @property
+    def is_highlighting(self):
+        " True while lines are being highlighted in the background. "
+        return self._highlighting_in_background
+
+    def _highlight(self, row):
+        """
+        Highlight the lines until this row, in the event loop, or continue in
+        the background when it takes too long.
+        """
+        next_row = self._next_row
+        if self._generator is None or not next_row <= row < next_row + CHECKPOINT_INTERVAL:
+            self._start(row)
+
+        generator = self._generator
+        deadline = time.time() + SYNC_HIGHLIGHTING_TIME
+        stale = row > self._valid_row
+
+        for line in generator:
+            if line is not None:
+                self._store_line(*line)
+                if line[0] >= row:
+                    return
+
+                if stale and self._valid_row >= row:
+                    # Converged. Continue at a known state closer to the row.
+                    if row - self._next_row >= CHECKPOINT_INTERVAL:
+                        if row not in self._lines:
+                            self._highlight(row)
+                        return
+                    stale = False
+
+            if time.time() > deadline:
+                self._generator = None
+                self._highlight_in_background(generator, row + BACKGROUND_LINES)
+                return
+
+    def _start(self, row):
+        """
+        Start highlighting at the nearest known state before this row.
+        """
+        row = min(row, self._valid_row + 1)
+        i = bisect_right(self._rows, row) - 1
+        start, stack = self._rows[i], self._states[i]
+
+        for r, s in self._line_states.items():
+            if start < r <= row:
+                start, stack = r, s
+
+        self._next_row = start
+        self._generator = _highlight_lines(
+            self.pygments_lexer, self.editor_buffer.buffer.text,
+            self._line_index.line_start(start), start, stack)
+
+    def _highlight_in_background(self, generator, last_row):
+        """
+        Continue highlighting with this generator in a thread, until
+        `last_row`. The lines are published in the event loop, and the
+        application is invalidated.
+        """
+        eb = self.editor_buffer
+        text_version = eb.text_version
+
+        def in_executor():
+            result = []
+            for line in generator:
+                # (Stop early when the text was changed in the meantime.)
+                if eb.text_version != text_version:
+                    break
+                if line is not None:
+                    result.append(line)
+                    if line[0] >= last_row:
+                        break
+            return result
 
-        if location:
-            if self.editor_buffer.in_file_explorer_mode:
-                return PygmentsLexer(DirectoryListingLexer, sync_from_start=False).lex_document(document)
+        def ready(result):
+            self._highlighting_in_background = False
 
-            return PygmentsLexer.from_filename(location, sync_from_start=False).lex_document(document)
+            # Lines above the edits since the start are still valid.
+            # (Including the state at the start of the first edited line.)
+            edited_row = self._edited_row
+            for row, fragments, state in result:
+                if row >= edited_row:
+                    break
+                self._store_line(row, fragments, state if row + 1 <= edited_row else None)
 
-        return SimpleLexer().lex_document(document)
+            if text_version == eb.text_version and result:
+                self._generator = generator
+
+            eb.editor.application.invalidate()
+
+        self._highlighting_in_background = True
+        self._edited_row = sys.maxsize
+        eb.editor.run_in_background(in_executor, ready)
+
+    def _store_line(self, row, fragments, state):
+        """
+        Keep the fragments of this line, and the state after it.
+        """
+        self._lines[row] = fragments
+        self._next_row = row + 1
+        self.lexed_line_count += 1
+
+        if len(self._lines) > MAX_CACHED_LINES:
+            self._forget_lines(row)
+
+        # (When this line was stale, the state after it is stale too.
+        # Compare it to find out whether the state converged.)
+        stale_state = None
+        if row > self._valid_row:
+            self._set_valid_row(row)
+            stale_state = self._pop_stale_state(row + 1)
+
+        if state is not None:
+            self._set_state(row + 1, state, stale_state)
+
+    def _forget_lines(self, row):
+        """
+        Forget the lines and states that are not close to this row. (The
+        checkpoints are kept.)
+        """
+        def keep(r):
+            return abs(r - row) < MAX_CACHED_LINES // 2
+
+        self._lines = dict((r, f) for r, f in self._lines.items() if keep(r))
+        self._line_states = dict((r, s) for r, s in self._line_states.items() if keep(r))
+
+    def _set_valid_row(self, row):
+        " Called when the lines up to this row were highlighted again. "
+        self._valid_row = row
+        while self._dirty_rows and self._dirty_rows[0] <= row + 1:
+            self._dirty_rows.pop(0)
+
+    def _pop_stale_state(self, row):
+        """
+        Remove the stale state at the start of this row, and return it.
+        """
+        state = self._line_states.pop(row, None)
+
+        i = bisect_left(self._rows, row)
+        if i < len(self._rows) and self._rows[i] == row:
+            state = self._states.pop(i)
+            del self._rows[i]
+
+        return state
+
+    def _set_state(self, row, stack, stale_state):
+        """
+        Remember the state at the start of this row.
+        """
+        if row > self._valid_row and stack == stale_state:
+            # Converged: from here on, everything is the same as before,
+            # until the next edit.
+            if self._dirty_rows:
+                self._valid_row = self._dirty_rows.pop(0) - 1
+            else:
+                self._valid_row = sys.maxsize
+
+        self._line_states[row] = stack
+
+        rows = self._rows
+        i = bisect_left(rows, row)
+        if i < len(rows) and rows[i] == row:
+            self._states[i] = stack
+        elif row - rows[i - 1] >= CHECKPOINT_INTERVAL:
+            rows.insert(i, row)
+            self._states.insert(i, stack)
 
 
 _DirectoryListing = Token.DirectoryListing
 
+# Names of the entries. (At the start of the line, or after the details.)
+_DIRECTORY_ENTRY_RULES = [
+    (r'.*/$', _DirectoryListing.Directory),
+    (r'.*\.(txt|rst|md)$', _DirectoryListing.Textfile),
+    (r'.*\.(py)$', _DirectoryListing.PythonFile),
+
+    (r'.*\.(pyc|pyd)$', _DirectoryListing.Tempfile),
+    (r'\..*$', _DirectoryListing.Dotfile),
+]
+
+
 class DirectoryListingLexer(RegexLexer):
     """
     Highlighting of directory listings.
@@ -45,11 +625,10 @@ class DirectoryListingLexer(RegexLexer):
             (r'^\.\./$', _DirectoryListing.ParentDirectory),
             (r'^\./$', _DirectoryListing.CurrentDirectory),
 
-            (r'^[^"].*/$', _DirectoryListing.Directory),
-            (r'^[^"].*\.(txt|rst|md)$', _DirectoryListing.Textfile),
-            (r'^[^"].*\.(py)$', _DirectoryListing.PythonFile),
+            # Size and modification time. (':set dirdetails')
+            (r'^ *\S+  \d{4}-\d\d-\d\d \d\d:\d\d  ', _DirectoryListing.Details, str('entry')),
+        ] + [(r'^(?=[^"])' + regex, token) for regex, token in _DIRECTORY_ENTRY_RULES],
 
-            (r'^[^"].*\.(pyc|pyd)$', _DirectoryListing.Tempfile),
-            (r'^\..*$', _DirectoryListing.Dotfile),
-        ]
+        # (Pygments returns to the root state at the end of the line.)
+        str('entry'): _DIRECTORY_ENTRY_RULES,
     }
@@ -0,0 +1,240 @@
+"""
+Index of the line offsets of a text, that is updated incrementally.
+
+`Document` computes the offsets of all the lines by splitting the whole text,
+and it does this again for every new `Document`, so after every edit. The
+`LineIndex` of an `EditorBuffer` is updated from the `TextEdit` instead, which
+only touches the edited lines.
+
+The lengths of the lines are stored in blocks of compact arrays. Two Fenwick
+trees over the blocks hold the amount of lines and characters per block, so
+translating between rows and offsets costs O(log n) plus a scan of at most
+one block.
+
+The blocks are never changed in place: an edit replaces the blocks that it
+touches. So a copy of the index can share them, and only has to copy the
+trees, which have one value per block.
+"""
+from __future__ import unicode_literals
+
+from array import array
+
+__all__ = (
+    'LineIndex',
+)
+
+#: Blocks are split when they have more lines than this.
+MAX_BLOCK_SIZE = 1024
+
+
+class _FenwickTree(object):
+    """
+    Prefix sums over a list of integers, with O(log n) updates.
+    """
+    def __init__(self, values):
+        self.size = len(values)
+        tree = [0] + list(values)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def copy(self):
+        result = _FenwickTree.__new__(_FenwickTree)
+        result.size = self.size
+        result._tree = list(self._tree)
+        return result
+
+    def add(self, index, delta):
+        i = index + 1
+        tree = self._tree
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
+
+    def search(self, value):
+        """
+        Return (index, prefix), for the first index where the sum of the
+        values up to and including this index is bigger than `value`.
+        `prefix` is the sum of the values in front of this index.
+        """
+        tree = self._tree
+        pos = 0
+        step = 1 << self.size.bit_length()
+
+        while step:
+            if pos + step <= self.size and tree[pos + step] <= value:
+                pos += step
+                value -= tree[pos]
+            step >>= 1
+
+        return pos, self._prefix(pos)
+
+    def _prefix(self, index):
+        " Sum of the values in front of this index. "
+        total = 0
+        i = index
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+
+def _line_lengths(text):
+    " Lengths of the lines of `text`, including the line endings. "
+    lines = text.split('\n')
+    lengths = array('I', [len(line) + 1 for line in lines])
+    lengths[-1] -= 1  # The last line has no line ending.
+    return lengths
+
+
+class LineIndex(object):
+    """
+    Line offsets of a text.
+
+    :param text: Initial text.
+    """
+    def __init__(self, text=''):
+        lengths = _line_lengths(text)
+        self._blocks = [lengths[i:i + MAX_BLOCK_SIZE // 2]
+                        for i in range(0, len(lengths), MAX_BLOCK_SIZE // 2)]
+        self._rebuild()
+
+    def _rebuild(self):
+        " Recreate the trees after the blocks were split or merged. "
+        self._line_tree = _FenwickTree([len(b) for b in self._blocks])
+        self._char_tree = _FenwickTree([sum(b) for b in self._blocks])
+        self.line_count = sum(len(b) for b in self._blocks)
+        self.length = self._char_tree._prefix(len(self._blocks))
+
+    def copy(self):
+        """
+        Return an independent copy. (For passing to another thread.) This
+        costs O(n / `MAX_BLOCK_SIZE`): the blocks are shared.
+        """
+        result = LineIndex.__new__(LineIndex)
+        result._blocks = list(self._blocks)
+        result._line_tree = self._line_tree.copy()
+        result._char_tree = self._char_tree.copy()
+        result.line_count = self.line_count
+        result.length = self.length
+        return result
+
+    def _find_row(self, row):
+        " Return (block index, row in block, offset of the block). "
+        block_index, first_row = self._line_tree.search(row)
+        return block_index, row - first_row, self._char_tree._prefix(block_index)
+
+    def line_start(self, row):
+        """
+        Offset of the first character of this line.
+        """
+        if not 0 <= row < self.line_count:
+            raise IndexError('Row out of range: %r' % row)
+
+        block_index, i, offset = self._find_row(row)
+        return offset + sum(self._blocks[block_index][:i])
+
+    def line_length(self, row):
+        """
+        Length of this line, without the line ending.
+        """
+        if not 0 <= row < self.line_count:
+            raise IndexError('Row out of range: %r' % row)
+
+        block_index, i, _ = self._find_row(row)
+        length = self._blocks[block_index][i]
+        return length if row == self.line_count - 1 else length - 1
+
+    def translate_index_to_position(self, index):
+        """
+        Return the (row, col) tuple for this offset. (Like `Document`.)
+        """
+        index = max(0, min(index, self.length))
+
+        if index == self.length:
+            row = self.line_count - 1
+            return row, index - self.line_start(row)
+
+        block_index, offset = self._char_tree.search(index)
+        row = self._line_tree._prefix(block_index)
+
+        for length in self._blocks[block_index]:
+            if offset + length > index:
+                break
+            offset += length
+            row += 1
+
+        return row, index - offset
+
+    def translate_row_col_to_index(self, row, col):
+        """
+        Like `Document.translate_row_col_to_index`: the row and column are
+        clipped to the text.
+        """
+        row = max(0, min(row, self.line_count - 1))
+        col = max(0, min(col, self.line_length(row)))
+        return self.line_start(row) + col
+
+    def apply_edit(self, edit):
+        """
+        Update the index for this `pyvim.text_edit.TextEdit`.
+        """
+        first_row, head = self.translate_index_to_position(edit.position)
+        last_row = first_row + edit.deleted.count('\n')
+
+        # Line lengths in the edited range, before the edit.
+        block_index, i, _ = self._find_row(first_row)
+        last_block_index, j, _ = self._find_row(last_row)
+
+        if block_index == last_block_index:
+            old = self._blocks[block_index][i:j + 1]
+        else:
+            old = array('I', self._blocks[block_index][i:])
+            for b in self._blocks[block_index + 1:last_block_index]:
+                old.extend(b)
+            old.extend(self._blocks[last_block_index][:j + 1])
+
+        # Characters of the last line that come after the deleted text.
+        # (Including its line ending.)
+        tail = sum(old) - head - len(edit.deleted)
+
+        # Lengths of the new lines.
+        parts = edit.inserted.split('\n')
+        new = array('I', [len(p) + 1 for p in parts])
+        new[0] += head
+        new[-1] += tail - 1
+
+        line_delta = len(new) - len(old)
+        char_delta = len(edit.inserted) - len(edit.deleted)
+
+        if block_index == last_block_index:
+            # Common case: the edit is within one block. (Replace the block,
+            # instead of changing it, because copies can share it.)
+            block = self._blocks[block_index]
+            block = block[:i] + new + block[j + 1:]
+            self._blocks[block_index] = block
+
+            if len(block) <= MAX_BLOCK_SIZE:
+                self._line_tree.add(block_index, line_delta)
+                self._char_tree.add(block_index, char_delta)
+                self.line_count += line_delta
+                self.length += char_delta
+                return
+
+            blocks = [block]
+        else:
+            block = self._blocks[block_index][:i]
+            block.extend(new)
+            block.extend(self._blocks[last_block_index][j + 1:])
+            blocks = [block]
+
+        # Split big blocks, and recreate the trees.
+        if len(block) > MAX_BLOCK_SIZE:
+            size = MAX_BLOCK_SIZE // 2
+            blocks = [block[k:k + size] for k in range(0, len(block), size)]
+
+        self._blocks[block_index:last_block_index + 1] = blocks
+        self._rebuild()
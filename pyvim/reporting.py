@@ -30,17 +30,20 @@ class ReporterError(object):
         self.formatted_text = formatted_text
 
 
-def report(location, document):
+def report(location, document, line_index=None):
     """
     Run reporter on document and return list of ReporterError instances.
     (Depending on the location it will or won't run anything.)
 
+    :param line_index: Optional `LineIndex` of the document, for
+        translating line numbers.
+
     Returns a list of `ReporterError`.
     """
     assert isinstance(location, six.string_types)
 
     if location.endswith('.py'):
-        return report_pyflakes(document)
+        return report_pyflakes(document, line_index)
     else:
         return []
 
@@ -48,10 +51,12 @@ def report(location, document):
 WORD_CHARACTERS = string.ascii_letters + '0123456789_'
 
 
-def report_pyflakes(document):
+def report_pyflakes(document, line_index=None):
     """
     Run pyflakes on document and return list of ReporterError instances.
     """
+    translate_row_col_to_index = (line_index or document).translate_row_col_to_index
+
     # Run pyflakes on input.
     reporter = _FlakesReporter()
     pyflakes.api.check(document.text, '', reporter=reporter)
@@ -65,7 +70,7 @@ def report_pyflakes(document):
 
     def message_to_reporter_error(message):
         """ Turn pyflakes message into ReporterError. """
-        start_index = document.translate_row_col_to_index(message.lineno - 1, message.col)
+        start_index = translate_row_col_to_index(message.lineno - 1, message.col)
         end_index = start_index
         while end_index < len(document.text) and document.text[end_index] in WORD_CHARACTERS:
             end_index += 1
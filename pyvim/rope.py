@@ -0,0 +1,332 @@
+"""
+Rope data structure.
+
+A rope stores a (potentially huge) text as a balanced binary tree of small
+string chunks. Inserting or deleting text only rebuilds the path from the
+root to the edited leaves, so edits cost O(log n), independent of the size
+of the text. Every node also knows how many line breaks it contains, which
+makes row/offset translations O(log n) as well.
+
+Ropes are immutable. All the editing methods return a new `Rope` that shares
+most of its nodes with the original one.
+
+Usage::
+
+    r = Rope('hello world')
+    r = r.insert(5, ',')
+    r = r.delete(0, 1)
+    text = r.text
+"""
+from __future__ import unicode_literals
+
+__all__ = (
+    'Rope',
+)
+
+#: Preferred size of the leaves. Smaller leaves are merged when possible.
+LEAF_SIZE = 2048
+
+
+class _Leaf(object):
+    __slots__ = ('text', 'length', 'newlines')
+    depth = 0
+
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        self.newlines = text.count('\n')
+
+
+class _Node(object):
+    __slots__ = ('left', 'right', 'length', 'newlines', 'depth')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.length = left.length + right.length
+        self.newlines = left.newlines + right.newlines
+        self.depth = max(left.depth, right.depth) + 1
+
+
+_EMPTY = _Leaf('')
+
+
+def _leaves_from_text(text):
+    return [_Leaf(text[i:i + LEAF_SIZE]) for i in range(0, len(text), LEAF_SIZE)]
+
+
+def _build(leaves, start, end):
+    " Build a perfectly balanced tree from a list of leaves. "
+    if end - start == 1:
+        return leaves[start]
+    middle = (start + end) // 2
+    return _Node(_build(leaves, start, middle), _build(leaves, middle, end))
+
+
+def _make(left, right):
+    """
+    Create a node for two subtrees of which the depth differs at most by two,
+    doing a (single or double) rotation when required.
+    """
+    if left.depth > right.depth + 1:
+        if left.left.depth >= left.right.depth:
+            return _Node(left.left, _Node(left.right, right))
+        else:
+            lr = left.right
+            return _Node(_Node(left.left, lr.left), _Node(lr.right, right))
+
+    if right.depth > left.depth + 1:
+        if right.right.depth >= right.left.depth:
+            return _Node(_Node(left, right.left), right.right)
+        else:
+            rl = right.left
+            return _Node(_Node(left, rl.left), _Node(rl.right, right.right))
+
+    return _Node(left, right)
+
+
+def _concat(left, right):
+    """
+    Concatenate two balanced trees into a balanced tree. (AVL join.)
+    """
+    if left.length == 0:
+        return right
+    if right.length == 0:
+        return left
+
+    if left.depth > right.depth + 1:
+        return _make(left.left, _concat(left.right, right))
+
+    if right.depth > left.depth + 1:
+        return _make(_concat(left, right.left), right.right)
+
+    # Merge small neighbouring leaves.
+    if left.depth == right.depth == 0 and left.length + right.length <= LEAF_SIZE:
+        return _Leaf(left.text + right.text)
+
+    return _Node(left, right)
+
+
+def _split(node, index):
+    """
+    Split tree in two trees at this index.
+    """
+    if node.depth == 0:
+        return _Leaf(node.text[:index]), _Leaf(node.text[index:])
+
+    left_length = node.left.length
+
+    if index < left_length:
+        a, b = _split(node.left, index)
+        return a, _concat(b, node.right)
+    elif index > left_length:
+        a, b = _split(node.right, index - left_length)
+        return _concat(node.left, a), b
+    else:
+        return node.left, node.right
+
+
+def _insert(node, index, text):
+    """
+    Insert text in the leaf that contains this index. This keeps the amount
+    of leaves low while typing, compared to doing a split and concat.
+    """
+    if node.depth == 0:
+        new_text = node.text[:index] + text + node.text[index:]
+        if len(new_text) <= 2 * LEAF_SIZE:
+            return _Leaf(new_text)
+        leaves = _leaves_from_text(new_text)
+        return _build(leaves, 0, len(leaves))
+
+    left_length = node.left.length
+
+    if index <= left_length:
+        return _concat(_insert(node.left, index, text), node.right)
+    else:
+        return _concat(node.left, _insert(node.right, index - left_length, text))
+
+
+def _iter_leaves(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.depth == 0:
+            if node.length:
+                yield node
+        else:
+            stack.append(node.right)
+            stack.append(node.left)
+
+
+class Rope(object):
+    """
+    Immutable rope.
+
+    :param text: Initial content.
+    """
+    __slots__ = ('_root', )
+
+    def __init__(self, text='', _root=None):
+        if _root is None:
+            leaves = _leaves_from_text(text)
+            _root = _build(leaves, 0, len(leaves)) if leaves else _EMPTY
+        self._root = _root
+
+    def __len__(self):
+        return self._root.length
+
+    def __eq__(self, other):
+        if isinstance(other, Rope):
+            return len(self) == len(other) and self.text == other.text
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return '%s(length=%r, line_count=%r)' % (
+            self.__class__.__name__, len(self), self.line_count)
+
+    @property
+    def text(self):
+        " The content of this rope as one string. "
+        return ''.join(self.chunks())
+
+    @property
+    def depth(self):
+        return self._root.depth
+
+    @property
+    def line_count(self):
+        " Amount of lines. (A text without line breaks has one line.) "
+        return self._root.newlines + 1
+
+    def chunks(self):
+        """
+        Iterate over the text, chunk by chunk. (Without creating one big
+        string.)
+        """
+        for leaf in _iter_leaves(self._root):
+            yield leaf.text
+
+    def _check_index(self, index):
+        if not 0 <= index <= len(self):
+            raise IndexError('Rope index out of range: %r' % index)
+
+    def insert(self, index, text):
+        " Return a new rope with `text` inserted at this index. "
+        self._check_index(index)
+        if not text:
+            return self
+        if len(text) > LEAF_SIZE:
+            left, right = _split(self._root, index)
+            return Rope(_root=_concat(_concat(left, Rope(text)._root), right))
+        return Rope(_root=_insert(self._root, index, text))
+
+    def delete(self, start, end):
+        " Return a new rope without the text between `start` and `end`. "
+        self._check_index(start)
+        self._check_index(end)
+        if start >= end:
+            return self
+        left, rest = _split(self._root, start)
+        _, right = _split(rest, end - start)
+        return Rope(_root=_concat(left, right))
+
+    def replace(self, start, end, text):
+        " Replace the text between `start` and `end` by `text`. "
+        return self.delete(start, end).insert(start, text)
+
+    def apply_edit(self, edit):
+        " Apply a `pyvim.text_edit.TextEdit` to this rope. "
+        return self.replace(edit.position, edit.end, edit.inserted)
+
+    def slice(self, start, end):
+        """
+        Return the text between `start` and `end` as a string. Only the leaves
+        that overlap with this range are visited.
+        """
+        start = max(0, start)
+        end = min(len(self), end)
+        result = []
+
+        def visit(node, offset):
+            if offset >= end or offset + node.length <= start:
+                return
+            if node.depth == 0:
+                result.append(node.text[max(0, start - offset):end - offset])
+            else:
+                visit(node.left, offset)
+                visit(node.right, offset + node.left.length)
+
+        if start < end:
+            visit(self._root, 0)
+        return ''.join(result)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            assert step == 1, 'Steps are not supported.'
+            return self.slice(start, stop)
+
+        if index < 0:
+            index += len(self)
+        self._check_index(index)
+        return self.slice(index, index + 1)
+
+    def row_to_index(self, row):
+        """
+        Return the offset of the first character of this line.
+        """
+        if not 0 <= row < self.line_count:
+            raise IndexError('Row out of range: %r' % row)
+
+        # Find the offset right after the `row`-th line break.
+        node = self._root
+        offset = 0
+        while node.depth != 0:
+            if row <= node.left.newlines:
+                node = node.left
+            else:
+                row -= node.left.newlines
+                offset += node.left.length
+                node = node.right
+
+        if row == 0:
+            return offset
+
+        pos = -1
+        for _ in range(row):
+            pos = node.text.index('\n', pos + 1)
+        return offset + pos + 1
+
+    def index_to_row(self, index):
+        """
+        Return the (zero based) line number that contains this offset.
+        """
+        self._check_index(index)
+
+        node = self._root
+        row = 0
+        while node.depth != 0:
+            if index < node.left.length:
+                node = node.left
+            else:
+                index -= node.left.length
+                row += node.left.newlines
+                node = node.right
+
+        return row + node.text.count('\n', 0, index)
+
+    def translate_row_col_to_index(self, row, col):
+        """
+        Like `Document.translate_row_col_to_index`.
+        """
+        row = max(0, min(row, self.line_count - 1))
+        start = self.row_to_index(row)
+        if row + 1 < self.line_count:
+            end = self.row_to_index(row + 1) - 1
+        else:
+            end = len(self)
+        return start + max(0, min(col, end - start))
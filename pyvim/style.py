@@ -6,8 +6,10 @@ from prompt_toolkit.styles import Style, merge_styles
 from prompt_toolkit.styles.pygments import style_from_pygments_cls
 
 from pygments.styles import get_all_styles, get_style_by_name
+from pygments.util import ClassNotFound
 
 __all__ = (
+    'StyleRegistry',
     'generate_built_in_styles',
     'get_editor_style_by_name',
 )
@@ -37,6 +39,50 @@ def generate_built_in_styles():
     return dict((name, get_editor_style_by_name(name)) for name in get_all_styles())
 
 
+class StyleRegistry(object):
+    """
+    The styles of the colorschemes, by name.
+
+    At first, only the names are looked up. A style is created the first
+    time that it's used, and kept. (Creating the styles of all the installed
+    Pygments styles takes time, and while typing ':colorscheme', the preview
+    asks for a style on every key stroke.)
+    """
+    def __init__(self):
+        self._names = None
+        self._styles = {}
+
+    @property
+    def names(self):
+        " Sorted list with the names of all colorschemes. "
+        if self._names is None:
+            self._names = sorted(get_all_styles())
+        return self._names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def get_style(self, name):
+        """
+        Return the style for this colorscheme.
+        This raises `pygments.util.ClassNotFound` when there is no style with
+        this name.
+        """
+        try:
+            return self._styles[name]
+        except KeyError:
+            # (Don't try to import a style for every unknown name that is
+            # previewed.)
+            if name not in self:
+                raise ClassNotFound('Could not find style %r' % (name, ))
+
+            style = self._styles[name] = get_editor_style_by_name(name)
+            return style
+
+
 style_extensions = {
     # Toolbar colors.
     'toolbar.status':                '#ffffff bg:#444444',
@@ -60,6 +106,14 @@ style_extensions = {
     # Messages
     'message':                'bg:#bbee88 #222222',
 
+    # Placeholder for files that are being loaded.
+    'loading':                'italic #888888',
+
+    # Hex view of binary files.
+    'hex.offset':             '#888888',
+    'hex.ascii':              '#008800',
+    'hex.changed':            'bold #ff0000',
+
     # Welcome message
     'welcome title':          'underline',
     'welcome version':        '#8800ff',
@@ -93,6 +147,7 @@ style_extensions = {
 
     # Directory listing style.
     'pygments.directorylisting.header':    '#4444ff',
+    'pygments.directorylisting.details':   '#888888',
     'pygments.directorylisting.directory': '#ff4444 bold',
     'pygments.directorylisting.currentdirectory': '#888888',
     'pygments.directorylisting.parentdirectory': '#888888',
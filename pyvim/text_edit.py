@@ -0,0 +1,280 @@
+"""
+Description of a single change to the text of an `EditorBuffer`.
+
+prompt_toolkit only tells us *that* the text of a `Buffer` changed, not what
+changed. Everything that has to be kept in sync with the text incrementally
+(the line index, the journal, the undo history, ...) works with
+`TextEdit` objects instead of comparing full copies of the text.
+
+A change can also be described by a list of `TextEdit` objects, that are
+applied one after the other. (See `compute_line_edits`.)
+"""
+from __future__ import unicode_literals
+
+import difflib
+
+__all__ = (
+    'TextEdit',
+    'compute_text_edit',
+    'compute_line_edits',
+    'edits_apply_to',
+    'map_position',
+)
+
+#: Above this amount of changed lines, `compute_line_edits` doesn't compute
+#: a line diff, but returns one edit for the whole changed region.
+MAX_DIFF_LINES = 50000
+
+
+class TextEdit(object):
+    """
+    Replacement of `deleted` by `inserted`, at `position` in the old text.
+    """
+    __slots__ = ('position', 'deleted', 'inserted')
+
+    def __init__(self, position, deleted, inserted):
+        assert position >= 0
+        self.position = position
+        self.deleted = deleted
+        self.inserted = inserted
+
+    @property
+    def end(self):
+        " End of the deleted range, in the old text. "
+        return self.position + len(self.deleted)
+
+    @property
+    def new_end(self):
+        " End of the inserted range, in the new text. "
+        return self.position + len(self.inserted)
+
+    def inverted(self):
+        """
+        Return the `TextEdit` that undoes this one.
+        """
+        return TextEdit(self.position, self.inserted, self.deleted)
+
+    def merge(self, other):
+        """
+        Return one `TextEdit` that does the same as applying this edit and
+        then `other`, or `None` when the edits don't overlap or touch.
+        (Typing a word results in one edit this way.)
+        """
+        a0 = self.position
+        a1 = self.new_end
+        b0 = other.position
+        b1 = other.end
+
+        if b0 > a1 or b1 < a0:
+            return None
+
+        # Text that `other` deletes in front of and after our inserted text
+        # comes from the original text.
+        deleted = other.deleted[:max(0, a0 - b0)] + self.deleted
+        if b1 > a1:
+            deleted += other.deleted[len(other.deleted) - (b1 - a1):]
+
+        # Our inserted text that `other` doesn't delete stays.
+        inserted = self.inserted[:max(0, b0 - a0)] + other.inserted
+        if a1 > b1:
+            inserted += self.inserted[len(self.inserted) - (a1 - b1):]
+
+        return TextEdit(min(a0, b0), deleted, inserted)
+
+    def apply(self, text):
+        """
+        Apply this edit to `text` and return the result.
+        """
+        return text[:self.position] + self.inserted + text[self.end:]
+
+    def applies_to(self, old_text, new_text):
+        """
+        Cheap consistency check: True when this edit could turn `old_text`
+        into `new_text`. (Only looks at the lengths and the edited region.)
+        """
+        return (
+            len(new_text) == len(old_text) - len(self.deleted) + len(self.inserted) and
+            self.end <= len(old_text) and
+            new_text[self.position:self.new_end] == self.inserted)
+
+    def __eq__(self, other):
+        return (isinstance(other, TextEdit) and
+                self.position == other.position and
+                self.deleted == other.deleted and
+                self.inserted == other.inserted)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%r, %r, %r)' % (
+            self.__class__.__name__, self.position, self.deleted, self.inserted)
+
+
+# Comparing slices of this size is a plain `memcmp`. We start with small
+# slices, because most edits are close to the cursor, and grow them
+# exponentially, so that scanning a huge common region is still cheap.
+_MIN_CHUNK = 1024
+_MAX_CHUNK = 1024 * 1024
+
+
+def _common_prefix_length(a, b, limit):
+    pos = 0
+    chunk = _MIN_CHUNK
+
+    while pos < limit:
+        end = min(pos + chunk, limit)
+        if a[pos:end] == b[pos:end]:
+            pos = end
+            chunk = min(chunk * 2, _MAX_CHUNK)
+        else:
+            # Binary search in this chunk.
+            lo, hi = pos, end
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if a[lo:mid + 1] == b[lo:mid + 1]:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+    return limit
+
+
+def _common_suffix_length(a, b, limit):
+    len_a = len(a)
+    len_b = len(b)
+    length = 0
+    chunk = _MIN_CHUNK
+
+    while length < limit:
+        new_length = min(length + chunk, limit)
+        if a[len_a - new_length:len_a - length] == b[len_b - new_length:len_b - length]:
+            length = new_length
+            chunk = min(chunk * 2, _MAX_CHUNK)
+        else:
+            # Binary search in this chunk.
+            lo, hi = length, new_length
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if a[len_a - mid:len_a - lo] == b[len_b - mid:len_b - lo]:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            return lo
+    return limit
+
+
+def compute_text_edit(old_text, new_text):
+    """
+    Return the smallest `TextEdit` that turns `old_text` into `new_text`, or
+    `None` when both are equal.
+
+    This is the fallback for changes that we don't know anything about (like
+    setting `Buffer.text` directly). It strips the common prefix and suffix.
+    """
+    if old_text is new_text:
+        return None
+
+    start = _common_prefix_length(old_text, new_text, min(len(old_text), len(new_text)))
+
+    if start == len(old_text) == len(new_text):
+        return None
+
+    suffix = _common_suffix_length(
+        old_text, new_text, min(len(old_text), len(new_text)) - start)
+
+    return TextEdit(start,
+                    old_text[start:len(old_text) - suffix],
+                    new_text[start:len(new_text) - suffix])
+
+
+def _split_lines(text):
+    " Split into lines, keeping the line endings. (Only '\\n'.) "
+    parts = text.split('\n')
+    lines = [p + '\n' for p in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def compute_line_edits(old_text, new_text, max_lines=MAX_DIFF_LINES):
+    """
+    Return a list of `TextEdit` objects that turns `old_text` into
+    `new_text`, replacing only the lines that are different. The edits are
+    sorted by position, and every position is in the text as it is after
+    applying the edits in front of it.
+
+    The common prefix and suffix are stripped first, so the line diff only
+    runs over the changed region. (When that region has more than
+    `max_lines` lines, one edit is returned for the whole region.)
+    """
+    edit = compute_text_edit(old_text, new_text)
+    if edit is None:
+        return []
+
+    # Expand to whole lines. (Prefix and suffix are the same in both texts.)
+    start = old_text.rfind('\n', 0, edit.position) + 1
+
+    end = old_text.find('\n', edit.end)
+    end = len(old_text) if end == -1 else end + 1
+    new_end = edit.new_end + end - edit.end
+
+    a = _split_lines(old_text[start:end])
+    b = _split_lines(new_text[start:new_end])
+
+    if len(a) + len(b) > max_lines:
+        return [edit]
+
+    # Offsets of the new lines, relative to `start`.
+    offsets = [0]
+    for line in b:
+        offsets.append(offsets[-1] + len(line))
+
+    result = []
+    matcher = difflib.SequenceMatcher(None, a, b)
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            result.append(TextEdit(
+                start + offsets[j1], ''.join(a[i1:i2]), ''.join(b[j1:j2])))
+
+    return result
+
+
+def edits_apply_to(edits, old_text, new_text):
+    """
+    Like `TextEdit.applies_to`, for a list of edits as returned by
+    `compute_line_edits`.
+    """
+    length = len(old_text)
+    previous_end = 0
+
+    for edit in edits:
+        if edit.position < previous_end or edit.end > length:
+            return False
+
+        length += len(edit.inserted) - len(edit.deleted)
+        previous_end = edit.new_end
+
+        # Edits that come later don't move this one.
+        if new_text[edit.position:edit.new_end] != edit.inserted:
+            return False
+
+    return length == len(new_text)
+
+
+def map_position(position, edits):
+    """
+    Return where `position` ends up after applying this (sorted) list of
+    edits. Positions in a replaced region stay at the same offset in the
+    new text of that region, as far as possible. (Text that is inserted at
+    `position` ends up in front of it.)
+    """
+    for edit in edits:
+        if position < edit.position:
+            break
+        elif position >= edit.end:
+            position += len(edit.inserted) - len(edit.deleted)
+        else:
+            return edit.position + min(position - edit.position, len(edit.inserted))
+    return position
@@ -0,0 +1,286 @@
+"""
+Undo history that stores `TextEdit` deltas instead of copies of the text.
+
+The undo stack of a prompt_toolkit `Buffer` contains the full text for every
+undo step. Here, every step only holds the edits that were made after it,
+so the memory scales with the size of the edits, not with the size of the
+text. Consecutive edits that touch each other (like typing a word) are
+merged into one edit.
+
+The history can be written to an undo file, and read back in another
+session, as long as the text is still the same. (':set undofile')
+
+Every version of the text gets a `state` number, so that the editor can tell
+whether the text is back at the saved version, without comparing the text.
+"""
+from __future__ import unicode_literals
+
+from .journal import location_file_prefix, text_digest
+from .text_edit import TextEdit
+
+import itertools
+import os
+import struct
+import zlib
+
+__all__ = (
+    'UndoHistory',
+    'undo_file_path',
+)
+
+MAGIC = b'PYVIMUNDO1\n'
+
+_DIGEST = struct.Struct('<QI')
+_COUNTS = struct.Struct('<II')
+_STEP = struct.Struct('<QI')
+_EDIT = struct.Struct('<QII')
+_CRC = struct.Struct('<I')
+
+
+# Unique numbers for the versions of the text, in all histories.
+_states = itertools.count()
+
+
+def undo_file_path(directory, location):
+    return os.path.join(directory, location_file_prefix(location) + 'undo')
+
+
+class _Step(object):
+    """
+    Undo step: the cursor position and the `state` of the text at the time
+    of the checkpoint, and the edits that were made after it.
+    """
+    __slots__ = ('cursor_position', 'edits', 'state')
+
+    def __init__(self, cursor_position, edits=None, state=None):
+        self.cursor_position = cursor_position
+        self.edits = edits or []
+        self.state = next(_states) if state is None else state
+
+    def add(self, edit):
+        if self.edits:
+            merged = self.edits[-1].merge(edit)
+            if merged is not None:
+                self.edits[-1] = merged
+                return
+        self.edits.append(edit)
+
+
+class UndoHistory(object):
+    """
+    Undo and redo stacks of one buffer. This follows the semantics of the
+    prompt_toolkit `Buffer` undo stack: `checkpoint` corresponds to
+    `save_to_undo_stack`.
+    """
+    def __init__(self):
+        self.clear()
+
+        #: When `False`, `record` ignores the edits. (While undoing.)
+        self.recording = True
+
+    def clear(self):
+        self._undo = []
+        self._redo = []
+
+        #: Number of the current version of the text. Changes with every
+        #: recorded edit, and returns to the previous number on undo/redo.
+        self.state = next(_states)
+
+    def new_state(self):
+        """
+        The text was changed without recording the edits. (The new version
+        can't be reached by undo or redo.)
+        """
+        self.state = next(_states)
+
+    def checkpoint(self, cursor_position, clear_redo=True):
+        """
+        Remember the current state of the text. Undo returns to this state.
+        """
+        if self._undo and not self._undo[-1].edits:
+            # Text didn't change since the previous checkpoint.
+            self._undo[-1].cursor_position = cursor_position
+            self._undo[-1].state = self.state
+        else:
+            self._undo.append(_Step(cursor_position, state=self.state))
+
+        if clear_redo:
+            self._redo = []
+
+    def record(self, edit):
+        """
+        Add a `TextEdit` that was applied to the text.
+        """
+        if self.recording:
+            self.state = next(_states)
+
+            # The redo steps only apply to the text as it was after undoing.
+            self._redo = []
+
+            # Changes before the first checkpoint can't be undone.
+            if self._undo:
+                self._undo[-1].add(edit)
+
+    def _apply(self, text, edits):
+        """
+        Apply the edits to `text`. Returns the new text, or `None` when the
+        edits didn't change the text in the end.
+
+        Only the span of the text that the edits touch is copied for every
+        edit, and compared. The new text is built once, from the new span and
+        the start and end of the text, that the edits don't touch.
+        """
+        # Length of the untouched start and end.
+        start = end = length = len(text)
+        for edit in edits:
+            start = min(start, edit.position)
+            end = min(end, length - edit.end)
+            length += len(edit.inserted) - len(edit.deleted)
+
+        span = new_span = text[start:len(text) - end]
+        for edit in edits:
+            new_span = TextEdit(edit.position - start, edit.deleted, edit.inserted).apply(new_span)
+
+        if new_span == span:
+            return None
+
+        return text[:start] + new_span + text[len(text) - end:]
+
+    def undo(self, text, cursor_position):
+        """
+        Undo the last step. Returns a (text, cursor_position, edits) tuple,
+        where `edits` are the changes that turn `text` into the result, or
+        `None` when there's nothing to undo.
+        """
+        while self._undo:
+            step = self._undo.pop()
+
+            if step.edits:
+                edits = [e.inverted() for e in reversed(step.edits)]
+                new_text = self._apply(text, edits)
+
+                # Skip steps that didn't change the text in the end, like
+                # `Buffer.undo` does.
+                if new_text is not None:
+                    self._redo.append(_Step(cursor_position, step.edits, self.state))
+                    self.state = step.state
+                    return new_text, step.cursor_position, edits
+
+    def redo(self, text, cursor_position):
+        """
+        Redo the last undone step. Returns a (text, cursor_position, edits)
+        tuple like `undo`, or `None`.
+        """
+        if self._redo:
+            self.checkpoint(cursor_position, clear_redo=False)
+
+            step = self._redo.pop()
+            self._undo[-1].edits = list(step.edits)
+            self.state = step.state
+
+            # (Undo only keeps steps that change the text.)
+            return self._apply(text, step.edits), step.cursor_position, step.edits
+
+    # Persistence.
+
+    def serialize(self):
+        """
+        Return the undo and redo steps as bytes. (Without the digest of the
+        text, see `write`.)
+        """
+        result = [_COUNTS.pack(len(self._undo), len(self._redo))]
+
+        for steps in (self._undo, self._redo):
+            for step in steps:
+                result.append(_STEP.pack(step.cursor_position, len(step.edits)))
+
+                for edit in step.edits:
+                    deleted = edit.deleted.encode('utf-8', 'surrogatepass')
+                    inserted = edit.inserted.encode('utf-8', 'surrogatepass')
+                    result.append(_EDIT.pack(edit.position, len(deleted), len(inserted)))
+                    result.append(deleted)
+                    result.append(inserted)
+
+        return b''.join(result)
+
+    def write(self, path, text, data=None):
+        """
+        Write the undo file for `text`. The result of `serialize` can be
+        passed as `data`, so that this can be called in a thread while the
+        history changes.
+        """
+        if data is None:
+            data = self.serialize()
+
+        header = MAGIC + _DIGEST.pack(*text_digest(text))
+        checksum = _CRC.pack(zlib.crc32(data, zlib.crc32(header)) & 0xffffffff)
+
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # (Write a temporary file first, so that a reader never sees a file
+        # that is only half written.)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(data)
+            f.write(checksum)
+
+        try:
+            os.replace(tmp_path, path)
+        except AttributeError:
+            # Python 2: `os.rename` replaces the destination on Posix.
+            os.rename(tmp_path, path)
+
+    @classmethod
+    def read(cls, path, text):
+        """
+        Read an undo file. Returns an `UndoHistory`, or `None` when there is
+        no valid undo file for this text.
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+
+        end = len(data) - _CRC.size
+        if not data.startswith(MAGIC) or end < len(MAGIC) + _DIGEST.size + _COUNTS.size:
+            return None
+
+        crc, = _CRC.unpack_from(data, end)
+        if zlib.crc32(data[:end]) & 0xffffffff != crc:
+            return None
+
+        pos = len(MAGIC)
+        if _DIGEST.unpack_from(data, pos) != text_digest(text):
+            return None  # The file was changed.
+        pos += _DIGEST.size
+
+        undo_count, redo_count = _COUNTS.unpack_from(data, pos)
+        pos += _COUNTS.size
+
+        def read_steps(count, pos):
+            steps = []
+            for _ in range(count):
+                cursor_position, edit_count = _STEP.unpack_from(data, pos)
+                pos += _STEP.size
+                step = _Step(cursor_position)
+
+                for _ in range(edit_count):
+                    position, deleted_size, inserted_size = _EDIT.unpack_from(data, pos)
+                    pos += _EDIT.size
+                    deleted = data[pos:pos + deleted_size].decode('utf-8', 'surrogatepass')
+                    pos += deleted_size
+                    inserted = data[pos:pos + inserted_size].decode('utf-8', 'surrogatepass')
+                    pos += inserted_size
+                    step.edits.append(TextEdit(position, deleted, inserted))
+
+                steps.append(step)
+            return steps, pos
+
+        history = cls()
+        history._undo, pos = read_steps(undo_count, pos)
+        history._redo, pos = read_steps(redo_count, pos)
+        return history
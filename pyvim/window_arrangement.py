@@ -399,8 +399,8 @@ class WindowArrangement(object):
         if show_in_current_window and self.active_tab:
             self.active_tab.show_editor_buffer(editor_buffer)
 
-        # Start reporter.
-        editor_buffer.run_reporter()
+        # (The reporter starts when `Editor.sync_with_prompt_toolkit` sees
+        # that the buffer is visible.)
 
     def _get_or_create_editor_buffer(self, location=None, text=None):
         """
@@ -473,6 +473,7 @@ class WindowArrangement(object):
         # Remove this buffer.
         index = self.editor_buffers.index(eb)
         self.editor_buffers.remove(eb)
+        eb.close()
 
         # Close the active window.
         self.active_tab.close_active_window()
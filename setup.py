@@ -22,6 +22,7 @@ setup(
         'pyflakes',        # For Python error reporting.
         'pygments',        # For the syntax highlighting.
         'docopt',          # For command line arguments.
+        'futures; python_version < "3.2"',  # For the thread pool.
     ],
     entry_points={
         'console_scripts': [
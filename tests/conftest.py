@@ -1,5 +1,8 @@
 from __future__ import unicode_literals
 
+import asyncio
+import time
+
 import pytest
 
 from prompt_toolkit.buffer import Buffer
@@ -10,8 +13,9 @@ from pyvim.window_arrangement import TabPage, EditorBuffer, Window
 
 
 @pytest.fixture
-def editor():
-    return Editor(output=DummyOutput(), input=DummyInput())
+def editor(tmpdir):
+    return Editor(config_directory=str(tmpdir.join('.pyvim')),
+                  output=DummyOutput(), input=DummyInput())
 
 
 @pytest.fixture
@@ -27,3 +31,26 @@ def window(editor_buffer):
 @pytest.fixture
 def tab_page(window):
     return TabPage(window)
+
+
+@pytest.fixture
+def run_background_jobs(editor):
+    """
+    Function that starts the queued background jobs of the editor in an
+    event loop, and runs the loop until `until()` returns True.
+    """
+    def run(until, timeout=5):
+        # (No `asyncio.run` and no `async def`: they need Python 3.7 and 3.5.)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            editor._start_pending_background_jobs()
+            deadline = time.time() + timeout
+
+            while not until():
+                assert time.time() < deadline, 'Timeout'
+                loop.run_until_complete(asyncio.sleep(0.01))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+    return run
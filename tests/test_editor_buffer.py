@@ -0,0 +1,442 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.text_edit import TextEdit, compute_line_edits, compute_text_edit, map_position
+
+
+def test_compute_text_edit():
+    assert compute_text_edit('abc', 'abc') is None
+    assert compute_text_edit('abc', 'axc') == TextEdit(1, 'b', 'x')
+    assert compute_text_edit('aaaa', 'aaaaa') == TextEdit(4, '', 'a')
+
+    big = 'x' * 100000
+    assert compute_text_edit(big, big[:5000] + 'y' + big[5000:]) == TextEdit(5000, '', 'y')
+
+
+def test_compute_line_edits():
+    old = 'a\nb\nc\nd\ne'
+    new = 'a\nB\nc\nd\nx\ne\n'
+    edits = compute_line_edits(old, new)
+
+    # Only the changed lines, in the coordinates of the partially edited text.
+    assert edits == [TextEdit(2, 'b\n', 'B\n'), TextEdit(8, 'e', 'x\ne\n')]
+
+    text = old
+    for edit in edits:
+        text = edit.apply(text)
+    assert text == new
+
+    assert compute_line_edits(old, old) == []
+    assert compute_line_edits(old, new, max_lines=3) == [compute_text_edit(old, new)]
+
+    # Positions follow their line.
+    assert map_position(old.index('d'), edits) == new.index('d')
+    assert map_position(old.index('b') + 1, edits) == new.index('B') + 1
+    assert map_position(len(old), edits) == len(new)
+
+
+def test_text_edits(editor_buffer):
+    edits = []
+    editor_buffer.text_edit_handlers.append(edits.append)
+
+    b = editor_buffer.buffer
+    b.insert_text('hello world')
+    b.cursor_position = 5
+    b.delete_before_cursor(2)
+    b.delete(1)
+    b.text = 'other'
+
+    assert edits == [
+        TextEdit(0, '', 'hello world'),
+        TextEdit(3, 'lo', ''),
+        TextEdit(3, ' ', ''),
+        TextEdit(0, 'helworld', 'other'),
+    ]
+
+
+def test_unsaved_changes(editor, tmpdir):
+    location = str(tmpdir.join('file.txt'))
+    with open(location, 'w') as f:
+        f.write('hello\n')
+
+    eb = EditorBuffer(editor, location)
+    b = eb.buffer
+    assert not eb.has_unsaved_changes
+
+    b.save_to_undo_stack()
+    b.cursor_position = 5
+    b.insert_text('!')
+    assert eb.has_unsaved_changes
+
+    # Same length, other content.
+    b.delete_before_cursor(1)
+    b.insert_text('?')
+    assert eb.has_unsaved_changes
+
+    # Undoing back to the saved state makes the buffer clean again.
+    b.undo()
+    assert b.text == 'hello'
+    assert not eb.has_unsaved_changes
+
+    b.save_to_undo_stack()
+    b.cursor_position = 5
+    b.insert_text('!')
+    eb.write()
+    assert not eb.has_unsaved_changes
+
+    # Redo and undo after writing.
+    b.undo()
+    assert b.text == 'hello' and eb.has_unsaved_changes
+    b.redo()
+    assert b.text == 'hello!' and not eb.has_unsaved_changes
+
+
+def test_unsaved_changes_without_reading_the_text(editor, tmpdir, monkeypatch):
+    location = str(tmpdir.join('file.txt'))
+    with open(location, 'w') as f:
+        f.write('hello\n')
+
+    eb = EditorBuffer(editor, location)
+    b = eb.buffer
+
+    def text_digest(text):
+        raise AssertionError('The text should not be digested.')
+    monkeypatch.setattr('pyvim.journal.text_digest', text_digest)
+    editor.swapfile = False
+
+    # Same length edits, like 'r' and '~'.
+    b.save_to_undo_stack()
+    b.transform_region(0, 1, lambda s: s.upper())
+    assert b.text == 'Hello'
+    assert eb.has_unsaved_changes
+
+    b.undo()
+    assert not eb.has_unsaved_changes
+
+
+@pytest.mark.parametrize('thread_pool', [True, False])
+def test_initial_files_load_in_background(editor, tmpdir, monkeypatch, run_background_jobs, thread_pool):
+    if not thread_pool:
+        # Without `concurrent.futures`, every job gets a thread.
+        monkeypatch.setattr('pyvim.editor.ThreadPoolExecutor', None)
+
+    locations = []
+    for i in range(3):
+        f = tmpdir.join('file%i.txt' % i)
+        f.write('content %i\n' % i)
+        locations.append(str(f))
+
+    editor.load_initial_files(locations)
+    editor_buffers = editor.window_arrangement.editor_buffers
+
+    # Read-only placeholders, until the event loop runs.
+    assert len(editor_buffers) == 3
+    for eb in editor_buffers:
+        assert eb.is_loading and eb.buffer.text == '' and eb.buffer.read_only()
+
+    run_background_jobs(lambda: not any(eb.is_loading for eb in editor_buffers))
+
+    for eb in editor_buffers:
+        assert eb.buffer.text == 'content %s' % eb.location[-5]
+        assert not eb.has_unsaved_changes and not eb.is_new
+
+
+def test_reporter_waits_until_buffer_is_shown(editor, tmpdir, run_background_jobs):
+    a = tmpdir.join('a.py')
+    a.write('import os\n')
+    b = tmpdir.join('b.py')
+    b.write('import sys\n')
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(a))
+    wa.open_buffer(str(b))
+    editor.sync_with_prompt_toolkit()
+
+    eb_a = wa.get_editor_buffer_for_location(str(a))
+    eb_b = wa.get_editor_buffer_for_location(str(b))
+    assert eb_a.is_visible and not eb_b.is_visible
+    assert len(editor._pending_background_jobs) == 1
+
+    # Showing the other buffer starts its reporter.
+    wa.show_editor_buffer(eb_b)
+    editor.sync_with_prompt_toolkit()
+
+    assert eb_b.is_visible and not eb_a.is_visible
+    assert len(editor._pending_background_jobs) == 2
+
+    run_background_jobs(lambda: eb_b.report_errors)
+    assert 'sys' in str(eb_b.report_errors[0].formatted_text)
+
+
+def test_large_file_mode(editor, tmpdir, run_background_jobs):
+    from pyvim.commands.handler import handle_command
+
+    f = tmpdir.join('big.py')
+    f.write('import os\n' * 100)
+    editor.large_file_threshold = 500
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(f))
+    editor.sync_with_prompt_toolkit()
+    eb = editor.current_editor_buffer
+
+    assert eb.is_large_file
+    assert not any(eb.features.values())
+    assert not editor._pending_background_jobs  # No reporter.
+
+    # Features can be turned on one at a time.
+    handle_command(editor, ':set pyflakes')
+    assert eb.features['pyflakes'] and not eb.features['syntax']
+    run_background_jobs(lambda: eb.report_errors)
+    assert eb.report_errors
+
+    handle_command(editor, ':set nopyflakes')
+    assert eb.report_errors == []
+
+    # Small files are opened normally.
+    small = tmpdir.join('small.py')
+    small.write('x = 1\n')
+    wa.open_buffer(str(small))
+    assert not wa.get_editor_buffer_for_location(str(small)).is_large_file
+
+
+def test_external_changes(editor, tmpdir, run_background_jobs):
+    a = tmpdir.join('a.txt')
+    a.write('a\n')
+    b = tmpdir.join('b.txt')
+    b.write('b\n')
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(a))
+    wa.open_buffer(str(b))
+    eb_a = wa.get_editor_buffer_for_location(str(a))
+    eb_b = wa.get_editor_buffer_for_location(str(b))
+    eb_b.buffer.insert_text('x')
+
+    assert editor.file_watcher.check() == []
+
+    a.write('changed a\n')
+    b.write('changed b\n')
+    changes = editor.file_watcher.check()
+    assert sorted(c[0].location for c in changes) == [str(a), str(b)]
+
+    editor._files_changed(changes)
+    assert 'b.txt was changed' in editor.message
+
+    # Clean buffers are reloaded, the others get a warning.
+    run_background_jobs(lambda: eb_a.buffer.text != 'a')
+    assert eb_a.buffer.text == 'changed a' and not eb_a.has_unsaved_changes
+    assert eb_b.buffer.text == 'xb'
+
+    # Saving records the new state.
+    eb_b.write()
+    assert eb_b.storage_stat is not None
+    assert editor.file_watcher.check() == []
+
+
+def test_reload_applies_diff(editor, tmpdir, run_background_jobs):
+    f = tmpdir.join('file.txt')
+    f.write(''.join('line %i\n' % i for i in range(100)))
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(f))
+    eb = wa.get_editor_buffer_for_location(str(f))
+    b = eb.buffer
+    b.cursor_position = b.text.index('line 50') + 3
+
+    edits = []
+    eb.text_edit_handlers.append(edits.append)
+
+    f.write(''.join('line %i\n' % i for i in range(100) if i != 10) + 'end\n')
+    eb.reload()
+    run_background_jobs(lambda: edits)
+
+    # Only the changed lines were touched, the cursor stays on its line.
+    assert edits == [
+        TextEdit(70, 'line 10\n', ''),
+        TextEdit(b.text.index('line 99'), 'line 99', 'line 99\nend'),
+    ]
+    assert b.document.current_line == 'line 50'
+    assert b.document.cursor_position_col == 3
+    assert not eb.has_unsaved_changes
+
+    # The reload can be undone.
+    b.undo()
+    assert b.text == ''.join('line %i\n' % i for i in range(100))[:-1]
+    assert eb.has_unsaved_changes
+
+
+def test_reload_while_typing(editor, tmpdir, monkeypatch):
+    from pyvim.editor_buffer import MAX_RELOAD_ATTEMPTS
+
+    f = tmpdir.join('file.txt')
+    f.write('line 1\n')
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(f))
+    eb = wa.get_editor_buffer_for_location(str(f))
+    b = eb.buffer
+
+    # The text changes every time before the reload is applied.
+    attempts = []
+
+    def run_in_background(func, callback):
+        result = func()
+        attempts.append(result)
+        b.insert_text('x')
+        callback(result)
+
+    monkeypatch.setattr(editor, 'run_in_background', run_in_background)
+
+    f.write('line 1\nline 2\n')
+    eb.reload()
+
+    # Compared again a few times, then applied to the current text.
+    assert len(attempts) == MAX_RELOAD_ATTEMPTS
+    assert b.text == 'line 1\nline 2'
+    assert not eb.has_unsaved_changes
+
+
+def test_follow(editor, tmpdir, run_background_jobs):
+    f = tmpdir.join('file.log')
+    f.write('line 1\nline 2\n')
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(f))
+    eb = wa.get_editor_buffer_for_location(str(f))
+    b = eb.buffer
+    eb.follow()
+    assert eb.following
+
+    # Only the new data is appended. The cursor moves along on the last line.
+    b.cursor_position = len(b.text)
+    with open(str(f), 'a') as fp:
+        fp.write('line 3\n')
+    eb.storage_changed(editor.file_watcher.check()[0][1])
+    run_background_jobs(lambda: 'line 3' in b.text)
+
+    assert b.text == 'line 1\nline 2\nline 3'
+    assert b.document.current_line == 'line 3'
+    assert not eb.has_unsaved_changes
+    assert editor.file_watcher.check() == []
+
+    # Truncated files are read again.
+    f.write('other\n')
+    eb.storage_changed(editor.file_watcher.check()[0][1])
+    run_background_jobs(lambda: b.text == 'other')
+
+    eb.follow(enable=False)
+    assert not eb.following
+
+
+def test_follow_data_appended_while_reading(editor, tmpdir, monkeypatch, run_background_jobs):
+    from pyvim.io.backends import FileIO
+
+    f = tmpdir.join('file.log')
+    f.write('line 1\n')
+
+    # Data that is appended after the file was read, but before the buffer
+    # recorded the stat, is not skipped.
+    load = FileIO.load
+
+    def load_and_append(self, location):
+        result = load(self, location)
+        with open(location, 'a') as fp:
+            fp.write('line 2\n')
+        return result
+
+    monkeypatch.setattr(FileIO, 'load', load_and_append)
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(f))
+    eb = wa.get_editor_buffer_for_location(str(f))
+    monkeypatch.setattr(FileIO, 'load', load)
+    assert eb.buffer.text == 'line 1'
+
+    eb.follow()
+    run_background_jobs(lambda: 'line 2' in eb.buffer.text)
+    assert eb.buffer.text == 'line 1\nline 2'
+    assert not eb.has_unsaved_changes
+
+    with open(str(f), 'a') as fp:
+        fp.write('line 3\n')
+    eb.storage_changed(editor.file_watcher.check()[0][1])
+    run_background_jobs(lambda: 'line 3' in eb.buffer.text)
+    assert eb.buffer.text == 'line 1\nline 2\nline 3'
+    assert not eb.has_unsaved_changes
+
+
+def test_binary_file_in_hex_view(editor, tmpdir):
+    from pyvim.hex_view import HexControl
+
+    f = tmpdir.join('file.bin')
+    f.write_binary(b'\x7fELF\x00' + b'\x00' * 20)
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(f))
+    eb = wa.get_editor_buffer_for_location(str(f))
+
+    # Not decoded.
+    assert eb.binary_file is not None
+    assert eb.buffer.text == '' and eb.buffer.read_only()
+
+    # Not reported as changed by the file watcher.
+    assert editor.file_watcher.check() == []
+
+    control = HexControl(eb.binary_file)
+    content = control.create_content(80, 10)
+    assert content.line_count == 2
+    assert ''.join(text for _, text in content.get_line(0)) == (
+        '00000000  7f 45 4c 46 00 00 00 00  00 00 00 00 00 00 00 00  .ELF............')
+
+    control.move(1)
+    for digit in '6c6':
+        control.type_digit(digit)
+    assert control.offset == 2 and control.nibble == 1
+    assert eb.has_unsaved_changes
+
+    eb.write()
+    assert not eb.has_unsaved_changes
+    assert f.read_binary()[:5] == b'\x7fllF\x00'
+
+
+def test_binary_file_loaded_in_background(editor, tmpdir, run_background_jobs):
+    f = tmpdir.join('file.bin')
+    f.write_binary(b'\x7fELF\x00' + b'\x00' * 20)
+
+    # The file is not opened before the event loop runs.
+    editor.load_initial_files([str(f)])
+    eb = editor.window_arrangement.editor_buffers[0]
+    assert eb.is_loading and eb.binary_file is None
+
+    run_background_jobs(lambda: not eb.is_loading)
+    assert eb.binary_file is not None and eb.buffer.text == ''
+
+
+def test_line_endings_are_preserved(editor, tmpdir):
+    from pyvim.commands.handler import handle_command
+
+    f = tmpdir.join('file.txt')
+    f.write_binary(b'line 1\r\nline 2')
+
+    wa = editor.window_arrangement
+    wa.open_buffer(str(f))
+    editor.sync_with_prompt_toolkit()
+    eb = wa.get_editor_buffer_for_location(str(f))
+    assert eb.buffer.text == 'line 1\nline 2'
+    assert (eb.fileformat, eb.eol) == ('dos', False)
+
+    eb.buffer.text += '\nline 3'
+    eb.write()
+    assert f.read_binary() == b'line 1\r\nline 2\r\nline 3'
+
+    # Changing the format is a change that has to be written.
+    handle_command(editor, ':set ff=unix')
+    handle_command(editor, ':set eol')
+    assert eb.has_unsaved_changes
+
+    eb.write()
+    assert f.read_binary() == b'line 1\nline 2\nline 3\n'
+    assert not eb.has_unsaved_changes
@@ -0,0 +1,94 @@
+from __future__ import unicode_literals
+
+from six.moves import BaseHTTPServer
+
+import threading
+
+import pytest
+
+from pyvim.io import HttpIO
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive.
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get('If-None-Match')))
+        server.connections.add(self.client_address)
+
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/file.txt')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path == '/missing':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            body = server.files[self.path]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            if server.etag:
+                self.send_header('ETag', server.etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *a):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _Handler)
+    server.files = {
+        '/file.txt': 'h\xe9llo\n'.encode('utf-8') * 1000,
+        '/latin.txt': 'h\xe9llo\n'.encode('latin-1'),
+        '/latin-end.txt': 'hello \xc3'.encode('latin-1'),
+    }
+    server.etag = '"v1"'
+    server.requests = []
+    server.connections = set()
+    server.url = 'http://127.0.0.1:%i' % server.server_address[1]
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_cache(server, tmpdir):
+    io = HttpIO(cache_directory=str(tmpdir), timeout=5)
+    url = server.url + '/file.txt'
+
+    assert io.read(url) == ('h\xe9llo\n' * 1000, 'utf-8')
+
+    # The second request is conditional, the body comes from the cache.
+    server.files['/file.txt'] = b'changed'
+    assert io.read(url) == ('h\xe9llo\n' * 1000, 'utf-8')
+    assert server.requests == [('/file.txt', None), ('/file.txt', '"v1"')]
+
+    # New version.
+    server.etag = '"v2"'
+    assert io.read(url) == ('changed', 'utf-8')
+
+    # Only one connection was used.
+    assert len(server.connections) == 1
+
+
+def test_http_redirects_and_errors(server, tmpdir):
+    io = HttpIO(timeout=5)
+    assert io.read(server.url + '/redirect') == ('h\xe9llo\n' * 1000, 'utf-8')
+    assert io.read(server.url + '/latin.txt') == ('h\xe9llo\n', 'latin-1')
+
+    # Ends with what looks like the start of a UTF-8 sequence.
+    assert io.read(server.url + '/latin-end.txt') == ('hello \xc3', 'latin-1')
+
+    with pytest.raises(IOError):
+        io.read(server.url + '/missing')
@@ -0,0 +1,321 @@
+from __future__ import unicode_literals
+
+import codecs
+import gc
+import gzip
+import os
+import warnings
+
+import pytest
+
+from pyvim.io import FileIO, GZipFileIO, BZ2FileIO, XZFileIO, DirectoryIO, directory_entry_name, is_binary
+
+
+@pytest.fixture
+def tmp_file(tmpdir):
+    return str(tmpdir.join('file.txt'))
+
+
+@pytest.mark.parametrize('encoding,bom', [
+    ('utf-8-sig', codecs.BOM_UTF8),
+    ('utf-16-le', codecs.BOM_UTF16_LE),
+    ('utf-16-be', codecs.BOM_UTF16_BE),
+    ('utf-32-le', codecs.BOM_UTF32_LE),
+    ('utf-32-be', codecs.BOM_UTF32_BE),
+])
+def test_byte_order_marks(tmp_file, encoding, bom):
+    with open(tmp_file, 'wb') as f:
+        f.write(bom + 'h\xe9llo\n'.encode(encoding.replace('-sig', '')))
+
+    text, detected_encoding = FileIO().read(tmp_file)
+    assert text == 'h\xe9llo\n'
+    assert detected_encoding == encoding
+
+    # Written back with the same byte order mark.
+    FileIO().write(tmp_file, 'bye\n', detected_encoding)
+    with open(tmp_file, 'rb') as f:
+        assert f.read() == bom + 'bye\n'.encode(encoding.replace('-sig', ''))
+
+
+def test_latin_1_fallback(tmp_file):
+    with open(tmp_file, 'wb') as f:
+        f.write('abc\n'.encode('utf-8') * 1000 + 'd\xe9f\n'.encode('latin-1'))
+
+    text, encoding = FileIO().read(tmp_file)
+    assert encoding == 'latin-1'
+    assert text.endswith('d\xe9f\n')
+
+
+def test_byte_order_mark_fallback(tmpdir):
+    # Latin-1 text that starts like UTF-16, but isn't valid UTF-16.
+    data = '\xff\xfeab\n'.encode('latin-1')
+
+    location = str(tmpdir.join('file.txt'))
+    with open(location, 'wb') as f:
+        f.write(data)
+    assert FileIO().read(location) == ('\xff\xfeab\n', 'latin-1')
+    assert FileIO().load(location) == ('\xff\xfeab', 'latin-1', 'unix', True)
+
+    location = str(tmpdir.join('file.txt.gz'))
+    with gzip.open(location, 'wb') as f:
+        f.write(data)
+    assert GZipFileIO().read(location) == ('\xff\xfeab\n', 'latin-1')
+
+
+def test_empty_file(tmp_file):
+    open(tmp_file, 'wb').close()
+    assert FileIO().read(tmp_file) == ('', 'utf-8')
+
+
+@pytest.mark.parametrize('data,expected', [
+    (b'a\nb\n', ('a\nb', 'utf-8', 'unix', True)),
+    (b'a\r\nb\r\n', ('a\nb', 'utf-8', 'dos', True)),
+    (b'a\r\nb', ('a\nb', 'utf-8', 'dos', False)),
+    (b'a\nb\r\n', ('a\nb\r', 'utf-8', 'unix', True)),  # Only the first line counts.
+    (b'\xef\xbb\xbfa\r\n', ('a', 'utf-8-sig', 'dos', True)),
+    (b'd\xe9f\r\n', ('d\xe9f', 'latin-1', 'dos', True)),
+    (b'', ('', 'utf-8', 'unix', False)),
+    (codecs.BOM_UTF16_LE + 'a\r\nb\r\n'.encode('utf-16-le'), ('a\nb', 'utf-16-le', 'dos', True)),
+])
+def test_load_line_endings(tmp_file, data, expected):
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+
+    assert FileIO().load(tmp_file) == expected
+
+
+def test_read_preview(tmp_file):
+    with open(tmp_file, 'wb') as f:
+        f.write(''.join('line %i\n' % i for i in range(1000)).encode('utf-8'))
+
+    assert FileIO().read_preview(tmp_file, 3) == 'line 0\nline 1\nline 2\n'
+    assert FileIO().size(tmp_file) == os.path.getsize(tmp_file)
+
+
+def test_file_tail(tmp_file):
+    with open(tmp_file, 'wb') as f:
+        f.write(b'line 1\n')
+
+    tail = FileIO().follow(tmp_file, 'utf-8', offset=os.path.getsize(tmp_file))
+    assert tail.read() == ('', False)
+
+    # Partial characters and line endings are completed by the next write.
+    with open(tmp_file, 'ab') as f:
+        f.write('line 2 \u20ac'.encode('utf-8')[:-1])
+    assert tail.read() == ('\nline 2 ', False)
+
+    with open(tmp_file, 'ab') as f:
+        f.write('\u20ac'.encode('utf-8')[-1:] + b'\r')
+    assert tail.read() == ('\u20ac', False)
+
+    with open(tmp_file, 'ab') as f:
+        f.write(b'\nline 3\n')
+    assert tail.read() == ('\nline 3', False)
+
+    # Truncation starts again.
+    with open(tmp_file, 'wb') as f:
+        f.write(b'new\n')
+    assert tail.read() == ('new', True)
+
+    # So does replacing the file. (Log rotation.)
+    os.rename(tmp_file, tmp_file + '.1')
+    with open(tmp_file, 'wb') as f:
+        f.write(b'rotated, but longer\n')
+    assert tail.read() == ('rotated, but longer', True)
+
+    assert FileIO().follow(tmp_file, 'utf-16-le', 0) is None
+
+
+def test_binary_file(tmp_file):
+    with open(tmp_file, 'wb') as f:
+        f.write(b'\x00\x01\x02\x03' * 4)
+
+    assert FileIO().open_binary(__file__) is None
+    assert not is_binary(codecs.BOM_UTF16_LE + 'text'.encode('utf-16-le'))
+
+    binary_file = FileIO().open_binary(tmp_file)
+    binary_file.patch(1, 0xff)
+    binary_file.patch(2, 0xfe)
+    binary_file.patch(9, 0x01)  # Same as the original.
+    binary_file.patch(12, 0xaa)
+    binary_file.patch(12, 0xbb)
+
+    assert binary_file.read(0, 4) == bytearray(b'\x00\xff\xfe\x03')
+    assert sorted(binary_file.patches) == [1, 2, 12]
+
+    assert binary_file.undo() == 12
+    assert binary_file.read(12, 1) == bytearray(b'\xaa')
+
+    # Only the changed bytes are written.
+    binary_file.write()
+    assert binary_file.patches == {}
+    with open(tmp_file, 'rb') as f:
+        assert f.read() == b'\x00\xff\xfe\x03' + b'\x00\x01\x02\x03' * 2 + b'\xaa\x01\x02\x03'
+    binary_file.close()
+
+
+def test_write_is_atomic(tmp_file, monkeypatch):
+    with open(tmp_file, 'wb') as f:
+        f.write(b'original\n')
+    os.chmod(tmp_file, 0o640)
+
+    # A failure halfway leaves the original file, and no temporary file.
+    def chunks():
+        yield 'new'
+        raise IOError('Disk full')
+
+    with pytest.raises(IOError):
+        FileIO().write_chunks(tmp_file, chunks(), 'utf-8')
+
+    with open(tmp_file, 'rb') as f:
+        assert f.read() == b'original\n'
+    assert os.listdir(os.path.dirname(tmp_file)) == ['file.txt']
+
+    # A successful write replaces the file, and keeps the permissions.
+    FileIO(fsync=True).write_chunks(tmp_file, ['new', ' text\n'], 'utf-8')
+
+    with open(tmp_file, 'rb') as f:
+        assert f.read() == b'new text\n'
+    assert os.stat(tmp_file).st_mode & 0o777 == 0o640
+
+
+def test_write_through_symlink(tmpdir):
+    target = tmpdir.join('target.txt')
+    target.write('old\n')
+    link = tmpdir.join('link.txt')
+    os.symlink(str(target), str(link))
+
+    FileIO().write(str(link), 'new\n', 'utf-8')
+
+    assert os.path.islink(str(link))
+    assert target.read() == 'new\n'
+
+
+def test_write_hard_link_and_new_file(tmpdir):
+    original = tmpdir.join('original.txt')
+    original.write('old\n')
+    link = tmpdir.join('link.txt')
+    os.link(str(original), str(link))
+
+    # A failure halfway leaves the file untouched, also with hard links.
+    def chunks():
+        yield 'new'
+        raise IOError('Disk full')
+
+    with pytest.raises(IOError):
+        FileIO().write_chunks(str(link), chunks(), 'utf-8')
+    assert original.read() == 'old\n'
+
+    # The link is kept.
+    FileIO().write(str(link), 'new\n', 'utf-8')
+    assert original.read() == 'new\n'
+    assert sorted(os.listdir(str(tmpdir))) == ['link.txt', 'original.txt']
+
+    # New files get the permissions of the umask.
+    umask = os.umask(0o027)
+    try:
+        FileIO().write(str(tmpdir.join('new.txt')), 'new\n', 'utf-8')
+    finally:
+        os.umask(umask)
+    assert os.stat(str(tmpdir.join('new.txt'))).st_mode & 0o777 == 0o640
+
+
+def test_gzip_write_chunks(tmpdir):
+    location = str(tmpdir.join('file.txt.gz'))
+    GZipFileIO().write_chunks(location, ['a' * 100000, 'b\n'], 'utf-8')
+
+    assert GZipFileIO().read(location) == ('a' * 100000 + 'b\n', 'utf-8')
+
+
+@pytest.mark.parametrize('io_class,extension', [
+    (GZipFileIO, '.gz'),
+    (BZ2FileIO, '.bz2'),
+    (XZFileIO, '.xz'),
+])
+def test_compressed_files(tmpdir, monkeypatch, io_class, extension):
+    location = str(tmpdir.join('file.txt' + extension))
+    text = ''.join('line %i \xe9\n' % i for i in range(20000))
+
+    io = io_class(compression_level=1)
+    assert io.can_open_location(location)
+    assert not io.can_open_location(str(tmpdir.join('file.txt')))
+
+    io.write_chunks(location, [text[:1001], text[1001:]], 'utf-8')
+    assert io.read(location) == (text, 'utf-8')
+
+    # Decoding falls back to latin-1, also when the first pieces are valid.
+    # The file is decompressed only once.
+    monkeypatch.setattr('pyvim.io.backends.READ_CHUNK_SIZE', 1000)
+    monkeypatch.setattr('pyvim.io.backends.SPOOL_SIZE', 10000)
+    open_read = io._open_read
+    opened = []
+    monkeypatch.setattr(io, '_open_read', lambda location: opened.append(location) or open_read(location))
+
+    for latin_text in [text, 'x' * 5000 + text, 'x' * 5000 + '\xc3']:
+        del opened[:]
+        io.write(location, latin_text, 'latin-1')
+        assert io.read(location) == (latin_text, 'latin-1')
+        assert opened == [location]
+
+    io.write(location, 'bom', 'utf-16-le')
+    assert io.read(location) == ('bom', 'utf-16-le')
+
+
+def test_parallel_compression(tmpdir, monkeypatch):
+    futures = pytest.importorskip('concurrent.futures')
+    monkeypatch.setattr('pyvim.io.backends.COMPRESS_BLOCK_SIZE', 1000)
+    monkeypatch.setattr('pyvim.io.backends.MAX_PENDING_BLOCKS', 2)
+    monkeypatch.setattr('pyvim.io.backends._cpu_count', lambda: 4)
+    monkeypatch.setattr('pyvim.io.backends.WRITE_CHUNK_SIZE', 100)
+
+    location = str(tmpdir.join('file.txt.gz'))
+    text = ''.join('line %i\n' % i for i in range(10000))
+
+    with futures.ThreadPoolExecutor(4) as executor:
+        GZipFileIO(executor=lambda: executor).write(location, text, 'utf-8')
+
+    # Concatenated gzip members.
+    with open(location, 'rb') as f:
+        assert f.read().count(b'\x1f\x8b\x08') > 10
+
+    assert GZipFileIO().read(location) == (text, 'utf-8')
+
+
+def test_directory_listing(tmpdir, monkeypatch):
+    tmpdir.mkdir('sub')
+    tmpdir.join('b.txt').write('x' * 2048)
+    tmpdir.join('a.txt').write('')
+    path = str(tmpdir)
+
+    io = DirectoryIO()
+    text, _ = io.read(path)
+    assert text.splitlines()[5:] == ['../', './', 'sub/', 'a.txt', 'b.txt']
+
+    # Cached, until the directory changes.
+    monkeypatch.setattr('pyvim.io.backends._scan_directory', None)
+    assert io.read(path)[0] == text
+    monkeypatch.undo()
+
+    tmpdir.join('c.txt').write('')
+    os.utime(path, (0, 0))  # (Modification time could be in the same tick.)
+    assert io.read(path)[0].endswith('b.txt\nc.txt\n')
+
+    # Details.
+    lines = DirectoryIO(show_details=True).read(path)[0].splitlines()
+    assert lines[7].split()[0] == '-' and lines[7].endswith('  sub/')
+    assert lines[9].split()[0] == '2.0K' and lines[9].endswith('  b.txt')
+    assert [directory_entry_name(l) for l in lines[5:]] == [
+        '../', './', 'sub/', 'a.txt', 'b.txt', 'c.txt']
+
+    # Big directories are read in the background. (Unless cached.)
+    assert DirectoryIO().read_preview(path, 10) is None
+    monkeypatch.setattr('pyvim.io.backends.LARGE_DIRECTORY_SIZE', 2)
+    assert DirectoryIO().read_preview(path, 10).endswith('../\n./\n')
+    assert io.read_preview(path, 10) is None
+
+    # The directory is closed, also when it was not read until the end.
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        DirectoryIO().read_preview(path, 10)
+        gc.collect()
+    assert not [w for w in caught if w.category.__name__ == 'ResourceWarning']
@@ -0,0 +1,128 @@
+from __future__ import unicode_literals
+
+import errno
+import os
+
+import pytest
+
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.journal import Journal, JournalWriter, JournalError, read_journal
+from pyvim.text_edit import compute_text_edit
+
+
+@pytest.fixture
+def writer(tmpdir):
+    writer = JournalWriter(str(tmpdir.join('swap')))
+    yield writer
+    writer.close()
+
+
+def _journal_changes(writer, texts, snapshot=False):
+    journal = Journal(writer, '/tmp/file.txt')
+    journal.start(texts[0], snapshot=snapshot)
+    for old, new in zip(texts, texts[1:]):
+        journal.append(compute_text_edit(old, new))
+    writer.flush()
+    return journal
+
+
+def test_replay(writer):
+    texts = ['hello', 'hello world', 'hello w\xf6rld\n\U0001f600', 'w\xf6rld\n\U0001f600']
+    journal = _journal_changes(writer, texts)
+
+    recovered = read_journal(journal.path)
+    assert recovered.location == '/tmp/file.txt'
+    assert recovered.replay('hello') == texts[-1]
+
+    # The base text has to match.
+    with pytest.raises(JournalError):
+        recovered.replay('other')
+
+
+def test_snapshot(writer):
+    journal = _journal_changes(writer, ['unsaved', 'unsaved text'], snapshot=True)
+    assert read_journal(journal.path).replay('anything') == 'unsaved text'
+
+
+def test_snapshot_only_for_unsaved_base(editor, tmpdir):
+    f = tmpdir.join('file.txt')
+    f.write('saved\n')
+
+    eb = EditorBuffer(editor, str(f))
+    eb.buffer.save_to_undo_stack()
+    eb.buffer.insert_text('a')
+    editor.journal_writer.flush()
+    assert read_journal(eb._journal.path).snapshot is None
+
+    # Undo back to the saved text, and change it while journaling is off.
+    eb.buffer.undo()
+    eb._discard_journal()
+    editor.swapfile = False
+    eb.buffer.insert_text('b')
+    editor.swapfile = True
+
+    eb.buffer.insert_text('c')
+    editor.journal_writer.flush()
+    assert read_journal(eb._journal.path).snapshot == 'bsaved'
+
+
+def test_failing_flush_drops_journal(writer, monkeypatch):
+    class FullFile(object):
+        " File on a full disk. "
+        def __init__(self, path, mode):
+            self._file = open(path, mode)
+            self.write = self._file.write
+
+        def flush(self):
+            raise IOError(errno.ENOSPC, 'No space left on device')
+
+        def close(self):
+            self._file.close()
+            self.flush()
+
+    monkeypatch.setattr('pyvim.journal.open', FullFile, raising=False)
+    journal = _journal_changes(writer, ['a', 'ab'])
+    assert journal._file is None
+    monkeypatch.undo()
+
+    # The writer is still running.
+    journal = _journal_changes(writer, ['a', 'ab'])
+    assert read_journal(journal.path).replay('a') == 'ab'
+
+
+def test_incomplete_record_is_ignored(writer):
+    journal = _journal_changes(writer, ['a', 'ab', 'abc'])
+
+    with open(journal.path, 'rb+') as f:
+        f.truncate(os.path.getsize(journal.path) - 2)
+
+    assert read_journal(journal.path).replay('a') == 'ab'
+
+
+def test_recover_editor_buffer(editor, tmpdir):
+    f = tmpdir.join('file.txt')
+    f.write('line 1\nline 2\n')
+
+    eb = EditorBuffer(editor, str(f))
+    eb.buffer.cursor_position = 0
+    eb.buffer.insert_text('new ')
+    eb.buffer.text += '\nline 3'
+    editor.journal_writer.flush()
+
+    # Simulate a crash: the swap file belongs to another process now.
+    path = eb._journal.path
+    os.rename(path, path.replace('.%i.swp' % os.getpid(), '.1.swp'))
+
+    eb2 = EditorBuffer(editor, str(f))
+    assert len(eb2.swap_files) == 1
+    assert not eb2.has_unsaved_changes
+
+    eb2.recover()
+    assert eb2.buffer.text == 'new line 1\nline 2\nline 3'
+    assert eb2.has_unsaved_changes
+    assert eb2.swap_files == []
+
+    # Writing the file removes the swap file.
+    eb2.write()
+    editor.journal_writer.flush()
+    assert os.listdir(editor.swap_directory) == []
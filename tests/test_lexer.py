@@ -0,0 +1,165 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from prompt_toolkit.document import Document
+from prompt_toolkit.lexers import PygmentsLexer
+from pygments.lexers import JsonLexer
+from pygments.token import Generic, Keyword, Literal, Name, Number, Punctuation, String
+
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.fast_lexers import (
+    JsonFastLexer, LogFastLexer, PythonFastLexer, YamlFastLexer)
+from pyvim.lexer import DocumentLexer
+
+
+def test_lexer_is_cached(editor):
+    eb = EditorBuffer(editor, text='x = 1\n')
+    eb.location = 'file.py'
+    lexer = DocumentLexer(eb)
+
+    resolved = lexer._get_lexer()
+    hash = lexer.invalidation_hash()
+    get_line = lexer.lex_document(Document('x = 1\n'))
+    assert ('class:pygments.name', 'x') in get_line(0)
+    assert lexer._get_lexer() is resolved
+
+    # Turning off syntax highlighting or another location resolves again.
+    eb.set_feature('syntax', False)
+    assert lexer.invalidation_hash() != hash
+    assert lexer.lex_document(Document('x = 1\n'))(0) == [('', 'x = 1')]
+
+    eb.set_feature('syntax', True)
+    eb.location = 'file.json'
+    assert lexer._get_lexer() is not resolved
+
+
+@pytest.mark.parametrize('fast_lexers', [False, True])
+def test_incremental_highlighting(editor, run_background_jobs, fast_lexers):
+    editor.fast_lexers = fast_lexers
+    text = ''.join('def f%i(a):\n    return a  # %i\n\n' % (i, i) for i in range(1000))
+    eb = EditorBuffer(editor, text=text)
+    eb.location = 'file.py'
+    lexer = DocumentLexer(eb)
+    highlighter = lexer._get_lexer()
+
+    def highlight(rows):
+        # (Wait for the lines that are highlighted in the background.)
+        get_line = lexer.lex_document(Document(eb.buffer.text))
+        result = [get_line(row) for row in rows]
+
+        while highlighter.is_highlighting:
+            run_background_jobs(lambda: not highlighter.is_highlighting)
+            result = [get_line(row) for row in rows]
+        return result
+
+    def expected(rows):
+        # (Without the empty fragments.)
+        pygments_lexer = type(highlighter.pygments_lexer)
+        get_line = PygmentsLexer(pygments_lexer).lex_document(Document(eb.buffer.text))
+        return [[f for f in get_line(row) if f[1]] for row in rows]
+
+    rows = list(range(1500, 1550))
+    assert highlight(rows) == expected(rows)
+
+    # Typing in a line highlights only that line again.
+    count = highlighter.lexed_line_count
+    position = eb.buffer.text.index('return a  # 510')
+    eb.buffer.text = eb.buffer.text[:position] + 'b + ' + eb.buffer.text[position:]
+    assert highlight(rows) == expected(rows)
+    assert highlighter.lexed_line_count - count == 1
+
+    # Opening a string changes the highlighting of all the lines below it.
+    eb.buffer.text = eb.buffer.text[:position] + '"""' + eb.buffer.text[position:]
+    assert highlight(rows) == expected(rows)
+    assert highlight([2990, 2999]) == expected([2990, 2999])
+
+    eb.buffer.text = eb.buffer.text.replace('"""', '', 1)
+    assert highlight(rows) == expected(rows)
+    assert highlight([2990, 2999]) == expected([2990, 2999])
+
+
+def test_highlighting_in_background(editor, run_background_jobs, monkeypatch):
+    monkeypatch.setattr('pyvim.lexer.SYNC_HIGHLIGHTING_TIME', 0)
+
+    eb = EditorBuffer(editor, text='x = 1\n' * 1000)
+    eb.location = 'file.py'
+    lexer = DocumentLexer(eb)
+    highlighter = lexer._get_lexer()
+
+    # Plain text, until the line is highlighted in the background.
+    get_line = lexer.lex_document(Document(eb.buffer.text))
+    assert get_line(500) == [('', 'x = 1')]
+    assert highlighter.is_highlighting
+
+    run_background_jobs(lambda: not highlighter.is_highlighting)
+    highlighted = get_line(500)
+    assert ('class:pygments.name', 'x') in highlighted
+
+    # After an edit, the old fragments are shown for lines that didn't
+    # change, and results for the old text are not used for the new text.
+    get_line(900)
+    eb.buffer.text = 'y' + eb.buffer.text
+    get_line = lexer.lex_document(Document(eb.buffer.text))
+    assert get_line(500) == highlighted
+    assert get_line(0) == [('', 'yx = 1')]
+
+    run_background_jobs(lambda: not highlighter.is_highlighting)
+    assert get_line(0)[0] == ('class:pygments.name', 'yx')
+
+
+def test_windows_share_the_highlighting(editor):
+    eb = EditorBuffer(editor, text='x = 1\n' * 100)
+    eb.location = 'file.py'
+
+    def render():
+        # Three windows on the same buffer, at different positions. (Every
+        # `BufferControl` calls `lex_document` for a new text.)
+        get_lines = [eb.lexer.lex_document(eb.buffer.document) for _ in range(3)]
+        assert get_lines[0] is get_lines[1] is get_lines[2]
+
+        for i, get_line in enumerate(get_lines):
+            for row in range(i * 40, i * 40 + 10):
+                get_line(row)
+
+    render()
+    highlighter = eb.lexer._get_lexer()
+    count = highlighter.lexed_line_count
+    assert count <= 91
+
+    # After an edit, only the changed line is highlighted again, once.
+    eb.buffer.insert_text('y')
+    render()
+    assert highlighter.lexed_line_count == count + 1
+
+
+def test_fast_lexers(editor):
+    eb = EditorBuffer(editor, text='{"a": 1}\n')
+    eb.location = 'file.json'
+    lexer = DocumentLexer(eb)
+    assert isinstance(lexer._get_lexer().pygments_lexer, JsonLexer)
+
+    # Opt-in. (':set fastlexers')
+    editor.fast_lexers = True
+    assert isinstance(lexer._get_lexer().pygments_lexer, JsonFastLexer)
+
+
+@pytest.mark.parametrize('pygments_lexer, text, expected', [
+    (JsonFastLexer, '{"key": [1, 2.5, "value", true]}\n', [
+        (Name.Tag, '"key"'), (Number.Integer, '1'), (Number.Float, '2.5'),
+        (String.Double, '"value"'), (Keyword.Constant, 'true'), (Punctuation, ', ')]),
+    (YamlFastLexer, 'key: value  # comment\nlist:\n  - &a [x, *a]\n', [
+        (Name.Tag, 'key'), (Literal.Scalar.Plain, 'value'), (Punctuation.Indicator, '-'),
+        (Name.Label, '&a'), (Literal.Scalar.Plain, 'x'), (Name.Variable, '*a')]),
+    (LogFastLexer, '2024-05-01 12:00:00,123 ERROR [main] Failed: 42\n', [
+        (Literal.Date, '2024-05-01 12:00:00,123'), (Generic.Error, 'ERROR'),
+        (Name.Label, '[main]'), (Number, '42')]),
+    (PythonFastLexer, 'def f(self):\n    """Doc\n    """\n    return b"x" or None\n', [
+        (Name.Function, 'f'), (Name.Builtin.Pseudo, 'self'), (String.Doc, '"""'),
+        (String.Doc, 'Doc'), (String.Affix, 'b'), (Keyword.Constant, 'None')]),
+])
+def test_fast_lexer_tokens(pygments_lexer, text, expected):
+    tokens = list(pygments_lexer().get_tokens(text))
+    assert ''.join(value for _, value in tokens) == text
+    for token in expected:
+        assert token in tokens
@@ -0,0 +1,74 @@
+from __future__ import unicode_literals
+
+from prompt_toolkit.document import Document
+
+from pyvim.line_index import LineIndex
+from pyvim.text_edit import TextEdit
+import pyvim.line_index
+
+import random
+
+
+def _check(index, text):
+    document = Document(text)
+
+    assert index.line_count == document.line_count
+    assert index.length == len(text)
+
+    for row in range(document.line_count):
+        assert index.line_start(row) == document.translate_row_col_to_index(row, 0)
+        assert index.line_length(row) == len(document.lines[row])
+
+    for i in range(len(text) + 1):
+        assert index.translate_index_to_position(i) == document.translate_index_to_position(i)
+
+
+def test_line_index():
+    text = 'line 1\nline 2\n\nline 4'
+    index = LineIndex(text)
+    _check(index, text)
+
+    assert index.translate_row_col_to_index(1, 100) == 13
+    assert index.translate_row_col_to_index(100, 0) == 15
+
+    _check(LineIndex(''), '')
+    _check(LineIndex('\n'), '\n')
+
+
+def test_random_edits(monkeypatch):
+    # Small blocks, so that blocks are split all the time.
+    monkeypatch.setattr(pyvim.line_index, 'MAX_BLOCK_SIZE', 4)
+
+    rnd = random.Random(42)
+    text = ''.join(rnd.choice('ab\n') for _ in range(200))
+    index = LineIndex(text)
+    copies = []
+
+    for _ in range(300):
+        start = rnd.randint(0, len(text))
+        end = rnd.randint(start, min(len(text), start + rnd.choice([3, 40])))
+        inserted = ''.join(rnd.choice('xy\n') for _ in range(rnd.choice([0, 1, 3, 30])))
+
+        edit = TextEdit(start, text[start:end], inserted)
+        text = edit.apply(text)
+        index.apply_edit(edit)
+        _check(index, text)
+
+        # Copies share the blocks, but don't change with the index.
+        if rnd.random() < 0.1:
+            copies.append((index.copy(), text))
+
+    _check(index.copy(), text)
+    for copy, copy_text in copies:
+        _check(copy, copy_text)
+
+
+def test_editor_buffer_line_index(editor_buffer):
+    buffer = editor_buffer.buffer
+    buffer.text = 'a\nb\nc'
+    assert editor_buffer.line_index.line_count == 3
+
+    buffer.cursor_position = 1
+    buffer.insert_text('\nx\ny')
+    buffer.delete_before_cursor(3)
+    _check(editor_buffer.line_index, buffer.text)
@@ -0,0 +1,78 @@
+from __future__ import unicode_literals
+
+import random
+
+import pytest
+
+from pyvim.rope import Rope, LEAF_SIZE
+
+
+def test_empty():
+    r = Rope()
+    assert len(r) == 0
+    assert r.text == ''
+    assert r.line_count == 1
+
+
+def test_insert_and_delete():
+    r = Rope('hello world')
+    r = r.insert(5, ',')
+    assert r.text == 'hello, world'
+
+    r = r.delete(0, 7)
+    assert r.text == 'world'
+
+    r = r.replace(0, 1, 'W')
+    assert r.text == 'World'
+
+
+def test_immutable():
+    r = Rope('abc')
+    r.insert(1, 'x')
+    assert r.text == 'abc'
+
+
+def test_random_edits_stay_balanced():
+    rnd = random.Random(0)
+    text = ''.join(rnd.choice('ab\n') for _ in range(LEAF_SIZE * 20))
+    r = Rope(text)
+
+    for _ in range(2000):
+        if rnd.random() < .6:
+            pos = rnd.randint(0, len(text))
+            data = rnd.choice(['x', 'yy\n', 'z' * (LEAF_SIZE + 3)])
+            text = text[:pos] + data + text[pos:]
+            r = r.insert(pos, data)
+        else:
+            start = rnd.randint(0, len(text))
+            end = min(len(text), start + rnd.randint(0, 100))
+            text = text[:start] + text[end:]
+            r = r.delete(start, end)
+
+    assert r.text == text
+    assert len(r) == len(text)
+    assert r.depth < 40
+
+
+def test_slicing():
+    text = ''.join(chr(ord('a') + i % 26) for i in range(LEAF_SIZE * 5))
+    r = Rope(text)
+
+    assert r[10:LEAF_SIZE * 3 + 5] == text[10:LEAF_SIZE * 3 + 5]
+    assert r[-1] == text[-1]
+    assert r[:] == text
+
+
+def test_rows():
+    text = '\n'.join('line %i' % i for i in range(5000))
+    r = Rope(text)
+    lines = text.split('\n')
+
+    assert r.line_count == len(lines)
+    assert r.row_to_index(0) == 0
+    assert r.row_to_index(1234) == text.index('line 1234\n')
+    assert r.index_to_row(text.index('line 4321')) == 4321
+    assert r.translate_row_col_to_index(10, 100) == text.index('line 10\n') + len('line 10')
+
+    with pytest.raises(IndexError):
+        r.row_to_index(5000)
@@ -0,0 +1,37 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+from pygments.util import ClassNotFound
+
+from pyvim.commands.completer import ColorSchemeCompleter
+from pyvim.commands.preview import CommandPreviewer
+
+
+def test_styles_are_created_on_first_use(editor, monkeypatch):
+    created = []
+    monkeypatch.setattr('pyvim.style.get_editor_style_by_name',
+                        lambda name: created.append(name) or object())
+
+    # Completing colorschemes needs only the names.
+    completions = ColorSchemeCompleter(editor).get_completions(Document('mono'), CompleteEvent())
+    assert 'monokai' in [c.display_text for c in completions]
+    assert created == []
+
+    # Previewing while typing creates every style once.
+    previewer = CommandPreviewer(editor)
+    previewer.save()
+    for text in ['colorscheme v', 'colorscheme vim', 'colorscheme m',
+                 'colorscheme mo', 'colorscheme monokai', 'colorscheme monokai']:
+        previewer.preview(text)
+    assert created == ['monokai']
+
+    style = editor.current_style
+    previewer.restore()
+    editor.use_colorscheme('monokai')
+    assert editor.current_style is style
+
+    with pytest.raises(ClassNotFound):
+        editor.styles.get_style('no-such-style')
@@ -0,0 +1,140 @@
+from __future__ import unicode_literals
+
+import os
+import random
+
+from prompt_toolkit.buffer import Buffer
+
+from pyvim.editor_buffer import EditorBuffer
+from pyvim.undo import undo_file_path
+
+
+def test_undo_redo(editor_buffer):
+    b = editor_buffer.buffer
+
+    b.save_to_undo_stack()
+    b.insert_text('hello')
+    b.save_to_undo_stack()
+    b.insert_text(' world')
+    b.cursor_position = 0
+    b.save_to_undo_stack()
+    b.delete(1)
+    assert b.text == 'ello world'
+
+    b.undo()
+    assert b.text == 'hello world'
+    b.undo()
+    assert (b.text, b.cursor_position) == ('hello', 5)
+    b.redo()
+    assert b.text == 'hello world'
+
+    # A new change clears the redo stack.
+    b.save_to_undo_stack()
+    b.cursor_position = len(b.text)
+    b.insert_text('!')
+    b.redo()
+    assert b.text == 'hello world!'
+
+
+def test_history_stores_deltas(editor_buffer):
+    b = editor_buffer.buffer
+    b.text = 'x' * 1000000
+
+    for i in range(100):
+        b.save_to_undo_stack()
+        b.cursor_position = i * 1000
+        for c in 'abc':
+            b.insert_text(c)  # Merged into one edit per step.
+
+    steps = b.undo_history._undo
+    assert all(len(step.edits) <= 1 for step in steps)
+    assert sum(len(e.inserted) + len(e.deleted) for step in steps for e in step.edits) == 300
+
+    for i in range(100):
+        b.undo()
+    assert b.text == 'x' * 1000000
+
+
+def test_undo_skips_steps_without_changes(editor_buffer):
+    b = editor_buffer.buffer
+    b.text = 'hello world'
+
+    b.save_to_undo_stack()
+    b.cursor_position = 5
+    b.insert_text('!')
+
+    # Edits that cancel each other, without being merged.
+    b.save_to_undo_stack()
+    b.cursor_position = 0
+    b.insert_text('x')
+    b.cursor_position = 11
+    b.insert_text('y')
+    b.cursor_position = 0
+    b.delete(1)
+    b.cursor_position = 10
+    b.delete(1)
+    assert b.text == 'hello! world'
+    assert len(b.undo_history._undo[-1].edits) > 1
+
+    b.undo()
+    assert b.text == 'hello world'
+
+
+def test_same_behaviour_as_prompt_toolkit(editor_buffer):
+    " Random edits, undos and redos, compared to a `Buffer`. "
+    random.seed(0)
+    ours = editor_buffer.buffer
+    reference = Buffer()
+    previous_action = None
+
+    for _ in range(3000):
+        action = random.choice(['insert', 'insert', 'delete', 'undo', 'redo'])
+        position = random.randint(0, len(reference.text))
+        text = random.choice(['a', 'b', 'xyz', '\n'])
+
+        for b in (ours, reference):
+            # Like the key processor: save before every key, except while
+            # repeating the same edit.
+            if action in ('insert', 'delete') and action != previous_action:
+                b.save_to_undo_stack()
+
+            if action == 'insert':
+                b.cursor_position = position
+                b.insert_text(text)
+            elif action == 'delete':
+                b.cursor_position = position
+                b.delete(2)
+            elif action == 'undo':
+                b.undo()
+            else:
+                b.redo()
+
+        previous_action = action
+        assert ours.text == reference.text
+
+
+def test_undofile(editor, tmpdir, run_background_jobs):
+    editor.undofile = True
+    f = tmpdir.join('file.txt')
+    f.write('hello\n')
+
+    eb = EditorBuffer(editor, str(f))
+    eb.buffer.save_to_undo_stack()
+    eb.buffer.cursor_position = 5
+    eb.buffer.insert_text(' world')
+    eb.write()
+    # (Wait for the undo file itself: it's renamed into place when written.)
+    path = undo_file_path(editor.undo_directory, str(f))
+    run_background_jobs(lambda: os.path.exists(path))
+
+    # Another session: the change can be undone.
+    eb2 = EditorBuffer(editor, str(f))
+    assert eb2.buffer.text == 'hello world'
+    eb2.buffer.undo()
+    assert eb2.buffer.text == 'hello'
+
+    # Not when the file was changed.
+    f.write('changed\n')
+    eb3 = EditorBuffer(editor, str(f))
+    eb3.buffer.undo()
+    assert eb3.buffer.text == 'changed'